@@ -27,15 +27,39 @@ from enum import Enum
 import json
 import logging
 from collections import defaultdict, deque
-from scipy.signal import find_peaks
 from scipy.stats import linregress, entropy
 import warnings
+from streaming_features import StreamingFeatureState
+from candle_patterns import compute_candle_patterns, detect_candle_patterns, legacy_candle_confidence
+from harmonic_patterns import HarmonicDetector, HarmonicMatch, templates_from_point_ratios
+from feature_matrix import build_feature_matrix, compute_features, PHASE_CODES, SR_HIST_WINDOW
+from analysis_cache import AnalysisCache, BarKeys, bar_keys, fingerprint
+from signal_journal import SignalJournal
+from correlation_engine import CorrelationEngine, load_correlation_groups, DEFAULT_GROUPS_PATH
+from timeframe_views import TimeframeViews, DEFAULT_TIMEFRAMES
+from ml_inference_service import MLInferenceService, load_inference_service
+from online_learner import OnlineLearner
+from volatility_estimators import compute_volatility, ESTIMATORS
+from watchlist_prioritizer import WatchlistPrioritizer
+from analog_index import AnalogIndex, DEFAULT_WINDOW, DEFAULT_HORIZON
+from pivot_index import DivergenceEngine
+import engine_kernels
 
 warnings.filterwarnings('ignore')
 
 logger = logging.getLogger(__name__)
 
 
+# Velas mínimas para el análisis por lotes (ventana más larga de las features)
+BATCH_MIN_BARS = SR_HIST_WINDOW
+
+# Peso del score del patrón armónico dentro de los patrones detectados
+HARMONIC_SCORE_WEIGHT = 0.8
+
+# Ajuste máximo de la confianza por confluencia con timeframes mayores (±10%)
+MTF_CONFLUENCE_WEIGHT = 0.10
+
+
 class ConfidenceLevel(Enum):
     """Niveles de confianza de la IA."""
     MINIMAL = 0.40
@@ -98,6 +122,8 @@ class AISignal:
     pattern_detected: Optional[str]
     market_structure: str
     additional_context: Dict[str, Any]
+    signal_id: Optional[int] = None  # Asignado por SignalJournal.record
+    pattern_score: float = 0.5  # Score de patrones que entró al ensemble
 
 
 class PatternRecognizer:
@@ -113,82 +139,170 @@ class PatternRecognizer:
             'bullish_bat': {'point_ratios': [0.500, 0.382, 0.886]},
             'bearish_bat': {'point_ratios': [0.500, 0.382, 0.886]},
         }
+        self.harmonic_templates = templates_from_point_ratios(self.harmonic_patterns)
+        self.harmonic_detectors: Dict[str, HarmonicDetector] = {}
+        self.harmonic_matches: Dict[str, Optional[HarmonicMatch]] = {}
+        # Búsqueda de análogos históricos (opcional, ver enable_analogs)
+        self.analog_index: Optional[AnalogIndex] = None
+        # S/R: 'profile' (perfil de precios incremental) o 'range_histogram' (rango + histograma)
+        self.sr_method = 'profile'
     
-    def detect_harmonic_patterns(self, df: pd.DataFrame) -> Dict[str, float]:
-        """Detecta patrones armónicos (Gartley, Butterfly, Bat)."""
+    def detect_harmonic_patterns(
+        self,
+        df: pd.DataFrame,
+        state: Optional[StreamingFeatureState] = None,
+        asset: Optional[str] = None
+    ) -> Dict[str, float]:
+        """
+        Detecta patrones armónicos (Gartley, Butterfly, Bat) y de velas/gráfico.
+        
+        La búsqueda XABCD usa un detector incremental por activo cuando se indica
+        `asset` (solo procesa las velas nuevas); sin activo recorre el DataFrame.
+        El patrón encontrado queda en `self.harmonic_matches[asset]`.
+        """
         patterns = {}
         
         try:
-            # Encontrar puntos de pivote
-            peaks, _ = find_peaks(df['high'], distance=10)
-            troughs, _ = find_peaks(-df['low'], distance=10)
-            
-            if len(peaks) >= 2 and len(troughs) >= 2:
-                # Análisis básico de patrones
-                last_peak = df['high'].iloc[peaks[-1]] if len(peaks) > 0 else df['high'].iloc[-1]
-                last_trough = df['low'].iloc[troughs[-1]] if len(troughs) > 0 else df['low'].iloc[-1]
-                
-                # Calcular ratios de Fibonacci
-                amplitude = last_peak - last_trough
-                
-                # Detección de patrones gartley
-                if amplitude > 0:
-                    patterns['harmonic_formations'] = min(0.8, len(peaks) / 5)
+            if asset is not None:
+                detector = self.harmonic_detectors.get(asset)
+                if detector is None:
+                    detector = self.harmonic_detectors[asset] = HarmonicDetector(self.harmonic_templates)
+            else:
+                detector = HarmonicDetector(self.harmonic_templates)
+            
+            match = self._update_harmonic(detector, df)
+            if asset is not None:
+                self.harmonic_matches[asset] = match
+            
+            if match is not None:
+                patterns['harmonic_formations'] = HARMONIC_SCORE_WEIGHT * match.score
                 
-            patterns['candle_pattern'] = self._detect_candle_patterns(df)
-            patterns['chart_pattern'] = self._detect_chart_patterns(df)
+            patterns.update(self.detect_base_patterns(df, state))
             
         except Exception as e:
             logger.debug(f"Error detectando patrones armónicos: {e}")
         
         return patterns
     
+    def detect_base_patterns(
+        self,
+        df: pd.DataFrame,
+        state: Optional[StreamingFeatureState] = None
+    ) -> Dict[str, float]:
+        """Patrones baratos de velas y de gráfico (sin la búsqueda armónica)."""
+        return {
+            'candle_pattern': self._detect_candle_patterns(df),
+            'chart_pattern': self._detect_chart_patterns(df, state)
+        }
+    
+    def update_harmonic(self, asset: str, df: pd.DataFrame) -> Optional[HarmonicMatch]:
+        """Actualiza solo el detector armónico del activo y retorna el patrón vigente."""
+        detector = self.harmonic_detectors.get(asset)
+        if detector is None:
+            detector = self.harmonic_detectors[asset] = HarmonicDetector(self.harmonic_templates)
+        match = self._update_harmonic(detector, df)
+        self.harmonic_matches[asset] = match
+        return match
+    
+    @staticmethod
+    def _update_harmonic(detector: HarmonicDetector, df: pd.DataFrame) -> Optional[HarmonicMatch]:
+        detector.sync(df)
+        return detector.current_match(float(df['close'].iloc[-1]))
+    
+    def enable_analogs(self, window: int = DEFAULT_WINDOW, horizon: int = DEFAULT_HORIZON, **kwargs) -> AnalogIndex:
+        """Crea el índice de análogos históricos (ventanas de `window` velas, resultado a `horizon` velas)."""
+        self.analog_index = AnalogIndex(window=window, horizon=horizon, **kwargs)
+        return self.analog_index
+    
+    def update_analog_index(self, asset: str, df: pd.DataFrame) -> int:
+        """Añade al índice de análogos las velas cerradas nuevas del activo."""
+        if self.analog_index is None:
+            return 0
+        return self.analog_index.sync(asset, df)
+    
+    def find_analogs(
+        self,
+        df: pd.DataFrame,
+        asset: Optional[str] = None,
+        k: int = 10,
+        cross_asset: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Busca las k ventanas históricas más parecidas a las últimas velas y resume qué pasó después.
+        
+        Args:
+            df: DataFrame OHLCV (la consulta son los últimos `window` cierres)
+            asset: Activo de la consulta; se excluyen sus ventanas solapadas con la consulta
+            k: Número de análogos
+            cross_asset: Buscar en todos los activos indexados (si no, solo en `asset`)
+        
+        Returns:
+            Resumen (retorno futuro medio, probabilidad de subida, análogos más cercanos)
+            o dict vacío si no hay índice o ventanas comparables
+        """
+        index = self.analog_index
+        if index is None or len(df) < index.window:
+            return {}
+        assets = None if cross_asset or asset is None else [asset]
+        exclude = None
+        if asset is not None and len(df) > 1 and isinstance(df.index, pd.DatetimeIndex):
+            exclude = (asset, int(df.index[-2].value))
+        matches = index.search(df['close'].to_numpy(dtype=float), k=k, assets=assets, exclude=exclude)
+        summary = index.summarize(matches)
+        if summary:
+            summary['horizon'] = index.horizon
+            summary['cross_asset'] = assets is None
+        return summary
+    
     def _detect_candle_patterns(self, df: pd.DataFrame) -> float:
         """Detecta patrones de velas (doji, hammer, engulfing, etc)."""
         confidence = 0.0
         
         try:
-            # Últimas 3 velas
-            for i in range(-3, 0):
-                open_price = df['open'].iloc[i]
-                close_price = df['close'].iloc[i]
-                high = df['high'].iloc[i]
-                low = df['low'].iloc[i]
-                
-                body = abs(close_price - open_price)
-                wick_top = high - max(open_price, close_price)
-                wick_bottom = min(open_price, close_price) - low
-                full_range = high - low
-                
-                if full_range > 0:
-                    # Doji
-                    if body / full_range < 0.1:
-                        confidence = max(confidence, 0.6)
-                    
-                    # Hammer/Inverse Hammer
-                    if wick_bottom > body * 2 or wick_top > body * 2:
-                        confidence = max(confidence, 0.55)
-                    
-                    # Engulfing pattern
-                    if i > -3:
-                        prev_body = abs(df['close'].iloc[i-1] - df['open'].iloc[i-1])
-                        if body > prev_body * 1.5:
-                            confidence = max(confidence, 0.65)
+            # Últimas 3 velas (cálculo vectorizado solo sobre la cola)
+            tail = df.iloc[-3:]
+            patterns = compute_candle_patterns(
+                tail['open'].to_numpy(),
+                tail['high'].to_numpy(),
+                tail['low'].to_numpy(),
+                tail['close'].to_numpy()
+            )
+            confidence = legacy_candle_confidence(patterns, lookback=3)
         
         except Exception as e:
             logger.debug(f"Error en patrón de velas: {e}")
         
         return confidence
     
-    def _detect_chart_patterns(self, df: pd.DataFrame) -> float:
+    def get_candle_pattern_frame(self, df: pd.DataFrame, tail: Optional[int] = None) -> pd.DataFrame:
+        """
+        Patrones de velas por barra para todo el histórico (o su cola).
+        
+        Args:
+            df: DataFrame OHLC
+            tail: Número de barras finales a calcular (None = todas)
+            
+        Returns:
+            DataFrame con una columna booleana por patrón y columnas de fuerza
+        """
+        return detect_candle_patterns(df, tail=tail)
+    
+    def _detect_chart_patterns(
+        self,
+        df: pd.DataFrame,
+        state: Optional[StreamingFeatureState] = None
+    ) -> float:
         """Detecta patrones de gráfico (triángulos, canales, head&shoulders)."""
         confidence = 0.0
         
         try:
-            closes = df['close'].values[-50:]
-            
             # Análisis de volatilidad para detectar consolidación
-            volatility = np.std(closes) / np.mean(closes)
+            if state is not None:
+                mean_close, std_close = state.close_mean_std()
+                volatility = std_close / mean_close
+            else:
+                closes = df['close'].values[-50:]
+                volatility = np.std(closes) / np.mean(closes)
             
             if volatility < 0.005:
                 confidence = 0.6  # Triángulo/consolidación
@@ -200,9 +314,29 @@ class PatternRecognizer:
         
         return confidence
     
-    def detect_support_resistance(self, df: pd.DataFrame) -> Tuple[float, float]:
-        """Detecta niveles de soporte y resistencia."""
+    def detect_support_resistance(
+        self,
+        df: pd.DataFrame,
+        state: Optional[StreamingFeatureState] = None
+    ) -> Tuple[float, float]:
+        """
+        Detecta niveles de soporte y resistencia.
+        
+        Con estado incremental y sr_method 'profile' son los niveles más cercanos
+        del perfil de precios del activo (LevelIndex); el lado sin nivel, o sin
+        estado, usa el rango reciente combinado con el histograma de cierres.
+        """
         try:
+            if state is not None:
+                support, resistance = state.support_resistance()
+                if self.sr_method == 'profile':
+                    levels = state.price_levels()
+                    price = float(df['close'].iloc[-1])
+                    # Sin nivel en un lado (precio fuera del perfil) el respaldo no cruza el precio
+                    support = levels['support'] if levels['support'] is not None else min(support, price)
+                    resistance = levels['resistance'] if levels['resistance'] is not None else max(resistance, price)
+                return support, resistance
+            
             closes = df['close'].values[-100:]
             
             # Método 1: Mínimos y máximos
@@ -231,8 +365,15 @@ class MarketSentimentAnalyzer:
     def __init__(self):
         self.sentiment_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=100))
         self.volatility_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=100))
+        # Divergencias RSI/MACD-precio sobre el índice de pivotes del estado incremental
+        self.indicator_divergences = True
     
-    def analyze_sentiment(self, df: pd.DataFrame, asset: str) -> Dict[str, float]:
+    def analyze_sentiment(
+        self,
+        df: pd.DataFrame,
+        asset: str,
+        state: Optional[StreamingFeatureState] = None
+    ) -> Dict[str, float]:
         """Analiza sentimiento basado en volumen y precio."""
         sentiment = {
             'bullish_pressure': 0.5,
@@ -246,27 +387,30 @@ class MarketSentimentAnalyzer:
             if len(df) < 20:
                 return sentiment
             
-            # Análisis de cierre vs apertura
-            closes = df['close'].values[-20:]
-            opens = df['open'].values[-20:]
-            upward = sum(1 for c, o in zip(closes, opens) if c > o)
-            bullish_ratio = upward / 20
-            
-            sentiment['bullish_pressure'] = min(1.0, bullish_ratio * 1.5)
-            sentiment['bearish_pressure'] = 1.0 - sentiment['bullish_pressure']
-            
-            # Momentum
-            returns = np.diff(closes) / closes[:-1]
-            sentiment['momentum'] = float(np.mean(returns) * 100)
-            
-            # Volatilidad
-            sentiment['volatility'] = float(np.std(returns))
-            
-            # Volumen si está disponible
-            if 'volume' in df.columns:
-                volumes = df['volume'].values[-20:]
-                avg_vol = np.mean(volumes[-10:])
-                sentiment['volume_strength'] = min(1.0, np.mean(volumes[-5:]) / (avg_vol + 1e-10))
+            if state is not None:
+                sentiment = state.sentiment()
+            else:
+                # Análisis de cierre vs apertura
+                closes = df['close'].values[-20:]
+                opens = df['open'].values[-20:]
+                upward = sum(1 for c, o in zip(closes, opens) if c > o)
+                bullish_ratio = upward / 20
+                
+                sentiment['bullish_pressure'] = min(1.0, bullish_ratio * 1.5)
+                sentiment['bearish_pressure'] = 1.0 - sentiment['bullish_pressure']
+                
+                # Momentum
+                returns = np.diff(closes) / closes[:-1]
+                sentiment['momentum'] = float(np.mean(returns) * 100)
+                
+                # Volatilidad
+                sentiment['volatility'] = float(np.std(returns))
+                
+                # Volumen si está disponible
+                if 'volume' in df.columns:
+                    volumes = df['volume'].values[-20:]
+                    avg_vol = np.mean(volumes[-10:])
+                    sentiment['volume_strength'] = min(1.0, np.mean(volumes[-5:]) / (avg_vol + 1e-10))
             
             # Guardar histórico
             self.sentiment_history[asset].append(sentiment['bullish_pressure'])
@@ -277,9 +421,18 @@ class MarketSentimentAnalyzer:
         
         return sentiment
     
-    def detect_divergence(self, df: pd.DataFrame) -> Dict[str, bool]:
-        """Detecta divergencias en precio y volumen."""
-        divergences = {
+    def detect_divergence(
+        self,
+        df: pd.DataFrame,
+        state: Optional[StreamingFeatureState] = None
+    ) -> Dict[str, Any]:
+        """
+        Detecta divergencias en precio y volumen.
+        
+        Con estado incremental añade las divergencias regulares/ocultas de RSI y
+        MACD frente al precio (ver indicator_divergence_context).
+        """
+        divergences: Dict[str, Any] = {
             'bullish_divergence': False,
             'bearish_divergence': False,
             'volume_divergence': False
@@ -290,36 +443,64 @@ class MarketSentimentAnalyzer:
                 return divergences
             
             # Comparar movimientos de precio vs volumen
-            price_trend = linregress(range(20), df['close'].values[-20:])[0]
+            if state is not None:
+                price_trend = state.trend_regression()[0]
+            else:
+                price_trend = linregress(range(20), df['close'].values[-20:])[0]
             
             if 'volume' in df.columns:
-                volume_trend = linregress(range(20), df['volume'].values[-20:])[0]
+                if state is not None:
+                    volume_trend = state.volume_slope()
+                else:
+                    volume_trend = linregress(range(20), df['volume'].values[-20:])[0]
                 
                 if price_trend > 0 and volume_trend < 0:
                     divergences['bearish_divergence'] = True
                 elif price_trend < 0 and volume_trend > 0:
                     divergences['bullish_divergence'] = True
+            
+            divergences.update(self.indicator_divergence_context(state))
         
         except Exception as e:
             logger.debug(f"Error detectando divergencia: {e}")
         
         return divergences
     
-    def get_market_phase(self, df: pd.DataFrame) -> MarketPhase:
+    def indicator_divergence_context(self, state: Optional[StreamingFeatureState]) -> Dict[str, Any]:
+        """
+        Divergencias precio/indicador activas del activo.
+        
+        Returns:
+            'regular_bullish', 'regular_bearish', 'hidden_bullish', 'hidden_bearish'
+            (bool) y 'indicator_divergences' (detalle); vacío si están desactivadas o sin estado
+        """
+        if state is None or not self.indicator_divergences:
+            return {}
+        active = state.indicator_divergences()
+        return {**DivergenceEngine.summarize(active), 'indicator_divergences': active}
+    
+    def get_market_phase(
+        self,
+        df: pd.DataFrame,
+        state: Optional[StreamingFeatureState] = None
+    ) -> MarketPhase:
         """Determina la fase actual del mercado."""
         try:
             if len(df) < 50:
                 return MarketPhase.TRANSITION
             
-            # Análisis de tendencia usando regresión lineal
-            x = np.arange(len(df[-50:]))
-            y = df['close'].values[-50:]
-            
-            slope, _, r_value, _, _ = linregress(x, y)
-            
-            # Análisis de volatilidad
-            returns = np.diff(y) / y[:-1]
-            volatility = np.std(returns)
+            if state is not None:
+                slope, r_value, volatility = state.phase_inputs()
+            else:
+                # Análisis de tendencia usando regresión lineal
+                x = np.arange(len(df[-50:]))
+                y = df['close'].values[-50:]
+                
+                slope, _, r_value, _, _ = linregress(x, y)
+                
+                # Análisis de volatilidad
+                returns = np.diff(y) / y[:-1]
+                volatility = np.std(returns)
             
             # Determinación de fase
             if r_value ** 2 > 0.7:  # Tendencia clara
@@ -347,6 +528,29 @@ class EnsemblePredictor:
             'sentiment': 0.15,
             'pattern': 0.10
         }
+        # Umbrales del score ponderado para CALL / PUT
+        self.call_threshold = 0.55
+        self.put_threshold = 0.45
+    
+    def apply_config(self, ensemble_config: Dict[str, Any]) -> None:
+        """
+        Aplica pesos y umbrales (p.ej. el resultado de EnsembleOptimizer).
+        
+        Args:
+            ensemble_config: Dict con 'model_weights', 'call_threshold' y/o 'put_threshold'
+        """
+        weights = ensemble_config.get('model_weights')
+        if weights:
+            missing = set(self.model_weights) - set(weights)
+            if missing:
+                raise ValueError(f"Faltan pesos del ensemble: {sorted(missing)}")
+            self.model_weights = {key: float(weights[key]) for key in self.model_weights}
+        self.call_threshold = float(ensemble_config.get('call_threshold', self.call_threshold))
+        self.put_threshold = float(ensemble_config.get('put_threshold', self.put_threshold))
+        logger.info(
+            f"[ENSEMBLE] Pesos {self.model_weights} | "
+            f"umbrales CALL>{self.call_threshold} PUT<{self.put_threshold}"
+        )
     
     def predict_direction(
         self,
@@ -376,10 +580,10 @@ class EnsemblePredictor:
         )
         
         # Determinar dirección y confianza
-        if weighted_score > 0.55:
+        if weighted_score > self.call_threshold:
             direction = 'CALL'
             confidence = min(0.95, weighted_score)
-        elif weighted_score < 0.45:
+        elif weighted_score < self.put_threshold:
             direction = 'PUT'
             confidence = min(0.95, 1 - weighted_score)
         else:
@@ -387,6 +591,70 @@ class EnsemblePredictor:
         
         return direction, confidence
     
+    def predict_directions(
+        self,
+        technical_scores: np.ndarray,
+        ml_scores: np.ndarray,
+        sentiment_scores: np.ndarray,
+        pattern_scores: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Versión vectorizada de predict_direction para varios activos.
+        
+        Returns:
+            (directions, confidences): arrays con 'CALL', 'PUT' o None y su confianza
+        """
+        weighted = self.weighted_scores(technical_scores, ml_scores, sentiment_scores, pattern_scores)
+        directions = np.full(weighted.shape, None, dtype=object)
+        calls = weighted > self.call_threshold
+        puts = ~calls & (weighted < self.put_threshold)
+        directions[calls] = 'CALL'
+        directions[puts] = 'PUT'
+        confidences = np.where(
+            calls, np.minimum(0.95, weighted),
+            np.where(puts, np.minimum(0.95, 1 - weighted), 0.0)
+        )
+        return directions, confidences
+    
+    def weighted_scores(
+        self,
+        technical_scores: np.ndarray,
+        ml_scores: np.ndarray,
+        sentiment_scores: np.ndarray,
+        pattern_scores: np.ndarray
+    ) -> np.ndarray:
+        """Score ponderado del ensemble (0-1) para escalares o arrays."""
+        return (
+            (np.asarray(technical_scores) + 1) / 2 * self.model_weights['technical'] +
+            np.asarray(ml_scores) * self.model_weights['ml'] +
+            (np.asarray(sentiment_scores) + 1) / 2 * self.model_weights['sentiment'] +
+            np.asarray(pattern_scores) * self.model_weights['pattern']
+        )
+    
+    def max_confidences(
+        self,
+        technical_scores: np.ndarray,
+        ml_scores: np.ndarray,
+        sentiment_scores: np.ndarray,
+        pattern_low: np.ndarray,
+        pattern_high: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Confianza máxima alcanzable cuando el score de patrones solo se conoce acotado.
+        
+        Permite descartar un activo antes de calcular los patrones caros: si ni
+        CALL ni PUT pueden superar el umbral (o la validación de riesgo) con
+        ningún valor del intervalo, predict_direction tampoco daría señal.
+        
+        Returns:
+            (call_confidence, put_confidence): 0.0 donde la dirección es imposible
+        """
+        high = self.weighted_scores(technical_scores, ml_scores, sentiment_scores, pattern_high)
+        low = self.weighted_scores(technical_scores, ml_scores, sentiment_scores, pattern_low)
+        call = np.where(high > self.call_threshold, np.minimum(0.95, high), 0.0)
+        put = np.where(low < self.put_threshold, np.minimum(0.95, 1 - low), 0.0)
+        return call, put
+    
     def get_model_disagreement(
         self,
         technical_score: float,
@@ -419,9 +687,19 @@ class AdaptiveRiskManager:
         account_balance: float,
         confidence: float,
         volatility: float,
-        trend_strength: float
+        trend_strength: float,
+        atr_pct: Optional[float] = None
     ) -> Dict[str, float]:
-        """Calcula el tamaño de posición adaptativo."""
+        """
+        Calcula el tamaño de posición adaptativo.
+        
+        Args:
+            account_balance: Balance de la cuenta
+            confidence: Confianza del ensemble
+            volatility: Volatilidad por vela (estimador configurado del motor)
+            trend_strength: Fuerza de tendencia
+            atr_pct: ATR relativo al precio; el stop nunca queda por debajo de un ATR
+        """
         
         # Risk reduction based on volatility
         vol_adjustment = max(0.5, 1.0 - (volatility * 10))
@@ -436,6 +714,8 @@ class AdaptiveRiskManager:
         
         # Calculate stop loss and take profit
         stop_loss_pct = max(0.005, volatility * 3)  # Minimum 0.5%
+        if atr_pct is not None and np.isfinite(atr_pct):
+            stop_loss_pct = max(stop_loss_pct, atr_pct)
         take_profit_pct = stop_loss_pct * (2 + confidence)  # Risk-reward adjusted
         
         return {
@@ -480,9 +760,160 @@ class AdvancedAIEngine:
         self.ensemble_predictor = EnsemblePredictor()
         self.risk_manager = AdaptiveRiskManager()
         
-        # Histórico para aprendizaje
-        self.signal_history: deque = deque(maxlen=1000)
+        engine_config = config.get('ai_engine', {})
+        
+        # Núcleos numéricos: compilar (si hay Numba) antes del primer análisis
+        engine_kernels.warm_up(engine_config.get('jit_kernels', True))
+        
+        # Pesos/umbrales del ensemble optimizados (ensemble_optimizer)
+        if engine_config.get('ensemble'):
+            self.ensemble_predictor.apply_config(engine_config['ensemble'])
+        
+        # Histórico para aprendizaje (columnar, resultado por signal_id)
+        self.signal_journal = SignalJournal(
+            capacity=engine_config.get('journal_capacity', 1000),
+            spill_path=engine_config.get('journal_spill_path')
+        )
+        # Los motores de los workers paralelos no registran: la señal la registra el motor padre
+        self.record_signals = True
         self.performance_metrics: Dict[str, Any] = {}
+        
+        # Correlación rolling entre activos (EWMA incremental por vela cerrada)
+        self.correlation_engine = CorrelationEngine(
+            load_correlation_groups(engine_config.get('correlation_groups_path', DEFAULT_GROUPS_PATH)),
+            halflife=engine_config.get('correlation_halflife', 120),
+            min_bars=engine_config.get('correlation_min_bars', 30)
+        )
+        self.correlation_open_horizon = engine_config.get('correlation_open_horizon_s', 300)
+        
+        # Vistas de timeframes mayores derivadas de la serie base (confluencia opcional)
+        self.timeframe_views = TimeframeViews(engine_config.get('mtf_timeframes', DEFAULT_TIMEFRAMES))
+        self.mtf_confluence = engine_config.get('mtf_confluence', False)
+        
+        # Estimador de volatilidad para tamaño de posición y estrategia
+        self.volatility_estimator = engine_config.get('volatility_estimator', 'garman_klass')
+        if self.volatility_estimator not in ESTIMATORS:
+            logger.warning(f"[VOL] Estimador desconocido '{self.volatility_estimator}', se usa close_to_close")
+            self.volatility_estimator = 'close_to_close'
+        
+        # Método de soporte/resistencia
+        sr_method = engine_config.get('sr_method', 'profile')
+        if sr_method not in ('profile', 'range_histogram'):
+            logger.warning(f"[S/R] Método desconocido '{sr_method}', se usa range_histogram")
+            sr_method = 'range_histogram'
+        self.pattern_recognizer.sr_method = sr_method
+        self.sentiment_analyzer.indicator_divergences = engine_config.get('indicator_divergences', True)
+        
+        # Estado incremental de features por activo
+        self.feature_states: Dict[str, StreamingFeatureState] = {}
+        
+        # Salidas por etapa del pipeline de analyze_asset
+        self.stage_stats: Dict[str, int] = defaultdict(int)
+        
+        # Memoización de sub-resultados por vela
+        self.analysis_cache = AnalysisCache(
+            max_entries=engine_config.get('cache_max_entries', 4096),
+            max_bytes=int(engine_config.get('cache_max_mb', 32) * 1024 * 1024)
+        )
+        
+        # Prioridad y presupuesto de tiempo por ciclo para la watchlist
+        self.watchlist_prioritizer = WatchlistPrioritizer(
+            self, budget_seconds=engine_config.get('watchlist_budget_s', 10.0)
+        )
+        
+        # Análisis en procesos paralelos (opcional)
+        self.parallel_executor = None
+        parallel_workers = config.get('ai_engine', {}).get('parallel_workers', 0)
+        if parallel_workers:
+            self.enable_parallel(parallel_workers)
+        
+        # Inferencia ML por micro-lotes (opcional; sin modelo se usa el proxy RSI)
+        self.ml_service: Optional[MLInferenceService] = None
+        if engine_config.get('ml_inference', {}).get('enabled', False):
+            self.ml_service = load_inference_service(config)
+        
+        # Análogos históricos de las últimas velas (opcional, solo contexto de la señal)
+        analog_config = engine_config.get('analog_search', {})
+        self.analog_k = analog_config.get('k', 10)
+        self.analog_cross_asset = analog_config.get('cross_asset', False)
+        if analog_config.get('enabled', False):
+            self.pattern_recognizer.enable_analogs(
+                window=analog_config.get('window', DEFAULT_WINDOW),
+                horizon=analog_config.get('horizon', DEFAULT_HORIZON)
+            )
+        
+        # Aprendizaje en línea con los resultados de las señales (opcional)
+        self.online_learner: Optional[OnlineLearner] = None
+        online_config = engine_config.get('online_learning', {})
+        if online_config.get('enabled', False):
+            self.enable_online_learning(online_config)
+    
+    def enable_online_learning(self, online_config: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Activa la actualización incremental del modelo ML con los resultados.
+        
+        Los modelos consolidados se publican en el servicio de inferencia
+        (se crea uno vacío si no hay modelo offline).
+        
+        Args:
+            online_config: Parámetros de OnlineLearner (buffer_size, consolidate_every_s, ...)
+        """
+        online_config = dict(online_config or {})
+        online_config.pop('enabled', None)
+        if self.ml_service is None:
+            inference_config = self.config.get('ai_engine', {}).get('ml_inference', {})
+            self.ml_service = MLInferenceService(
+                {},
+                feature_keys=inference_config.get('feature_keys'),
+                window_ms=inference_config.get('window_ms', 5.0),
+                max_batch=inference_config.get('max_batch', 256)
+            )
+        if self.online_learner is not None:
+            self.online_learner.stop()
+        self.online_learner = OnlineLearner(
+            models=self.ml_service.models,
+            feature_keys=self.ml_service.feature_keys,
+            category_resolver=self.ml_service.category_resolver,
+            **online_config
+        )
+        self.online_learner.start()
+    
+    def enable_parallel(self, max_workers: Optional[int] = None, min_assets: int = 8) -> None:
+        """
+        Activa el análisis por lotes en procesos worker (analyze_assets).
+        
+        Args:
+            max_workers: Procesos del pool (por defecto núcleos - 1)
+            min_assets: Con menos activos se analiza en el proceso actual
+        """
+        from parallel_analysis import ParallelAnalysisExecutor
+        if self.parallel_executor is not None:
+            self.parallel_executor.shutdown()
+        self.parallel_executor = ParallelAnalysisExecutor(self, max_workers, min_assets)
+    
+    def shutdown_parallel(self) -> None:
+        """Detiene el pool de procesos si está activo."""
+        if self.parallel_executor is not None:
+            self.parallel_executor.shutdown()
+            self.parallel_executor = None
+    
+    def _get_feature_state(self, asset: str, df: pd.DataFrame) -> Optional[StreamingFeatureState]:
+        """
+        Sincroniza y retorna el estado incremental del activo.
+        
+        Solo se ingieren las velas nuevas desde la última llamada; si algo falla
+        se descarta el estado y el análisis usa el cálculo completo sobre el DataFrame.
+        """
+        state = self.feature_states.get(asset)
+        if state is None:
+            state = self.feature_states[asset] = StreamingFeatureState()
+        try:
+            state.sync(df)
+            return state
+        except Exception as e:
+            logger.debug(f"Error sincronizando estado incremental de {asset}: {e}")
+            state.reset()
+            return None
     
     def analyze_asset(
         self,
@@ -490,17 +921,28 @@ class AdvancedAIEngine:
         df: pd.DataFrame,
         indicators: Dict[str, Any],
         account_balance: float = 1000.0,
-        recent_win_rate: float = 0.50
+        recent_win_rate: float = 0.50,
+        timeframe: Optional[int] = None,
+        cheap_only: bool = False
     ) -> Optional[AISignal]:
         """
         Análisis completo del activo con la IA avanzada.
         
+        El pipeline va por etapas (ver _run_analysis): el contexto caro solo se
+        calcula para las señales que pasan el ensemble y el riesgo. Repetir el
+        análisis sobre las mismas velas e indicadores devuelve el resultado
+        guardado en `analysis_cache` sin recalcular.
+        
         Args:
             asset: Símbolo del activo
             df: DataFrame con OHLCV
             indicators: Indicadores técnicos calculados
             account_balance: Balance de la cuenta
             recent_win_rate: Win rate reciente
+            timeframe: Timeframe de las velas (para la clave de cache; se infiere si es None)
+            cheap_only: Solo etapas baratas: sin patrón armónico ni contexto caro
+                        (S/R, pivotes, divergencias, fase); la señal lo indica en
+                        additional_context['cheap_only']
         
         Returns:
             AISignal o None si no hay señal clara
@@ -511,124 +953,619 @@ class AdvancedAIEngine:
             return None
         
         try:
-            # 1. ANÁLISIS TÉCNICO MULTIDIMENSIONAL
-            technical_score = self._calculate_technical_score(indicators)
-            
-            # 2. ANÁLISIS DE PATRONES
-            patterns = self.pattern_recognizer.detect_harmonic_patterns(df)
-            pattern_score = np.mean(list(patterns.values())) if patterns else 0.5
-            pattern_detected = max(patterns, key=patterns.get) if patterns else None
-            
-            # 3. ANÁLISIS DE SENTIMIENTO
-            sentiment = self.sentiment_analyzer.analyze_sentiment(df, asset)
-            sentiment_score = sentiment['bullish_pressure'] - sentiment['bearish_pressure']
-            divergences = self.sentiment_analyzer.detect_divergence(df)
-            market_phase = self.sentiment_analyzer.get_market_phase(df)
-            
-            # 4. ANÁLISIS DE VOLATILIDAD Y TENDENCIA
-            volatility_level = sentiment['volatility']
-            trend_strength = self._calculate_trend_strength(df)
-            
-            # 5. SUPPORT & RESISTANCE
-            support, resistance = self.pattern_recognizer.detect_support_resistance(df)
-            
-            # 6. PIVOT POINTS
-            pivot_points = self._calculate_pivot_points(df)
-            
-            # 7. ML PREDICTION (simulado - usar modelo real)
-            ml_score = self._get_ml_prediction(indicators, asset)
-            
-            # 8. PREDICCIÓN ENSEMBLE
-            direction, ensemble_confidence = self.ensemble_predictor.predict_direction(
-                technical_score,
-                ml_score,
-                sentiment_score,
-                pattern_score
+            keys = bar_keys(asset, df, timeframe)
+            signal_key = keys.forming + (fingerprint(indicators), account_balance, recent_win_rate, cheap_only)
+            return self.analysis_cache.get_or_compute(
+                signal_key, 'signal',
+                lambda: self._run_analysis(
+                    asset, df, indicators, account_balance, recent_win_rate, keys, cheap_only
+                )
             )
-            
-            if direction is None:
-                logger.info(f"No hay señal clara para {asset}")
-                return None
-            
-            # 9. GESTIÓN DE RIESGO
-            position_sizing = self.risk_manager.calculate_position_size(
-                account_balance,
-                ensemble_confidence,
-                volatility_level,
-                trend_strength
+        
+        except Exception as e:
+            logger.error(f"Error en análisis de IA para {asset}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return None
+    
+    def _run_analysis(
+        self,
+        asset: str,
+        df: pd.DataFrame,
+        indicators: Dict[str, Any],
+        account_balance: float,
+        recent_win_rate: float,
+        keys: BarKeys,
+        cheap_only: bool = False
+    ) -> Optional[AISignal]:
+        """
+        Pipeline de analyze_asset por etapas, de la más barata a la más cara.
+        
+        1. Scores baratos que deciden la dirección (técnico, ML, sentimiento,
+           patrones de velas y de gráfico).
+        2. Descarte temprano: si con cualquier score armónico posible el ensemble
+           no daría señal o el riesgo la filtraría, se retorna sin más cálculo.
+        3. Patrón armónico, ensemble exacto y validación de riesgo.
+        4. Contexto caro (divergencias, fase, S/R, pivotes) solo para las señales
+           que sobreviven.
+        
+        Cada sub-resultado de velas se memoiza por separado.
+        """
+        cache = self.analysis_cache
+        key = keys.forming
+        
+        # 0. ESTADO INCREMENTAL (solo ingiere velas nuevas; perezoso si todo está en cache)
+        state_holder: List[Optional[StreamingFeatureState]] = []
+        
+        def state() -> Optional[StreamingFeatureState]:
+            if not state_holder:
+                state_holder.append(self._get_feature_state(asset, df))
+            return state_holder[0]
+        
+        self._sync_correlation(asset, df)
+        self._sync_analogs(asset, df)
+        
+        # ETAPA 1: SCORES BARATOS
+        technical_score = self._calculate_technical_score(indicators)
+        ml_score = self._get_ml_prediction(indicators, asset)
+        sentiment = cache.get_or_compute(
+            key, 'sentiment', lambda: self.sentiment_analyzer.analyze_sentiment(df, asset, state())
+        )
+        sentiment_score = sentiment['bullish_pressure'] - sentiment['bearish_pressure']
+        base_patterns = cache.get_or_compute(
+            key, 'base_patterns', lambda: self.pattern_recognizer.detect_base_patterns(df, state())
+        )
+        
+        # ETAPA 2: DESCARTE TEMPRANO (sin calcular el patrón armónico)
+        if not cheap_only and not self._can_pass_gates(
+            technical_score, ml_score, sentiment_score, base_patterns, recent_win_rate
+        ):
+            self.stage_stats['early_exit'] += 1
+            logger.info(f"No hay señal clara para {asset}")
+            return None
+        
+        # ETAPA 3: PATRÓN ARMÓNICO, ENSEMBLE Y RIESGO
+        patterns: Dict[str, float] = {}
+        harmonic_match = None
+        if not cheap_only:
+            harmonic_match = cache.get_or_compute(
+                key, 'harmonic', lambda: self._safe_update_harmonic(asset, df)
             )
+            self.pattern_recognizer.harmonic_matches[asset] = harmonic_match
+            if harmonic_match is not None:
+                patterns['harmonic_formations'] = HARMONIC_SCORE_WEIGHT * harmonic_match.score
+        patterns.update(base_patterns)
+        pattern_score = np.mean(list(patterns.values())) if patterns else 0.5
+        pattern_detected = max(patterns, key=patterns.get) if patterns else None
+        if pattern_detected == 'harmonic_formations':
+            pattern_detected = harmonic_match.pattern
+        
+        direction, ensemble_confidence = self.ensemble_predictor.predict_direction(
+            technical_score,
+            ml_score,
+            sentiment_score,
+            pattern_score
+        )
+        
+        if direction is None:
+            self.stage_stats['ensemble_exit'] += 1
+            logger.info(f"No hay señal clara para {asset}")
+            return None
+        
+        confluence = None
+        if self.mtf_confluence and not cheap_only:
+            trends = cache.get_or_compute(key, 'timeframe_trends', lambda: self._timeframe_trends(asset, df))
+            ensemble_confidence, confluence = self._apply_confluence(direction, ensemble_confidence, trends)
+        
+        if not self.risk_manager.should_trade(ensemble_confidence, recent_win_rate, 0.0):
+            self.stage_stats['risk_exit'] += 1
+            logger.info(f"Signal filtered por gestión de riesgo para {asset}")
+            return None
+        
+        volatility = cache.get_or_compute(key, 'volatility', lambda: self._volatility_estimates(df, state()))
+        volatility_level, atr_pct = self._select_volatility(sentiment['volatility'], volatility)
+        trend_strength = cache.get_or_compute(
+            key, 'trend_strength', lambda: self._calculate_trend_strength(df, state())
+        )
+        position_sizing = self.risk_manager.calculate_position_size(
+            account_balance,
+            ensemble_confidence,
+            volatility_level,
+            trend_strength,
+            atr_pct
+        )
+        
+        # ETAPA 4: CONTEXTO CARO (solo señales supervivientes)
+        if cheap_only:
+            divergences: Dict[str, Any] = {}
+            market_phase = MarketPhase.TRANSITION
+            support, resistance = 0.0, 0.0
+            pivot_points: Dict[str, float] = {}
+        else:
+            divergences = cache.get_or_compute(
+                key, 'divergences', lambda: self.sentiment_analyzer.detect_divergence(df, state())
+            )
+            market_phase = cache.get_or_compute(
+                key, 'market_phase', lambda: self.sentiment_analyzer.get_market_phase(df, state())
+            )
+            support, resistance = cache.get_or_compute(
+                key, 'support_resistance', lambda: self.pattern_recognizer.detect_support_resistance(df, state())
+            )
+            pivot_points = cache.get_or_compute(key, 'pivot_points', lambda: self._calculate_pivot_points(df))
+        self.stage_stats['signals'] += 1
+        
+        # CREAR SEÑAL DE IA
+        ai_signal = self._build_ai_signal(
+            asset=asset,
+            direction=direction,
+            confidence=ensemble_confidence,
+            current_price=float(df['close'].iloc[-1]),
+            position_sizing=position_sizing,
+            technical_score=technical_score,
+            ml_score=ml_score,
+            sentiment_score=sentiment_score,
+            sentiment=sentiment,
+            volatility_level=volatility_level,
+            trend_strength=trend_strength,
+            market_phase=market_phase,
+            support=support,
+            resistance=resistance,
+            pivot_points=pivot_points,
+            pattern_detected=pattern_detected,
+            divergences=divergences,
+            indicators=indicators,
+            pattern_score=float(pattern_score),
+            volatility_estimates=volatility
+        )
+        if cheap_only:
+            ai_signal.additional_context['cheap_only'] = True
+        if confluence is not None:
+            ai_signal.additional_context['timeframe_confluence'] = confluence
+        if not cheap_only:
+            analogs = cache.get_or_compute(key, 'analogs', lambda: self._find_analogs(asset, df))
+            if analogs:
+                ai_signal.additional_context['analogs'] = analogs
+        
+        return ai_signal
+    
+    def _volatility_estimates(self, df: pd.DataFrame, state: Optional[StreamingFeatureState]) -> Dict[str, float]:
+        """EWMA, Parkinson, Garman-Klass y ATR del activo (estado incremental o cola del DataFrame)."""
+        try:
+            if state is not None:
+                return state.volatility_estimates()
+            tail = df.iloc[-BATCH_MIN_BARS:]
+            values = compute_volatility(*(tail[col].to_numpy(dtype=float) for col in ('open', 'high', 'low', 'close')))
+            return {name: float(series[-1]) for name, series in values.items()}
+        except Exception as e:
+            logger.debug(f"Error estimando volatilidad: {e}")
+            return {}
+    
+    def _select_volatility(self, close_to_close: float, estimates: Dict[str, float]) -> Tuple[float, Optional[float]]:
+        """
+        Volatilidad y ATR relativo que consumen el gestor de riesgo y la selección de estrategia.
+        
+        Returns:
+            (volatilidad por vela, atr_pct); con 'close_to_close' o sin estimación
+            válida se usa la desviación de retornos del sentimiento y no se aplica ATR
+        """
+        if self.volatility_estimator == 'close_to_close':
+            return close_to_close, None
+        value = estimates.get(self.volatility_estimator, np.nan)
+        if not np.isfinite(value):
+            return close_to_close, None
+        return float(value), estimates.get('atr_pct')
+    
+    def _sync_correlation(self, asset: str, df: pd.DataFrame) -> None:
+        """Ingiere las velas cerradas nuevas del activo en el motor de correlación."""
+        try:
+            self.correlation_engine.sync(asset, df)
+        except Exception as e:
+            logger.debug(f"Error actualizando correlaciones de {asset}: {e}")
+    
+    def _sync_analogs(self, asset: str, df: pd.DataFrame) -> None:
+        """Ingiere las velas cerradas nuevas del activo en el índice de análogos (si está activo)."""
+        if self.pattern_recognizer.analog_index is None:
+            return
+        try:
+            self.pattern_recognizer.update_analog_index(asset, df)
+        except Exception as e:
+            logger.debug(f"Error actualizando análogos de {asset}: {e}")
+    
+    def _find_analogs(self, asset: str, df: pd.DataFrame) -> Dict[str, Any]:
+        """Resumen de análogos históricos de la señal (vacío sin índice o ante errores)."""
+        if self.pattern_recognizer.analog_index is None:
+            return {}
+        try:
+            return self.pattern_recognizer.find_analogs(df, asset, self.analog_k, self.analog_cross_asset)
+        except Exception as e:
+            logger.debug(f"Error buscando análogos de {asset}: {e}")
+            return {}
+    
+    def _correlation_analysis(self, asset: str, direction: str) -> Dict[str, float]:
+        """Correlación con el grupo de divisa y exposición frente a las señales abiertas."""
+        try:
+            open_positions = self.signal_journal.open_signals(self.correlation_open_horizon)
+            return self.correlation_engine.analyze(asset, direction, open_positions)
+        except Exception as e:
+            logger.debug(f"Error en análisis de correlación de {asset}: {e}")
+            return {}
+    
+    def get_timeframe_views(self, asset: str, df: pd.DataFrame) -> Dict[int, pd.DataFrame]:
+        """
+        Velas de timeframes mayores (por defecto 5m, 15m y 1h) derivadas de `df`.
+        
+        El remuestreo es incremental por activo: solo se recalcula la última vela
+        mayor y no requiere capturas adicionales del broker.
+        
+        Returns:
+            Dict minutos -> DataFrame OHLCV (vacío si el índice no es temporal)
+        """
+        return self.timeframe_views.get(asset, df)
+    
+    def _timeframe_trends(self, asset: str, df: pd.DataFrame) -> Dict[int, float]:
+        """Fuerza de tendencia de cada timeframe mayor con velas suficientes."""
+        trends = {}
+        try:
+            for minutes, view in self.get_timeframe_views(asset, df).items():
+                if len(view) >= 20:
+                    trends[minutes] = self._calculate_trend_strength(view)
+        except Exception as e:
+            logger.debug(f"Error en vistas multi-timeframe de {asset}: {e}")
+        return trends
+    
+    @staticmethod
+    def _apply_confluence(
+        direction: str,
+        confidence: float,
+        trends: Dict[int, float]
+    ) -> Tuple[float, Optional[Dict[str, float]]]:
+        """
+        Ajusta la confianza según la tendencia de los timeframes mayores.
+        
+        Returns:
+            (confianza ajustada, detalle por timeframe y score en [-1, 1]) o el
+            original y None si no hay timeframes con datos
+        """
+        if not trends:
+            return confidence, None
+        sign = 1.0 if direction == 'CALL' else -1.0
+        score = float(np.mean([sign * value for value in trends.values()]))
+        adjusted = min(0.95, confidence * (1 + MTF_CONFLUENCE_WEIGHT * score))
+        detail = {f'{minutes}m': round(value, 4) for minutes, value in trends.items()}
+        detail['score'] = round(score, 4)
+        return adjusted, detail
+    
+    def _safe_update_harmonic(self, asset: str, df: pd.DataFrame) -> Optional[HarmonicMatch]:
+        """update_harmonic sin propagar errores (el patrón armónico es opcional)."""
+        try:
+            return self.pattern_recognizer.update_harmonic(asset, df)
+        except Exception as e:
+            logger.debug(f"Error detectando patrones armónicos: {e}")
+            return None
+    
+    @staticmethod
+    def _pattern_score_bounds(base_patterns: Dict[str, float]) -> Tuple[float, float]:
+        """Intervalo del score de patrones para cualquier score armónico posible (o ninguno)."""
+        total = sum(base_patterns.values())
+        count = len(base_patterns)
+        without = total / count if count else 0.5
+        low = min(without, total / (count + 1))
+        high = max(without, (total + HARMONIC_SCORE_WEIGHT) / (count + 1))
+        return low, high
+    
+    def _can_pass_gates(
+        self,
+        technical_score: float,
+        ml_score: float,
+        sentiment_score: float,
+        base_patterns: Dict[str, float],
+        recent_win_rate: float
+    ) -> bool:
+        """Indica si el activo aún puede dar señal antes de calcular el patrón armónico."""
+        pattern_low, pattern_high = self._pattern_score_bounds(base_patterns)
+        call, put = self.ensemble_predictor.max_confidences(
+            technical_score, ml_score, sentiment_score, pattern_low, pattern_high
+        )
+        best = float(max(call, put))
+        if self.mtf_confluence and best > 0:
+            best = min(0.95, best * (1 + MTF_CONFLUENCE_WEIGHT))
+        # should_trade es monótona en la confianza: basta con probar la máxima
+        return best > 0 and self.risk_manager.should_trade(best, recent_win_rate, 0.0)
+    
+    def analyze_assets(
+        self,
+        frames: Dict[str, pd.DataFrame],
+        indicators: Dict[str, Dict[str, Any]],
+        account_balance: float = 1000.0,
+        recent_win_rate: float = 0.50,
+        parallel: bool = True
+    ) -> Dict[str, Optional[AISignal]]:
+        """
+        Análisis por lotes de varios activos.
+        
+        Las colas de los DataFrames se alinean en arrays 2D (activos x velas) y las
+        features derivadas de precio (tendencia, fase, sentimiento, S/R, patrones
+        de velas y de gráfico) se calculan en una sola pasada vectorizada. El
+        patrón armónico solo se busca en los activos que aún pueden dar señal y
+        solo se construyen señales para los que pasan el ensemble y el riesgo.
+        Los activos con menos de BATCH_MIN_BARS velas usan analyze_asset.
+        
+        Args:
+            frames: DataFrame OHLCV por activo
+            indicators: Indicadores técnicos por activo
+            account_balance: Balance de la cuenta
+            recent_win_rate: Win rate reciente
+            parallel: Si hay executor paralelo activo, repartir los activos entre procesos
+        
+        Returns:
+            AISignal o None por activo
+        """
+        if parallel and self.parallel_executor is not None:
+            return self.parallel_executor.analyze_assets(frames, indicators, account_balance, recent_win_rate)
+        
+        results: Dict[str, Optional[AISignal]] = {}
+        batch = [
+            asset for asset, df in frames.items()
+            if df is not None and len(df) >= BATCH_MIN_BARS
+        ]
+        for asset, df in frames.items():
+            if asset not in batch:
+                results[asset] = self.analyze_asset(
+                    asset, df, indicators.get(asset, {}), account_balance, recent_win_rate
+                )
+        if not batch:
+            return results
+        
+        for asset in batch:
+            self._sync_correlation(asset, frames[asset])
+            self._sync_analogs(asset, frames[asset])
+        
+        try:
+            # 1. Alinear colas en arrays 2D y calcular features compartidas
+            tails = [frames[asset].iloc[-BATCH_MIN_BARS:] for asset in batch]
+            columns = {
+                col: np.stack([t[col].to_numpy(dtype=float) for t in tails])
+                for col in ('open', 'high', 'low', 'close')
+            }
+            has_volume = np.array(['volume' in t.columns for t in tails])
+            volume = np.stack([
+                t['volume'].to_numpy(dtype=float) if 'volume' in t.columns else np.full(len(t), np.nan)
+                for t in tails
+            ])
+            features = compute_features(
+                columns['open'], columns['high'], columns['low'], columns['close'],
+                volume, include_indicators=False
+            )
+            last = {name: values[:, -1] for name, values in features.items()}
+            last['volume_strength'] = np.where(has_volume, last['volume_strength'], 0.5)
+            last['bullish_divergence'] = last['bullish_divergence'] & has_volume
+            last['bearish_divergence'] = last['bearish_divergence'] & has_volume
             
-            # 10. VALIDACIÓN DE RIESGO
-            if not self.risk_manager.should_trade(ensemble_confidence, recent_win_rate, 0.0):
-                logger.info(f"Signal filtered por gestión de riesgo para {asset}")
-                return None
-            
-            # 11. CREAR SEÑAL DE IA
-            current_price = float(df['close'].iloc[-1])
-            
-            # Determinar estrategia utilizada
-            strategy = self._determine_strategy(technical_score, sentiment_score, volatility_level)
-            
-            # Calcular puntos de entrada y salida
-            if direction == 'CALL':
-                entry_price = current_price
-                stop_loss = entry_price * (1 - position_sizing['stop_loss_pct'] / 100)
-                target_profit = entry_price * (1 + position_sizing['take_profit_pct'] / 100)
-            else:
-                entry_price = current_price
-                stop_loss = entry_price * (1 + position_sizing['stop_loss_pct'] / 100)
-                target_profit = entry_price * (1 - position_sizing['take_profit_pct'] / 100)
-            
-            ai_signal = AISignal(
-                asset=asset,
-                direction=direction,
-                confidence=ensemble_confidence,
-                ai_confidence=ensemble_confidence,
-                probability=ensemble_confidence,
-                strategy=strategy,
-                market_phase=market_phase,
-                entry_price=entry_price,
-                target_profit=target_profit,
-                stop_loss=stop_loss,
-                risk_reward_ratio=position_sizing['risk_reward_ratio'],
-                indicators_used=['RSI', 'MACD', 'BB', 'ADX', 'EMA', 'Stochastic'],
-                timestamp=datetime.now(),
-                expiration_minutes=1,
-                ml_score=ml_score,
-                technical_score=technical_score,
-                sentiment_score=sentiment_score,
-                volatility_level=volatility_level,
-                trend_strength=trend_strength,
-                reversal_probability=self._calculate_reversal_probability(indicators),
-                support_level=support,
-                resistance_level=resistance,
-                pivot_points=pivot_points,
-                correlation_analysis={},
-                pattern_detected=pattern_detected,
-                market_structure=market_phase.value,
-                additional_context={
-                    'divergences': divergences,
-                    'volume_strength': sentiment['volume_strength'],
-                    'momentum': sentiment['momentum'],
-                    'position_size_pct': position_sizing['risk_percentage']
+            # 2. Scores por activo (indicadores en vivo y detector armónico incremental)
+            asset_indicators = [indicators.get(asset, {}) for asset in batch]
+            technical = np.array([self._calculate_technical_score(ind) for ind in asset_indicators])
+            ml = self._get_ml_predictions(asset_indicators, batch)
+            pattern_scores = np.zeros(len(batch))
+            pattern_names: List[Optional[str]] = []
+            for i, asset in enumerate(batch):
+                patterns = {}
+                base_patterns = {
+                    'candle_pattern': float(last['candle_pattern'][i]),
+                    'chart_pattern': float(last['chart_pattern'][i])
                 }
-            )
+                # El detector armónico solo se actualiza si el activo aún puede dar señal
+                match = None
+                if self._can_pass_gates(
+                    float(technical[i]), float(ml[i]), float(last['sentiment_score'][i]),
+                    base_patterns, recent_win_rate
+                ):
+                    match = self.pattern_recognizer.update_harmonic(asset, frames[asset])
+                else:
+                    self.stage_stats['early_exit'] += 1
+                if match is not None:
+                    patterns['harmonic_formations'] = HARMONIC_SCORE_WEIGHT * match.score
+                patterns.update(base_patterns)
+                pattern_scores[i] = np.mean(list(patterns.values()))
+                detected = max(patterns, key=patterns.get)
+                pattern_names.append(match.pattern if detected == 'harmonic_formations' else detected)
+                
+                self.sentiment_analyzer.sentiment_history[asset].append(float(last['bullish_pressure'][i]))
+                self.sentiment_analyzer.volatility_history[asset].append(float(last['volatility'][i]))
             
-            # Guardar en histórico
-            self.signal_history.append({
-                'timestamp': datetime.now(),
-                'asset': asset,
-                'signal': ai_signal,
-                'was_profitable': None  # Se actualiza después
-            })
+            # 3. Ensemble vectorizado
+            directions, confidences = self.ensemble_predictor.predict_directions(
+                technical, ml, last['sentiment_score'], pattern_scores
+            )
             
-            return ai_signal
+            # 4. Riesgo y construcción de señales solo para los supervivientes
+            for i, asset in enumerate(batch):
+                direction = directions[i]
+                confidence = float(confidences[i])
+                confluence = None
+                if direction is not None and self.mtf_confluence:
+                    confidence, confluence = self._apply_confluence(
+                        direction, confidence, self._timeframe_trends(asset, frames[asset])
+                    )
+                if direction is None or not self.risk_manager.should_trade(confidence, recent_win_rate, 0.0):
+                    results[asset] = None
+                    continue
+                
+                state = self._get_feature_state(asset, frames[asset])
+                volatility = self._volatility_estimates(frames[asset], state)
+                volatility_level, atr_pct = self._select_volatility(float(last['volatility'][i]), volatility)
+                support, resistance = float(last['support'][i]), float(last['resistance'][i])
+                if state is not None and self.pattern_recognizer.sr_method == 'profile':
+                    support, resistance = self.pattern_recognizer.detect_support_resistance(frames[asset], state)
+                trend_strength = float(last['trend_strength'][i])
+                position_sizing = self.risk_manager.calculate_position_size(
+                    account_balance, confidence, volatility_level, trend_strength, atr_pct
+                )
+                sentiment = {
+                    'volume_strength': float(last['volume_strength'][i]),
+                    'momentum': float(last['momentum'][i])
+                }
+                results[asset] = self._build_ai_signal(
+                    asset=asset,
+                    direction=direction,
+                    confidence=confidence,
+                    current_price=float(columns['close'][i, -1]),
+                    position_sizing=position_sizing,
+                    technical_score=float(technical[i]),
+                    ml_score=float(ml[i]),
+                    sentiment_score=float(last['sentiment_score'][i]),
+                    sentiment=sentiment,
+                    volatility_level=volatility_level,
+                    trend_strength=trend_strength,
+                    market_phase=MarketPhase(PHASE_CODES[int(last['market_phase'][i])]),
+                    support=support,
+                    resistance=resistance,
+                    pivot_points={key: float(last[key][i]) for key in ('pivot', 'r1', 's1', 'r2', 's2', 'r3', 's3')},
+                    pattern_detected=pattern_names[i],
+                    pattern_score=float(pattern_scores[i]),
+                    divergences={
+                        'bullish_divergence': bool(last['bullish_divergence'][i]),
+                        'bearish_divergence': bool(last['bearish_divergence'][i]),
+                        'volume_divergence': False,
+                        **self.sentiment_analyzer.indicator_divergence_context(state)
+                    },
+                    indicators=asset_indicators[i],
+                    volatility_estimates=volatility
+                )
+                if confluence is not None:
+                    results[asset].additional_context['timeframe_confluence'] = confluence
+                analogs = self._find_analogs(asset, frames[asset])
+                if analogs:
+                    results[asset].additional_context['analogs'] = analogs
         
         except Exception as e:
-            logger.error(f"Error en análisis de IA para {asset}: {e}")
+            logger.error(f"Error en análisis por lotes de {len(batch)} activos: {e}")
             import traceback
             logger.error(traceback.format_exc())
+            for asset in batch:
+                results.setdefault(asset, None)
+        
+        signals = sum(1 for asset in batch if results.get(asset) is not None)
+        logger.info(f"[BATCH] {len(batch)} activos analizados en lote, {signals} señales")
+        return results
+    
+    def analyze_watchlist(
+        self,
+        frames: Dict[str, pd.DataFrame],
+        indicators: Dict[str, Dict[str, Any]],
+        account_balance: float = 1000.0,
+        recent_win_rate: float = 0.50,
+        payouts: Optional[Dict[str, Any]] = None,
+        budget_seconds: Optional[float] = None
+    ) -> Dict[str, Optional[AISignal]]:
+        """
+        Analiza la watchlist por prioridad (payout × volatilidad × recencia de señal)
+        dentro de un presupuesto de tiempo; los activos que no caben se degradan a
+        cheap_only o se omiten.
+        
+        Args:
+            frames: Dict activo -> DataFrame OHLCV
+            indicators: Dict activo -> indicadores
+            account_balance: Balance de la cuenta
+            recent_win_rate: Win rate reciente
+            payouts: Payout por activo en % (p. ej. BrokerCapture.payout_data)
+            budget_seconds: Presupuesto del ciclo (por defecto ai_engine.watchlist_budget_s)
+            
+        Returns:
+            Dict activo -> AISignal o None; cobertura en watchlist_prioritizer.get_report()
+        """
+        if payouts is not None:
+            self.watchlist_prioritizer.payouts = payouts
+        return self.watchlist_prioritizer.run_cycle(
+            frames, indicators, account_balance, recent_win_rate, budget_seconds
+        )
+    
+    def _build_ai_signal(
+        self,
+        asset: str,
+        direction: str,
+        confidence: float,
+        current_price: float,
+        position_sizing: Dict[str, float],
+        technical_score: float,
+        ml_score: float,
+        sentiment_score: float,
+        sentiment: Dict[str, float],
+        volatility_level: float,
+        trend_strength: float,
+        market_phase: MarketPhase,
+        support: float,
+        resistance: float,
+        pivot_points: Dict[str, float],
+        pattern_detected: Optional[str],
+        divergences: Dict[str, Any],
+        indicators: Dict[str, Any],
+        pattern_score: float = 0.5,
+        volatility_estimates: Optional[Dict[str, float]] = None
+    ) -> AISignal:
+        """Construye la AISignal final y la registra en el histórico."""
+        # Determinar estrategia utilizada
+        strategy = self._determine_strategy(technical_score, sentiment_score, volatility_level)
+        
+        # Calcular puntos de entrada y salida
+        entry_price = current_price
+        if direction == 'CALL':
+            stop_loss = entry_price * (1 - position_sizing['stop_loss_pct'] / 100)
+            target_profit = entry_price * (1 + position_sizing['take_profit_pct'] / 100)
+        else:
+            stop_loss = entry_price * (1 + position_sizing['stop_loss_pct'] / 100)
+            target_profit = entry_price * (1 - position_sizing['take_profit_pct'] / 100)
+        
+        ai_signal = AISignal(
+            asset=asset,
+            direction=direction,
+            confidence=confidence,
+            ai_confidence=confidence,
+            probability=confidence,
+            strategy=strategy,
+            market_phase=market_phase,
+            entry_price=entry_price,
+            target_profit=target_profit,
+            stop_loss=stop_loss,
+            risk_reward_ratio=position_sizing['risk_reward_ratio'],
+            indicators_used=['RSI', 'MACD', 'BB', 'ADX', 'EMA', 'Stochastic'],
+            timestamp=datetime.now(),
+            expiration_minutes=1,
+            ml_score=ml_score,
+            technical_score=technical_score,
+            sentiment_score=sentiment_score,
+            volatility_level=volatility_level,
+            trend_strength=trend_strength,
+            reversal_probability=self._calculate_reversal_probability(indicators),
+            support_level=support,
+            resistance_level=resistance,
+            pivot_points=pivot_points,
+            correlation_analysis=self._correlation_analysis(asset, direction),
+            pattern_detected=pattern_detected,
+            pattern_score=pattern_score,
+            market_structure=market_phase.value,
+            additional_context={
+                'divergences': divergences,
+                'volume_strength': sentiment['volume_strength'],
+                'momentum': sentiment['momentum'],
+                'position_size_pct': position_sizing['risk_percentage'],
+                'harmonic_pattern': self._describe_harmonic(asset)
+            }
+        )
+        if volatility_estimates:
+            ai_signal.additional_context['volatility'] = volatility_estimates
+        
+        self._record_signal(ai_signal, indicators)
+        
+        return ai_signal
+    
+    def _record_signal(self, ai_signal: AISignal, indicators: Dict[str, Any]) -> Optional[int]:
+        """Guarda la señal en el histórico (el resultado se registra después por signal_id)."""
+        if not self.record_signals:
             return None
+        signal_id = self.signal_journal.record(ai_signal)
+        if self.online_learner is not None:
+            self.online_learner.remember(signal_id, ai_signal.asset, ai_signal.direction, indicators)
+        return signal_id
     
     def _calculate_technical_score(self, indicators: Dict[str, Any]) -> float:
         """Calcula score técnico combinando múltiples indicadores."""
@@ -697,12 +1634,45 @@ class AdvancedAIEngine:
             logger.debug(f"Error calculando technical score: {e}")
             return 0.0
     
-    def _calculate_trend_strength(self, df: pd.DataFrame) -> float:
+    def build_feature_matrix(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Features del motor para todas las velas del histórico (backtests, entrenamiento).
+        
+        Args:
+            df: DataFrame OHLC(V), opcionalmente con columnas de indicadores
+            
+        Returns:
+            DataFrame columnar con una fila por vela
+        """
+        return build_feature_matrix(df)
+    
+    def _describe_harmonic(self, asset: str) -> Optional[Dict[str, Any]]:
+        """Resumen serializable del patrón armónico vigente del activo."""
+        match = self.pattern_recognizer.harmonic_matches.get(asset)
+        if match is None:
+            return None
+        return {
+            'pattern': match.pattern,
+            'completed': match.completed,
+            'score': round(match.score, 3),
+            'prz_low': match.prz_low,
+            'prz_high': match.prz_high,
+            'ratios': {k: round(v, 3) for k, v in match.ratios.items()}
+        }
+    
+    def _calculate_trend_strength(
+        self,
+        df: pd.DataFrame,
+        state: Optional[StreamingFeatureState] = None
+    ) -> float:
         """Calcula la fuerza de la tendencia."""
         try:
             if len(df) < 20:
                 return 0.0
             
+            if state is not None:
+                return state.trend_strength()
+            
             x = np.arange(len(df[-20:]))
             y = df['close'].values[-20:]
             
@@ -742,9 +1712,41 @@ class AdvancedAIEngine:
             return {}
     
     def _get_ml_prediction(self, indicators: Dict[str, Any], asset: str) -> float:
-        """Obtiene predicción del modelo ML (0-1)."""
-        # Este método debe conectarse con el modelo ML real
-        # Por ahora retorna un valor estimado
+        """
+        Obtiene predicción del modelo ML (0-1).
+        
+        Con servicio de inferencia y modelo para la categoría del activo, la
+        petición se agrupa con las concurrentes de otros activos; si no, se
+        usa el proxy basado en RSI.
+        """
+        if self.ml_service is not None and self.ml_service.has_model(asset):
+            try:
+                return self.ml_service.predict(asset, indicators)
+            except Exception as e:
+                logger.debug(f"[ML-INFER] Predicción de {asset} no disponible: {e}")
+        return self._proxy_ml_score(indicators)
+    
+    def _get_ml_predictions(self, asset_indicators: List[Dict[str, Any]], assets: List[str]) -> np.ndarray:
+        """
+        Predicción ML de un lote de activos: una llamada predict_proba por categoría.
+        
+        Args:
+            asset_indicators: Indicadores de cada activo
+            assets: Activos en el mismo orden
+            
+        Returns:
+            Array de scores (proxy RSI donde no hay modelo)
+        """
+        predictions: List[Optional[float]] = [None] * len(assets)
+        if self.ml_service is not None:
+            predictions = self.ml_service.predict_many(list(zip(assets, asset_indicators)))
+        return np.array([
+            p if p is not None else self._proxy_ml_score(ind)
+            for p, ind in zip(predictions, asset_indicators)
+        ])
+    
+    def _proxy_ml_score(self, indicators: Dict[str, Any]) -> float:
+        """Score ML aproximado cuando no hay modelo entrenado."""
         try:
             # Usar RSI como proxy simple para ML score
             rsi = indicators.get('rsi', {}).get('value', 50)
@@ -800,31 +1802,56 @@ class AdvancedAIEngine:
         else:
             return StrategyType.HYBRID if hasattr(StrategyType, 'HYBRID') else StrategyType.TREND_FOLLOWING
     
-    def get_performance_summary(self) -> Dict[str, Any]:
-        """Retorna resumen de rendimiento de la IA."""
-        
-        if not self.signal_history:
-            return {}
+    def record_signal_outcome(
+        self,
+        result: str,
+        profit_loss: float = 0.0,
+        signal_id: Optional[int] = None,
+        asset: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Registra el resultado de una señal en el journal (y lo encola para el
+        aprendizaje en línea si está activo).
         
-        completed_signals = [
-            s for s in self.signal_history
-            if s['was_profitable'] is not None
-        ]
+        Args:
+            result: 'win', 'loss' o 'draw'
+            profit_loss: Ganancia/pérdida
+            signal_id: Id de la señal (O(1)); si es None se usa la pendiente más antigua de `asset`
+            asset: Activo (cuando no se conoce el signal_id)
         
-        if not completed_signals:
+        Returns:
+            signal_id actualizado o None
+        """
+        if signal_id is not None:
+            signal_id = signal_id if self.signal_journal.record_outcome(signal_id, result, profit_loss) else None
+        elif asset is not None:
+            signal_id = self.signal_journal.record_asset_outcome(asset, result, profit_loss)
+        if signal_id is not None and self.online_learner is not None:
+            self.online_learner.record_outcome(signal_id, result)
+        return signal_id
+    
+    def get_performance_summary(self) -> Dict[str, Any]:
+        """Retorna resumen de rendimiento de la IA (agregados del journal, tiempo constante)."""
+        summary = self.signal_journal.get_summary()
+        if not summary['total_signals'] or not summary['completed_signals']:
             return {}
         
-        wins = sum(1 for s in completed_signals if s['was_profitable'])
-        win_rate = wins / len(completed_signals)
-        
         return {
-            'total_signals': len(self.signal_history),
-            'completed_signals': len(completed_signals),
-            'win_rate': win_rate,
-            'win_count': wins,
-            'loss_count': len(completed_signals) - wins,
-            'accuracy': f"{win_rate * 100:.1f}%"
+            'total_signals': summary['total_signals'],
+            'completed_signals': summary['completed_signals'],
+            'win_rate': summary['win_rate'],
+            'win_count': summary['win_count'],
+            'loss_count': summary['loss_count'],
+            'accuracy': f"{summary['win_rate'] * 100:.1f}%"
         }
+    
+    def get_ml_inference_stats(self) -> Dict[str, Any]:
+        """Latencia y tamaño de lote del servicio de inferencia ML (vacío si no está activo)."""
+        return self.ml_service.get_stats() if self.ml_service is not None else {}
+    
+    def get_online_learning_stats(self) -> Dict[str, Any]:
+        """Actualizaciones, consolidaciones y buffers del aprendizaje en línea (vacío si no está activo)."""
+        return self.online_learner.get_stats() if self.online_learner is not None else {}
 
 
 # ============================================================================
@@ -863,6 +1890,7 @@ def convert_ai_signal_to_bot_signal(ai_signal: AISignal) -> Dict[str, Any]:
         'pattern_detected': ai_signal.pattern_detected,
         'expiration_minutes': ai_signal.expiration_minutes,
         'timestamp': ai_signal.timestamp.isoformat(),
+        'signal_id': ai_signal.signal_id,
         'notify': ai_signal.confidence > 0.65,
         'additional_context': ai_signal.additional_context
     }
@@ -11,7 +11,7 @@ Permite reemplazar el signal_generator.py con la IA avanzada manteniendo compati
 """
 
 import logging
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Callable, Iterable
 from datetime import datetime
 import numpy as np
 from advanced_ai_engine import (
@@ -19,6 +19,7 @@ from advanced_ai_engine import (
     AISignal,
     convert_ai_signal_to_bot_signal
 )
+from analysis_scheduler import BarCloseScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -189,11 +190,57 @@ class AISignalAdapter:
             'total_analysis_runs': perf.get('total_signals', 0)
         }
     
+    def schedule_on_bar_close(
+        self,
+        capture: Any,
+        get_market_data: Callable[[str, int], Optional[Dict[str, Any]]],
+        on_signal: Callable[[Dict[str, Any]], None],
+        timeframes: Iterable[int] = (1,),
+        pre_close_seconds: Optional[float] = None,
+        late_threshold_seconds: float = 2.0
+    ) -> BarCloseScheduler:
+        """
+        Analiza cada activo una sola vez por cierre de vela (en lugar de por temporizador).
+        
+        Args:
+            capture: BrokerCapture (fuente de eventos de cierre y reloj del broker)
+            get_market_data: get_market_data(asset, timeframe) -> dict con 'df' e
+                             'indicators' (y opcionalmente 'is_otc', 'account_balance',
+                             'recent_win_rate'), o None para omitir el activo
+            on_signal: Recibe cada señal generada (con 'trigger' = 'close' o 'pre_close')
+            timeframes: Timeframes en minutos
+            pre_close_seconds: Análisis adicional estos segundos antes del cierre (None = solo al cierre)
+            late_threshold_seconds: Retraso a partir del cual una ejecución cuenta como tardía
+        
+        Returns:
+            Scheduler en marcha (get_report() para velas perdidas y ejecuciones tardías)
+        """
+        capture.configure_bar_close(timeframes, pre_close_seconds)
+        
+        def run(asset: str, timeframe: int, kind: str) -> None:
+            data = get_market_data(asset, timeframe)
+            if data is None:
+                return
+            signal = self.generate_signal_with_ai(asset=asset, **data)
+            if signal is not None:
+                signal['trigger'] = kind
+                on_signal(signal)
+        
+        scheduler = BarCloseScheduler(
+            run,
+            late_threshold_seconds=late_threshold_seconds,
+            clock=capture.frame_timing.broker_now
+        ).attach(capture)
+        scheduler.start()
+        logger.info(f"[AI-SCHED] Análisis por cierre de vela activo (timeframes={list(timeframes)})")
+        return scheduler
+    
     def record_signal_result(
         self,
         asset: str,
         result: str,  # 'win', 'loss', 'draw'
-        profit_loss: float
+        profit_loss: float,
+        signal_id: Optional[int] = None
     ) -> None:
         """
         Registra resultado de una operación para mejora de IA.
@@ -202,6 +249,8 @@ class AISignalAdapter:
             asset: Símbolo del activo
             result: Resultado de la operación
             profit_loss: Ganancia/pérdida
+            signal_id: Id de la señal (campo 'signal_id' de la señal del bot);
+                       si es None se marca la señal pendiente más antigua del activo
         """
         
         if asset in self.signal_cache:
@@ -213,12 +262,7 @@ class AISignalAdapter:
                     self.strategy_stats[strategy]['wins'] += 1
             
             # Marcar en histórico de IA
-            was_profitable = result == 'win'
-            for signal_record in self.ai_engine.signal_history:
-                if (signal_record['asset'] == asset and 
-                    signal_record['was_profitable'] is None):
-                    signal_record['was_profitable'] = was_profitable
-                    break
+            self.ai_engine.record_signal_outcome(result, profit_loss, signal_id=signal_id, asset=asset)
             
             logger.info(
                 f"[AI-RESULT] {asset}: {result.upper()} | "
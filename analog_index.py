@@ -0,0 +1,426 @@
+"""
+Analog Index - Búsqueda de análogos históricos por distancia z-normalizada
+==========================================================================
+
+Dadas las últimas N velas, encuentra las K ventanas históricas más parecidas
+(distancia euclídea entre ventanas z-normalizadas, como en MASS / matrix
+profile) y resume qué ocurrió después de cada una.
+
+Diseño:
+  - Todas las series (una o varias por activo) se guardan concatenadas en un
+    único array de cierres; cada tramo contiguo es un segmento y ninguna
+    ventana cruza segmentos.
+  - Producto escalar consulta/ventanas por FFT con solapamiento (overlap-save):
+    el histórico se divide en bloques de `block_size` puntos cuya FFT se cachea.
+    Añadir velas solo recalcula la FFT del último bloque; una consulta es un
+    producto y una IFFT por lote de bloques, O(n log B) sin FFT del histórico.
+  - Desviación y retorno futuro de cada ventana se calculan una vez al
+    completarse (incremental); las ventanas planas o sin futuro conocido
+    quedan excluidas (escala NaN).
+  - Top-K exacto sin recorrer todo el histórico ordenado: máximos por tramos
+    del radio de supresión y selección voraz sobre los 3K+1 mejores tramos.
+  - Consultas por activo (solo los bloques que cubren sus segmentos) o entre
+    todos los activos.
+
+distancia² = 2·m·(1 - correlación de Pearson)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import fft as sp_fft
+from numpy.lib.stride_tricks import sliding_window_view
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional, Any, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 32
+DEFAULT_HORIZON = 5
+DEFAULT_BLOCK_SIZE = 16384
+
+
+@dataclass
+class AnalogMatch:
+    """Ventana histórica similar a la consulta."""
+    asset: str
+    time: Any  # Hora de la última vela de la ventana
+    position: int  # Inicio de la ventana en el índice
+    distance: float
+    correlation: float
+    forward_return: float  # Retorno del cierre `horizon` velas después
+
+
+class AnalogIndex:
+    """
+    Índice de ventanas de precio para búsqueda de análogos.
+
+    Características:
+    - Append incremental por activo (solo velas cerradas nuevas)
+    - FFT por bloques cacheada; consulta en O(n log B)
+    - Consultas por activo o entre activos
+    - Exclusión de coincidencias triviales (ventanas solapadas)
+    """
+
+    def __init__(
+        self,
+        window: int = DEFAULT_WINDOW,
+        horizon: int = DEFAULT_HORIZON,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        max_points: int = 4_000_000
+    ):
+        """
+        Inicializa el índice.
+
+        Args:
+            window: Velas por ventana (longitud de la consulta)
+            horizon: Velas hacia delante para el retorno futuro
+            block_size: Puntos por bloque de FFT (potencia de 2 mayor que window)
+            max_points: Tamaño máximo; al superarlo se descarta la mitad más antigua
+        """
+        if block_size <= 2 * window:
+            raise ValueError("block_size debe ser mayor que 2 * window")
+        self.window = window
+        self.horizon = horizon
+        self.block_size = block_size
+        self.step = block_size - window + 1
+        self.max_points = max_points
+        self._init_storage()
+
+    def _init_storage(self) -> None:
+        self.size = 0
+        capacity = 1024
+        self._values = np.zeros(capacity)
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._segment_ids = np.zeros(capacity, dtype=np.int32)
+        self._scale = np.full(capacity, np.nan)  # 1 / (m·σ) por inicio de ventana; NaN = no válida
+        self._forward = np.full(capacity, np.nan)
+        self._completed = 0  # Ventanas [0, _completed) ya evaluadas
+
+        # segment id -> [activo, inicio, fin (exclusivo)]
+        self.segments: List[List[Any]] = []
+        self.asset_segments: Dict[str, List[int]] = {}
+        self.last_time: Dict[str, int] = {}
+
+        self._block_fft = np.zeros((4, self.block_size // 2 + 1), dtype=np.complex128)
+        self._block_final = np.zeros(4, dtype=bool)  # FFT calculada con el bloque completo
+
+    # ------------------------------------------------------------------
+    # Ingesta
+    # ------------------------------------------------------------------
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._values)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, fill in (('_values', 0.0), ('_times', 0), ('_segment_ids', 0), ('_scale', np.nan), ('_forward', np.nan)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def append(self, asset: str, times: np.ndarray, closes: np.ndarray, new_segment: bool = False) -> int:
+        """
+        Añade velas cerradas de un activo.
+
+        Args:
+            asset: Activo
+            times: Tiempos (int64 ns) crecientes
+            closes: Cierres
+            new_segment: Forzar un segmento nuevo (hueco en los datos)
+
+        Returns:
+            Velas añadidas
+        """
+        times = np.asarray(times, dtype=np.int64)
+        closes = np.asarray(closes, dtype=float)
+        last = self.last_time.get(asset)
+        if last is not None:
+            keep = times > last
+            times, closes = times[keep], closes[keep]
+        count = len(closes)
+        if count == 0:
+            return 0
+        if self.size + count > self.max_points:
+            self._compact(self.size + count - self.max_points)
+
+        segments = self.asset_segments.setdefault(asset, [])
+        if new_segment or not segments or self.segments[segments[-1]][2] != self.size:
+            segments.append(len(self.segments))
+            self.segments.append([asset, self.size, self.size])
+        segment_id = segments[-1]
+
+        start, end = self.size, self.size + count
+        self._grow(end)
+        self._values[start:end] = closes
+        self._times[start:end] = times
+        self._segment_ids[start:end] = segment_id
+        self.segments[segment_id][2] = end
+        self.size = end
+        self.last_time[asset] = int(times[-1])
+        self._complete_windows()
+        return count
+
+    def sync(self, asset: str, df: pd.DataFrame) -> int:
+        """
+        Añade las velas cerradas nuevas del DataFrame (la última fila es la vela en formación).
+
+        Si el DataFrame no contiene la última vela indexada del activo se abre
+        un segmento nuevo para no unir tramos con hueco.
+        """
+        if df is None or len(df) < 2 or not isinstance(df.index, pd.DatetimeIndex):
+            return 0
+        index = df.index[:-1]
+        times = (index.as_unit('ns') if hasattr(index, 'as_unit') else index).asi8
+        last = self.last_time.get(asset)
+        new_segment = False
+        if last is not None and not np.any(times == last):
+            # Sin la última vela indexada: contiguo solo si empieza en la vela siguiente
+            spacing = np.median(np.diff(times)) if len(times) > 1 else np.inf
+            new_segment = not (times[0] > last and times[0] - last <= 1.5 * spacing)
+        return self.append(asset, times, df['close'].to_numpy(dtype=float)[:-1], new_segment)
+
+    def _complete_windows(self, chunk: int = 65536) -> None:
+        """Evalúa las ventanas cuyo retorno futuro ya es conocido (por tramos para acotar memoria)."""
+        m, h = self.window, self.horizon
+        last = self.size - m - h + 1  # exclusivo
+        for first in range(self._completed, last, chunk):
+            stop = min(first + chunk, last)
+            windows = sliding_window_view(self._values[first:stop + m - 1], m)
+            mean = windows.mean(axis=1)
+            sigma = windows.std(axis=1)
+
+            starts = np.arange(first, stop)
+            ends = starts + m - 1
+            future = ends + h
+            valid = (
+                (self._segment_ids[starts] == self._segment_ids[future])
+                & (sigma > 1e-12 * np.maximum(np.abs(mean), 1.0))
+            )
+            self._scale[first:stop] = np.where(valid, 1.0 / (m * np.where(valid, sigma, 1.0)), np.nan)
+            self._forward[first:stop] = np.where(
+                valid, self._values[future] / self._values[ends] - 1.0, np.nan
+            )
+        self._completed = max(self._completed, last)
+
+    def _compact(self, overflow: int) -> None:
+        """Descarta la parte más antigua del índice y lo reconstruye."""
+        keep_from = max(overflow, self.size // 2)
+        retained = [
+            (asset, self._times[max(start, keep_from):end].copy(), self._values[max(start, keep_from):end].copy())
+            for asset, start, end in self.segments if end > keep_from
+        ]
+        logger.info(f"[ANALOG] Compactando índice: {self.size} -> {self.size - keep_from} puntos")
+        self._init_storage()
+        for asset, times, values in retained:
+            self.append(asset, times, values, new_segment=True)
+
+    # ------------------------------------------------------------------
+    # FFT por bloques
+    # ------------------------------------------------------------------
+
+    def _block_count(self) -> int:
+        if self.size < self.window:
+            return 0
+        return (self.size - self.window) // self.step + 1
+
+    def _ensure_blocks(self, blocks: np.ndarray) -> None:
+        """Calcula la FFT de los bloques pedidos que no la tengan definitiva."""
+        total = self._block_count()
+        if total > len(self._block_fft):
+            capacity = max(total, 2 * len(self._block_fft))
+            grown = np.zeros((capacity, self._block_fft.shape[1]), dtype=np.complex128)
+            grown[:len(self._block_fft)] = self._block_fft
+            self._block_fft = grown
+            final = np.zeros(capacity, dtype=bool)
+            final[:len(self._block_final)] = self._block_final
+            self._block_final = final
+        pending = blocks[~self._block_final[blocks]]
+        if len(pending) == 0:
+            return
+        B = self.block_size
+        segment = np.zeros((len(pending), B))
+        for row, block in enumerate(pending):
+            start = block * self.step
+            data = self._values[start:min(start + B, self.size)]
+            segment[row, :len(data)] = data - data.mean()  # Centrado: Σq = 0 hace el producto invariante
+        self._block_fft[pending] = sp_fft.rfft(segment, axis=1)
+        # Bloques completos: su FFT ya no cambia con nuevos appends
+        self._block_final[pending] = pending * self.step + B <= self.size
+
+    def _blocks_for_ranges(self, ranges: Iterable[Tuple[int, int]]) -> np.ndarray:
+        """Bloques que contienen inicios de ventana dentro de los rangos [inicio, fin)."""
+        total = self._block_count()
+        blocks = set()
+        for start, end in ranges:
+            if end <= start:
+                continue
+            blocks.update(range(start // self.step, min(total, (end - 1) // self.step + 1)))
+        return np.array(sorted(blocks), dtype=np.int64)
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        assets: Optional[Iterable[str]] = None,
+        exclude: Optional[Tuple[str, int]] = None
+    ) -> List[AnalogMatch]:
+        """
+        K ventanas más parecidas a la consulta.
+
+        Args:
+            query: Últimos `window` cierres
+            k: Número de análogos
+            assets: Activos donde buscar (None = todos)
+            exclude: (activo, tiempo ns) de la consulta: se descartan las ventanas
+                     del activo que terminan a menos de `window` velas de ese tiempo
+
+        Returns:
+            Lista de AnalogMatch ordenada por distancia (vacía si no hay ventanas válidas)
+        """
+        m = self.window
+        q = np.asarray(query, dtype=float)[-m:]
+        if len(q) < m or self._completed == 0:
+            return []
+        q_sigma = q.std()
+        if q_sigma <= 1e-12 * max(abs(q.mean()), 1.0):
+            return []
+        q = (q - q.mean()) / q_sigma
+
+        if assets is None:
+            ranges = [(0, self._completed)]
+        else:
+            ranges = [
+                (self.segments[s][1], min(self.segments[s][2], self._completed))
+                for asset in assets for s in self.asset_segments.get(asset, [])
+            ]
+        blocks = self._blocks_for_ranges(ranges)
+        if len(blocks) == 0:
+            return []
+        self._ensure_blocks(blocks)
+
+        # Productos escalares y correlación de todas las ventanas de los bloques (filas de `step` inicios)
+        self._grow(int(blocks[-1] + 1) * self.step)
+        q_fft = sp_fft.rfft(q[::-1], n=self.block_size)
+        products = sp_fft.irfft(self._block_fft[blocks] * q_fft, n=self.block_size, axis=1)[:, m - 1:]
+        correlation = products * self._rows(self._scale, blocks)
+
+        if assets is not None:
+            keep = np.zeros(correlation.shape, dtype=bool)
+            for start, end in ranges:
+                self._fill_range(keep, blocks, start, end, True)
+            correlation[~keep] = np.nan
+
+        if exclude is not None:
+            position = self._position(*exclude)
+            if position is not None:
+                self._fill_range(correlation, blocks, position - 2 * m + 2, position + 1, np.nan)
+
+        return self._top_k(correlation, blocks, k)
+
+    def _rows(self, values: np.ndarray, blocks: np.ndarray) -> np.ndarray:
+        """Valores por inicio de ventana con forma (bloques, step)."""
+        step = self.step
+        if blocks[-1] - blocks[0] + 1 == len(blocks):
+            return values[blocks[0] * step:(blocks[-1] + 1) * step].reshape(-1, step)
+        return values[blocks[:, None] * step + np.arange(step)[None, :]]
+
+    def _fill_range(self, target: np.ndarray, blocks: np.ndarray, start: int, end: int, value: Any) -> None:
+        """Asigna `value` a los inicios de ventana [start, end) de una matriz (bloques, step)."""
+        step = self.step
+        first = int(np.searchsorted(blocks, max(start, 0) // step))
+        last = int(np.searchsorted(blocks, (end - 1) // step, side='right'))
+        for row in range(first, last):
+            base = blocks[row] * step
+            target[row, max(start - base, 0):max(min(end - base, step), 0)] = value
+
+    def _position(self, asset: str, time_ns: int) -> Optional[int]:
+        segments = self.asset_segments.get(asset)
+        if not segments:
+            return None
+        _, start, end = self.segments[segments[-1]]
+        pos = start + int(np.searchsorted(self._times[start:end], time_ns, side='right')) - 1
+        return pos if pos >= start else None
+
+    def _top_k(self, correlation: np.ndarray, blocks: np.ndarray, k: int) -> List[AnalogMatch]:
+        """
+        Mejores k sin solapamiento (supresión de vecinos a menos de window/2 velas).
+
+        Cada elegido suprime como mucho 3 tramos del radio de supresión, así que
+        los k elegidos están siempre entre los 3k+1 tramos con mayor máximo.
+        """
+        m = self.window
+        radius = max(1, m // 2)
+        flat = correlation.ravel()
+        chunk_max = np.fmax.reduceat(flat, np.arange(0, len(flat), radius))
+        valid_chunks = int(np.count_nonzero(np.isfinite(chunk_max)))
+        if valid_chunks == 0:
+            return []
+        pool = min(3 * k + 1, valid_chunks)
+        chunks = np.argpartition(-chunk_max, pool - 1)[:pool]  # NaN al final
+        candidates = (chunks[:, None] * radius + np.arange(radius)[None, :]).ravel()
+        candidates = candidates[candidates < len(flat)]
+        candidates = candidates[np.isfinite(flat[candidates])]
+        candidates = candidates[np.argsort(-flat[candidates])]
+        starts = blocks[candidates // self.step] * self.step + candidates % self.step
+
+        chosen: List[int] = []
+        for i, start in enumerate(starts):
+            if any(abs(start - starts[o]) < radius for o in chosen):
+                continue
+            chosen.append(i)
+            if len(chosen) == k:
+                break
+
+        matches = []
+        for i in chosen:
+            start = int(starts[i])
+            corr = float(min(1.0, flat[candidates[i]]))
+            matches.append(AnalogMatch(
+                asset=self.segments[self._segment_ids[start]][0],
+                time=pd.Timestamp(int(self._times[start + m - 1])),
+                position=start,
+                distance=float(np.sqrt(max(0.0, 2 * m * (1 - corr)))),
+                correlation=corr,
+                forward_return=float(self._forward[start])
+            ))
+        return matches
+
+    @staticmethod
+    def summarize(matches: List[AnalogMatch]) -> Dict[str, Any]:
+        """Resumen de lo que pasó después de los análogos."""
+        if not matches:
+            return {}
+        returns = np.array([m.forward_return for m in matches])
+        distances = np.array([m.distance for m in matches])
+        weights = 1.0 / (distances + 1e-9)
+        return {
+            'matches': len(matches),
+            'mean_forward_return': float(returns.mean()),
+            'weighted_forward_return': float(np.average(returns, weights=weights)),
+            'median_forward_return': float(np.median(returns)),
+            'up_probability': float((returns > 0).mean()),
+            'mean_correlation': float(np.mean([m.correlation for m in matches])),
+            'nearest': [
+                {'asset': m.asset, 'time': str(m.time), 'distance': m.distance, 'forward_return': m.forward_return}
+                for m in matches[:3]
+            ]
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'points': self.size,
+            'windows': int(np.count_nonzero(np.isfinite(self._scale[:self._completed]))),
+            'segments': len(self.segments),
+            'assets': len(self.asset_segments),
+            'blocks': self._block_count(),
+            'cached_blocks': int(self._block_final.sum()),
+            'nbytes': int(self._values.nbytes * 3 + self._times.nbytes + self._segment_ids.nbytes
+                          + self._block_fft.nbytes)
+        }
@@ -0,0 +1,219 @@
+"""
+Analysis Cache - Memoización de sub-resultados del análisis por vela
+====================================================================
+
+AdvancedAIEngine.analyze_asset se llama varias veces sobre las mismas velas
+(reintentos, re-chequeos de notificaciones, API). Este cache guarda cada
+sub-resultado (S/R, pivotes, fase, divergencias, patrones...) bajo una clave
+derivada de las velas, de modo que repetir el análisis de la misma vela no
+recalcula nada.
+
+Claves por vela:
+  - closed:  (asset, timeframe, tiempo de la última vela cerrada, velas cerradas)
+             para resultados que solo dependen de velas cerradas; una vela en
+             formación nueva no los invalida.
+  - forming: closed + OHLCV de la vela en formación, para resultados que la usan.
+
+Expulsión LRU con límite de entradas y de memoria estimada.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, is_dataclass
+from typing import Dict, Tuple, Any, Optional, Callable
+import numpy as np
+import pandas as pd
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class BarKeys:
+    """Claves de cache de un DataFrame de velas."""
+    closed: Tuple
+    forming: Tuple
+
+
+def _timestamp(value: Any) -> Any:
+    if isinstance(value, pd.Timestamp):
+        return value.value
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def infer_timeframe(df: pd.DataFrame) -> Any:
+    """Timeframe aproximado a partir de las dos últimas velas del índice."""
+    if len(df) < 2:
+        return 0
+    try:
+        delta = df.index[-1] - df.index[-2]
+        return int(delta.total_seconds()) if hasattr(delta, 'total_seconds') else _timestamp(delta)
+    except TypeError:
+        return 0
+
+
+def bar_keys(asset: str, df: pd.DataFrame, timeframe: Any = None) -> BarKeys:
+    """
+    Construye las claves closed/forming de un DataFrame.
+
+    Args:
+        asset: Activo
+        df: DataFrame OHLCV (la última fila es la vela en formación)
+        timeframe: Timeframe; si es None se infiere del índice
+
+    Returns:
+        BarKeys
+    """
+    if timeframe is None:
+        timeframe = infer_timeframe(df)
+    n = len(df)
+    first_time = _timestamp(df.index[0]) if n else None
+    prev_time = _timestamp(df.index[-2]) if n >= 2 else None
+    closed = (asset, timeframe, first_time, prev_time, n - 1)
+
+    if n:
+        last = df.iloc[-1]
+        forming_bar = (
+            _timestamp(df.index[-1]),
+            float(last['open']), float(last['high']), float(last['low']), float(last['close']),
+            float(last['volume']) if 'volume' in df.columns else None
+        )
+    else:
+        forming_bar = None
+    return BarKeys(closed=closed, forming=closed + (forming_bar,))
+
+
+def fingerprint(value: Any) -> Any:
+    """Representación hashable de dicts/listas de escalares (p.ej. el dict de indicadores)."""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), fingerprint(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(fingerprint(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return (value.shape, value.tobytes())
+    if isinstance(value, np.generic):
+        return value.item()
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Tamaño aproximado en bytes de un sub-resultado (recorrido superficial)."""
+    size = sys.getsizeof(value)
+    if _depth > 3:
+        return size
+    if isinstance(value, np.ndarray):
+        return size + value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=False).sum())
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return size + sum(estimate_size(v, _depth + 1) for v in value)
+    if is_dataclass(value) and not isinstance(value, type):
+        return size + estimate_size(vars(value), _depth + 1)
+    return size
+
+
+class AnalysisCache:
+    """
+    Cache LRU de sub-resultados de análisis.
+
+    Características:
+    - Entradas (clave de vela, nombre del sub-resultado)
+    - Límite de entradas y de memoria estimada
+    - Estadísticas de aciertos por sub-resultado
+    """
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 32 * 1024 * 1024):
+        """
+        Inicializa el cache.
+
+        Args:
+            max_entries: Máximo de sub-resultados guardados
+            max_bytes: Memoria estimada máxima
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+
+    def get(self, key: Tuple, name: str, default: Any = None) -> Any:
+        """Retorna el sub-resultado guardado o `default`."""
+        entry = self._entries.get((key, name))
+        if entry is None:
+            return default
+        self._entries.move_to_end((key, name))
+        return entry[0]
+
+    def put(self, key: Tuple, name: str, value: Any) -> None:
+        """Guarda un sub-resultado y aplica la expulsión LRU."""
+        full_key = (key, name)
+        old = self._entries.pop(full_key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        size = estimate_size(value)
+        self._entries[full_key] = (value, size)
+        self.total_bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def get_or_compute(self, key: Tuple, name: str, compute: Callable[[], Any]) -> Any:
+        """
+        Retorna el sub-resultado guardado o lo calcula y guarda.
+
+        Args:
+            key: Clave de vela (BarKeys.closed o BarKeys.forming, opcionalmente extendida)
+            name: Nombre del sub-resultado
+            compute: Función sin argumentos que lo calcula
+        """
+        value = self.get(key, name, _MISSING)
+        if value is not _MISSING:
+            self.hits[name] = self.hits.get(name, 0) + 1
+            return value
+        self.misses[name] = self.misses.get(name, 0) + 1
+        value = compute()
+        self.put(key, name, value)
+        return value
+
+    def invalidate(self, asset: Optional[str] = None) -> int:
+        """
+        Elimina entradas de un activo (o todas).
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        if asset is None:
+            removed = len(self._entries)
+            self._entries.clear()
+            self.total_bytes = 0
+            return removed
+        doomed = [k for k in self._entries if k[0] and k[0][0] == asset]
+        for k in doomed:
+            self.total_bytes -= self._entries.pop(k)[1]
+        return len(doomed)
+
+    def get_report(self) -> Dict[str, Any]:
+        """Retorna tamaño, memoria estimada y tasa de aciertos por sub-resultado."""
+        names = set(self.hits) | set(self.misses)
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'evictions': self.evictions,
+            'hit_rate': {
+                name: self.hits.get(name, 0) / (self.hits.get(name, 0) + self.misses.get(name, 0))
+                for name in names
+            }
+        }
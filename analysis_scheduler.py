@@ -0,0 +1,325 @@
+"""
+Analysis Scheduler - Análisis alineado con el cierre de velas
+
+Funcionalidades:
+- BarCloseDetector: detecta en la capa de captura el cierre de cada vela por
+  activo y timeframe (reloj del broker) a partir de cotizaciones, velas del
+  WebSocket y un sondeo periódico para activos sin ticks
+- Evento opcional de pre-cierre `pre_close_seconds` antes del final de la vela
+  (timing de entrada)
+- BarCloseScheduler: ejecuta el pipeline de análisis una sola vez por
+  activo/timeframe/vela, descarta duplicados, sustituye los disparos
+  pendientes por el más reciente y reporta velas perdidas y ejecuciones tardías
+
+Eventos: dicts {asset, timeframe, kind ('close' | 'pre_close'), bar_start,
+bar_end, detected_at, source}; tiempos en segundos epoch del broker.
+
+Tipo: Soporte de captura de datos / orquestación del análisis
+"""
+
+from typing import Dict, Any, Optional, List, Callable, Iterable, Tuple
+from collections import OrderedDict, deque
+import threading
+import logging
+import time
+
+from candle_gap_tracker import candle_time
+
+logger = logging.getLogger(__name__)
+
+CLOSE = 'close'
+PRE_CLOSE = 'pre_close'
+
+
+class BarCloseDetector:
+    """
+    Detecta cierres de vela por activo y timeframe.
+
+    Características:
+    - Un cierre por vela: al llegar un dato de una vela posterior o al pasar
+      `close_delay_seconds` tras el final de la vela (sondeo)
+    - Pre-cierre opcional, una vez por vela
+    - Coste O(timeframes) por cotización
+    """
+
+    def __init__(
+        self,
+        timeframes: Iterable[int] = (1,),
+        pre_close_seconds: Optional[float] = None,
+        close_delay_seconds: float = 0.25
+    ):
+        """
+        Inicializa el detector.
+
+        Args:
+            timeframes: Timeframes en minutos
+            pre_close_seconds: Segundos antes del cierre para el evento de pre-cierre (None = sin pre-cierre)
+            close_delay_seconds: Margen tras el final de la vela para aceptar los últimos ticks
+        """
+        self.periods = {tf: tf * 60 for tf in timeframes}
+        self.pre_close_seconds = pre_close_seconds
+        self.close_delay_seconds = close_delay_seconds
+        # (activo, timeframe) -> [inicio de la última vela vista, pre-cierre emitido, cierre emitido]
+        self._open_bars: Dict[Tuple[str, int], List[Any]] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.events_out = {CLOSE: 0, PRE_CLOSE: 0}
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """Registra una función que recibe cada evento de cierre/pre-cierre."""
+        self._listeners.append(callback)
+
+    def configure(self, timeframes: Iterable[int], pre_close_seconds: Optional[float] = None) -> None:
+        """Cambia timeframes y pre-cierre; descarta el estado de velas (los listeners se conservan)."""
+        self.periods = {tf: tf * 60 for tf in timeframes}
+        self.pre_close_seconds = pre_close_seconds
+        self._open_bars.clear()
+
+    def on_quote(self, asset: str, broker_ts: float) -> None:
+        """
+        Registra actividad del activo en `broker_ts` (cotización coalescida).
+
+        Cierra la vela abierta si el dato pertenece a una vela posterior.
+        """
+        for timeframe, period in self.periods.items():
+            self._advance(asset, timeframe, broker_ts - broker_ts % period, 'quote')
+
+    def on_candles(self, asset: str, candles: List[Dict[str, Any]]) -> None:
+        """Registra velas recibidas por WebSocket (la última indica la vela en curso)."""
+        if not candles:
+            return
+        ts = candle_time(candles[-1])
+        if ts is None:
+            return
+        for timeframe, period in self.periods.items():
+            self._advance(asset, timeframe, ts - ts % period, 'candles')
+
+    def _advance(self, asset: str, timeframe: int, bar_start: float, source: str) -> None:
+        key = (asset, timeframe)
+        state = self._open_bars.get(key)
+        if state is None:
+            self._open_bars[key] = [bar_start, False, False]
+            return
+        if bar_start > state[0]:
+            if not state[2]:
+                self._emit(asset, timeframe, CLOSE, state[0], source)
+            state[0], state[1], state[2] = bar_start, False, False
+
+    def poll(self, broker_now: Optional[float] = None) -> int:
+        """
+        Emite cierres de velas vencidas (activos sin ticks nuevos) y pre-cierres.
+
+        Args:
+            broker_now: Hora actual del broker; por defecto time.time()
+
+        Returns:
+            Número de eventos emitidos
+        """
+        if broker_now is None:
+            broker_now = time.time()
+        emitted = 0
+        for (asset, timeframe), state in self._open_bars.items():
+            if state[2]:
+                continue
+            bar_end = state[0] + self.periods[timeframe]
+            if broker_now >= bar_end + self.close_delay_seconds:
+                # Cerrada sin esperar más ticks; la siguiente vela se abre con el próximo dato
+                state[2] = True
+                self._emit(asset, timeframe, CLOSE, state[0], 'poll')
+                emitted += 1
+            elif (self.pre_close_seconds is not None and not state[1]
+                    and broker_now >= bar_end - self.pre_close_seconds):
+                state[1] = True
+                self._emit(asset, timeframe, PRE_CLOSE, state[0], 'poll')
+                emitted += 1
+        return emitted
+
+    def _emit(self, asset: str, timeframe: int, kind: str, bar_start: float, source: str) -> None:
+        self.events_out[kind] += 1
+        event = {
+            'asset': asset,
+            'timeframe': timeframe,
+            'kind': kind,
+            'bar_start': bar_start,
+            'bar_end': bar_start + self.periods[timeframe],
+            'detected_at': time.time(),
+            'source': source
+        }
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.debug(f"[SCHEDULER] Error en listener de cierre: {e}")
+
+
+class BarCloseScheduler:
+    """
+    Ejecuta el análisis una vez por cierre de vela.
+
+    Características:
+    - Deduplicación por (activo, timeframe, tipo, vela)
+    - Un solo disparo pendiente por (activo, timeframe, tipo): uno nuevo sustituye al anterior
+    - Hilo de ejecución propio: la capa de captura nunca se bloquea
+    - Reporte de duplicados, velas perdidas, sustituciones y ejecuciones tardías
+    """
+
+    def __init__(
+        self,
+        run: Callable[[str, int, str], Any],
+        late_threshold_seconds: float = 2.0,
+        clock: Optional[Callable[[], float]] = None
+    ):
+        """
+        Inicializa el scheduler.
+
+        Args:
+            run: Función run(asset, timeframe, kind) que ejecuta el pipeline de análisis
+            late_threshold_seconds: Retraso máximo (inicio de ejecución - cierre) antes de contar como tardía
+            clock: Hora actual en reloj del broker (p. ej. FrameTimingMonitor.broker_now)
+        """
+        self.run = run
+        self.late_threshold_seconds = late_threshold_seconds
+        self.clock = clock or time.time
+
+        self._pending: "OrderedDict[Tuple[str, int, str], Dict[str, Any]]" = OrderedDict()
+        self._last_bar: Dict[Tuple[str, int, str], float] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.stats = {
+            'events': 0, 'runs': 0, 'duplicates': 0, 'superseded': 0,
+            'missed_bars': 0, 'late_runs': 0, 'errors': 0
+        }
+        self.asset_stats: Dict[str, Dict[str, int]] = {}
+        self.delays: deque = deque(maxlen=1000)     # s desde el cierre hasta el inicio de la ejecución
+        self.durations: deque = deque(maxlen=1000)  # s de ejecución
+
+    def attach(self, source: Any) -> 'BarCloseScheduler':
+        """
+        Suscribe el scheduler a una fuente de eventos (BarCloseDetector o BrokerCapture).
+
+        Returns:
+            El propio scheduler
+        """
+        if hasattr(source, 'add_bar_close_listener'):
+            source.add_bar_close_listener(self.on_event)
+        else:
+            source.add_listener(self.on_event)
+        return self
+
+    def _asset_stats(self, asset: str) -> Dict[str, int]:
+        stats = self.asset_stats.get(asset)
+        if stats is None:
+            stats = self.asset_stats[asset] = {'runs': 0, 'missed_bars': 0, 'late_runs': 0}
+        return stats
+
+    def on_event(self, event: Dict[str, Any]) -> bool:
+        """
+        Recibe un evento de cierre/pre-cierre.
+
+        Returns:
+            False si era un duplicado (vela ya disparada o anterior)
+        """
+        key = (event['asset'], event['timeframe'], event['kind'])
+        period = event['bar_end'] - event['bar_start']
+        with self._condition:
+            self.stats['events'] += 1
+            last = self._last_bar.get(key)
+            if last is not None and event['bar_start'] <= last:
+                self.stats['duplicates'] += 1
+                return False
+            if last is not None and event['kind'] == CLOSE and period > 0:
+                missed = int(round((event['bar_start'] - last) / period)) - 1
+                if missed > 0:
+                    self.stats['missed_bars'] += missed
+                    self._asset_stats(event['asset'])['missed_bars'] += missed
+            self._last_bar[key] = event['bar_start']
+
+            if key in self._pending:
+                self.stats['superseded'] += 1
+                del self._pending[key]
+            self._pending[key] = event
+            self._condition.notify()
+        return True
+
+    def start(self) -> None:
+        """Arranca el hilo de ejecución."""
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._loop, name='bar-close-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Detiene el hilo (los disparos pendientes se descartan)."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _loop(self) -> None:
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                _, event = self._pending.popitem(last=False)
+            self._execute(event)
+
+    def run_pending(self) -> int:
+        """Ejecuta en el hilo actual todos los disparos pendientes (uso sin hilo propio)."""
+        executed = 0
+        while True:
+            with self._condition:
+                if not self._pending:
+                    return executed
+                _, event = self._pending.popitem(last=False)
+            self._execute(event)
+            executed += 1
+
+    def _execute(self, event: Dict[str, Any]) -> None:
+        asset = event['asset']
+        started = self.clock()
+        delay = started - event['bar_end']
+        asset_stats = self._asset_stats(asset)
+        if event['kind'] == CLOSE:
+            self.delays.append(max(0.0, delay))
+            if delay > self.late_threshold_seconds:
+                self.stats['late_runs'] += 1
+                asset_stats['late_runs'] += 1
+                logger.debug(f"[SCHEDULER] {asset} analizado {delay:.2f}s después del cierre")
+        elif started >= event['bar_end']:
+            # Pre-cierre que no llegó a ejecutarse antes del cierre: ya no sirve para la entrada
+            self.stats['late_runs'] += 1
+            asset_stats['late_runs'] += 1
+            return
+
+        try:
+            self.run(asset, event['timeframe'], event['kind'])
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"[SCHEDULER] Error analizando {asset} ({event['kind']}): {e}")
+        self.durations.append(self.clock() - started)
+        self.stats['runs'] += 1
+        asset_stats['runs'] += 1
+
+    @staticmethod
+    def _percentile(values: deque, pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+
+    def get_report(self) -> Dict[str, Any]:
+        """Retorna ejecuciones, duplicados, velas perdidas, tardías y retrasos (ms)."""
+        return {
+            **self.stats,
+            'pending': len(self._pending),
+            'late_threshold_ms': self.late_threshold_seconds * 1000.0,
+            'delay_ms_p50': self._percentile(self.delays, 50) * 1000.0,
+            'delay_ms_p95': self._percentile(self.delays, 95) * 1000.0,
+            'duration_ms_p50': self._percentile(self.durations, 50) * 1000.0,
+            'assets': dict(self.asset_stats)
+        }
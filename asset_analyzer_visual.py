@@ -21,7 +21,10 @@ class AssetAnalyzerVisual:
         try:
             with open(config_path, 'r') as f:
                 self.config = json.load(f)
-            self.broker = BrokerCapture(broker=self.config['broker'])
+            self.broker = BrokerCapture(
+                broker=self.config['broker'],
+                quote_interval_ms=self.config.get('quote_interval_ms', 50.0)
+            )
             logger.info(f"✅ Asset Analyzer initialized for {self.config['broker']}")
         except Exception as e:
             logger.error(f"❌ Error initializing analyzer: {e}")
@@ -13,6 +13,9 @@ import numpy as np
 from dataclasses import dataclass, asdict
 import pickle
 
+from candle_patterns import detect_candle_patterns, active_patterns
+import engine_kernels
+
 logger = logging.getLogger(__name__)
 
 
@@ -32,6 +35,7 @@ class BacktestResult:
     result: str  # 'win', 'loss', 'draw'
     profit_loss: float
     strategy_used: str
+    candle_patterns: str = ''  # Patrones de vela activos en la barra de entrada
 
 
 @dataclass
@@ -129,6 +133,9 @@ class BacktestEngine:
             self.equity_curve = [initial_capital]
             current_capital = initial_capital
             
+            # Patrones de velas de todo el histórico en una sola pasada
+            candle_pattern_frame = detect_candle_patterns(dataframe)
+            
             # Iterar sobre datos históricos
             for i in range(20, len(dataframe)):  # Necesitamos 20 candles de histórico
                 df_slice = dataframe.iloc[:i+1].copy()
@@ -210,7 +217,8 @@ class BacktestEngine:
                     payout=payout,
                     result=result,
                     profit_loss=profit,
-                    strategy_used=signal.get('strategy', 'HYBRID')
+                    strategy_used=signal.get('strategy', 'HYBRID'),
+                    candle_patterns=','.join(active_patterns(candle_pattern_frame, i))
                 )
                 
                 self.trades.append(trade)
@@ -264,21 +272,10 @@ class BacktestEngine:
         avg_win = total_profit / wins if wins > 0 else 0
         avg_loss = total_loss / losses if losses > 0 else 0
         
-        # Rachas consecutivas
-        max_wins = 0
-        max_losses = 0
-        current_wins = 0
-        current_losses = 0
-        
-        for trade in self.trades:
-            if trade.result == 'win':
-                current_wins += 1
-                current_losses = 0
-                max_wins = max(max_wins, current_wins)
-            elif trade.result == 'loss':
-                current_losses += 1
-                current_wins = 0
-                max_losses = max(max_losses, current_losses)
+        # Rachas consecutivas (los empates no cortan la racha)
+        max_wins, max_losses = engine_kernels.max_streaks(
+            engine_kernels.outcome_codes(t.result for t in self.trades)
+        )
         
         # Sharpe Ratio
         if len(self.equity_curve) > 1:
@@ -318,16 +315,7 @@ class BacktestEngine:
         if not self.equity_curve or len(self.equity_curve) < 2:
             return 0
         
-        max_equity = self.equity_curve[0]
-        max_dd = 0
-        
-        for equity in self.equity_curve:
-            if equity > max_equity:
-                max_equity = equity
-            dd = (max_equity - equity) / max_equity
-            max_dd = max(max_dd, dd)
-        
-        return max_dd
+        return engine_kernels.max_drawdown(np.asarray(self.equity_curve, dtype=float))
     
     def get_results(self) -> Dict[str, Any]:
         """
@@ -16,10 +16,15 @@ import numpy as np
 import io
 import asyncio
 import threading
+import hashlib
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 from market_data_service import MarketDataService
 from logger_config import setup_logger
+from candle_gap_tracker import CandleGapTracker, merge_candles, candle_time, normalize_symbol
+from frame_timing import FrameTimingMonitor
+from quote_coalescer import QuoteCoalescer
+from analysis_scheduler import BarCloseDetector
 
 logger = setup_logger(__name__)
 
@@ -104,13 +109,14 @@ class BrokerCapture:
         price_data: Dictionary of current prices by asset
     """
     
-    def __init__(self, broker: str = 'quotex', use_existing: bool = True) -> None:
+    def __init__(self, broker: str = 'quotex', use_existing: bool = True, quote_interval_ms: float = 50.0) -> None:
         """
         Initialize broker capture with async event loop.
         
         Args:
             broker: Broker platform ('quotex' or 'pocketoption')
             use_existing: Connect to existing browser or launch new one
+            quote_interval_ms: Quote coalescing window per asset (config 'quote_interval_ms')
         """
         self.broker = broker
         self.browser = None
@@ -131,6 +137,26 @@ class BrokerCapture:
         # 🔐 ANTI-BOT SYSTEM: Initialize market data service for stealth capture
         self.market_data_service = MarketDataService()
         self.mds_initialized = False
+        
+        # Continuidad de velas: huecos por activo y backfill dirigido
+        self.gap_tracker = CandleGapTracker()
+        
+        # Latencia de frames y offset de reloj con el broker
+        self.frame_timing = FrameTimingMonitor()
+        
+        # Coalescencia de cotizaciones: una actualización por activo cada quote_interval_ms
+        self.quote_coalescer = QuoteCoalescer(interval_ms=quote_interval_ms)
+        self.quote_coalescer.add_listener(self._on_coalesced_quote)
+        
+        # Cierres de vela (reloj del broker) para el análisis alineado con la vela
+        self.bar_close_detector = BarCloseDetector(timeframes=(1,))
+        
+        # Capturas de pantalla: región del gráfico cacheada y detección de cambios
+        self._chart_clip: Optional[Dict[str, float]] = None
+        self._chart_clip_time = 0.0
+        self._last_frame_hash: Dict[str, bytes] = {}
+        self._screenshot_task = None
+        self.screenshot_stats = {'captured': 0, 'skipped_unchanged': 0, 'total_ms': 0.0}
 
     async def _start_async(self, headless: bool = False) -> None:
         """
@@ -197,6 +223,9 @@ class BrokerCapture:
                         
                         # Inicia health check en background
                         asyncio.create_task(self._health_check_loop())
+                        
+                        # Emite cotizaciones coalescidas de activos que dejaron de recibir ticks
+                        asyncio.create_task(self._quote_flush_loop())
                         return
 
                 except Exception as e:
@@ -446,6 +475,8 @@ class BrokerCapture:
         ws.on('framereceived', lambda payload_bytes: self._process_frame(payload_bytes))
     
     def _process_frame(self, payload):
+        # Hora de recepción antes de decodificar (base para latencia/offset de reloj)
+        received_at = time.time()
         try:
             # El payload es bytes, necesitamos decodificarlo a una cadena de texto.
             payload_str = payload.decode('utf-8', errors='ignore')
@@ -466,7 +497,7 @@ class BrokerCapture:
                         for candle in event_data:
                             asset = candle.get('asset')
                             if asset and isinstance(candle.get('data'), list):
-                                self.candles_data[asset] = candle['data']
+                                self._store_frame_candles(asset, candle['data'])
                     
                     # Detectar precios actuales
                     if event_name == 'quotes' and isinstance(event_data, list):
@@ -474,7 +505,8 @@ class BrokerCapture:
                             asset = quote.get('asset')
                             price = quote.get('price')
                             if asset and price:
-                                self.price_data[asset] = float(price)
+                                self.quote_coalescer.add(asset, price, received_at)
+                                self._record_frame_timing(asset, quote, received_at)
                     
                     # Detectar payouts
                     if event_name == 'option-opened' or event_name == 'asset-updated':
@@ -504,14 +536,15 @@ class BrokerCapture:
                             'close': c.get('c', c.get('close')),
                             'volume': c.get('v', c.get('volume', 0))
                         } for c in candles]
-                        self.candles_data[asset] = formatted_candles
+                        self._store_frame_candles(asset, formatted_candles)
 
                 if event_name == 'quotes' and isinstance(event_data, list):
                     for quote in event_data:
                         asset = quote.get('asset')
                         price = quote.get('rate') # PocketOption puede usar 'rate'
                         if asset and price:
-                            self.price_data[asset] = float(price)
+                            self.quote_coalescer.add(asset, price, received_at)
+                            self._record_frame_timing(asset, quote, received_at)
 
                 if event_name == 'change-asset' and isinstance(event_data, dict):
                     asset = event_data.get('name')
@@ -526,6 +559,87 @@ class BrokerCapture:
             # Captura silenciosa de otros errores para no inundar la consola
             pass
     
+    def _on_coalesced_quote(self, update: Dict[str, Any]) -> None:
+        """Aplica una actualización coalescida (una por activo e intervalo) al cache de precios."""
+        self.price_data[update['asset']] = update['close']
+        self.bar_close_detector.on_quote(update['asset'], self.frame_timing.broker_now(update['end']))
+    
+    def add_quote_listener(self, callback) -> None:
+        """
+        Subscribe to coalesced quote updates.
+        
+        Args:
+            callback: Function receiving {asset, open, high, low, close, ticks, start, end}
+        """
+        self.quote_coalescer.add_listener(callback)
+    
+    def add_bar_close_listener(self, callback) -> None:
+        """
+        Subscribe to bar-close (and optional pre-close) events.
+        
+        Args:
+            callback: Function receiving {asset, timeframe, kind, bar_start, bar_end, detected_at, source}
+        """
+        self.bar_close_detector.add_listener(callback)
+    
+    def configure_bar_close(self, timeframes=(1,), pre_close_seconds: Optional[float] = None) -> None:
+        """
+        Set the timeframes (minutes) and optional pre-close lead time of bar-close events.
+        
+        Listeners already registered are kept.
+        """
+        self.bar_close_detector.configure(timeframes, pre_close_seconds)
+    
+    def get_quote_coalescing_report(self) -> Dict[str, Any]:
+        """
+        Get coalescing statistics (ticks in, updates out and ratio per asset).
+        
+        Returns:
+            Dict with global and per-asset coalescing ratios
+        """
+        return self.quote_coalescer.get_report()
+    
+    async def _quote_flush_loop(self):
+        """
+        Background loop that flushes pending coalesced quotes once their interval elapses
+        and polls bar closes for assets without new ticks.
+        Runs on the Playwright loop, same thread as _process_frame.
+        """
+        while True:
+            try:
+                await asyncio.sleep(self.quote_coalescer.interval)
+                self.quote_coalescer.flush_due()
+                self.bar_close_detector.poll(self.frame_timing.broker_now())
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.debug(f"   [COALESCE] Error en flush: {e}")
+    
+    def _record_frame_timing(self, asset: str, message: Dict[str, Any], received_at: float) -> None:
+        """Registra latencia de tránsito si el mensaje trae timestamp del broker."""
+        broker_ts = message.get('time') or message.get('timestamp') or message.get('t')
+        if broker_ts is not None:
+            self.frame_timing.record(asset, broker_ts, received_at)
+    
+    def _store_frame_candles(self, asset: str, candles: List[Dict[str, Any]]) -> None:
+        """
+        Guarda velas recibidas por WebSocket sin perder el histórico ya capturado.
+        
+        Un snapshot completo (empieza antes o igual que el cache) reemplaza la lista;
+        una actualización parcial se fusiona para no abrir huecos.
+        """
+        self.bar_close_detector.on_candles(asset, candles)
+        existing = self.candles_data.get(asset)
+        if not existing or not candles:
+            self.candles_data[asset] = candles
+            return
+        first_new = candle_time(candles[0])
+        first_old = candle_time(existing[0])
+        if first_new is None or first_old is None or first_new <= first_old:
+            self.candles_data[asset] = candles
+        else:
+            self.candles_data[asset] = merge_candles(existing, candles, self.gap_tracker.max_candles)
+    
     async def _ensure_page_open(self):
         """
         CRÍTICO: Verifica y recupera la página si está cerrada.
@@ -624,7 +738,7 @@ class BrokerCapture:
                     candles = ws_listener.candles_cache[search_key]
                     if candles and len(candles) > 0:
                         logger.info(f"   ✅ [WS-REAL] Datos WebSocket en tiempo real para {asset} (variante: {search_key}, {len(candles)} velas)")
-                        return candles
+                        return await self._backfill_candle_gaps_async(asset, candles, timeframe, ws_listener.candles_cache, search_key)
             
             # Debug: mostrar estado del WebSocket si no hay datos
             if not found_data:
@@ -684,7 +798,7 @@ class BrokerCapture:
                     candles = ws_listener.candles_cache[search_key]
                     if candles and len(candles) > 0:
                         logger.info(f"   ✅ [WS-REAL] Datos WebSocket recibidos para {asset} después de cambio (variante: {search_key})")
-                        return candles
+                        return await self._backfill_candle_gaps_async(asset, candles, timeframe, ws_listener.candles_cache, search_key)
 
         search_context = self.page
         
@@ -706,7 +820,7 @@ class BrokerCapture:
         # 2. WebSocket stored data (legacy)
         if asset in self.candles_data and self.candles_data[asset]:
             logger.info(f"   [DATOS] {source_tag} Usando datos de WebSocket para {asset}.")
-            return self.candles_data[asset]
+            return await self._backfill_candle_gaps_async(asset, self.candles_data[asset], timeframe, self.candles_data, asset, context=search_context)
 
         # 3. PLAN B: API del motor del gráfico (getBars)
         timeframe_seconds = int(timeframe * 60)
@@ -824,6 +938,144 @@ class BrokerCapture:
             pass # Si falla, probamos el siguiente método.
         return None
 
+    @staticmethod
+    def _chart_symbol_matches(asset: str, symbol: Optional[str]) -> bool:
+        """
+        Comprueba si el símbolo del gráfico es el mismo activo (ignora el formato).
+
+        OTC y mercado real son fuentes de precio distintas: 'EUR/USD (OTC)' no
+        acepta un gráfico de EURUSD ni 'EUR/USD' uno de EURUSD_otc.
+        """
+        if not symbol:
+            return False
+        base, is_otc = normalize_symbol(asset)
+        return bool(base) and (base, is_otc) == normalize_symbol(symbol)
+
+    async def _get_candles_range_from_chart_engine_async(self, asset, timeframe_seconds, from_ts, to_ts, context=None):
+        """
+        Pide al motor del gráfico (getBars) solo el rango [from_ts, to_ts].
+        
+        Se usa para rellenar huecos sin re-descargar el histórico completo.
+        Retorna None si el gráfico muestra otro activo.
+        """
+        if context is None: context = self.page
+        script = """
+        async () => {
+            const chartAPI = window.widget || (window.tradingView && window.tradingView.activeChart && window.tradingView.activeChart());
+            if (!chartAPI || typeof chartAPI.getSymbol !== 'function') return null;
+
+            const symbol = chartAPI.getSymbol();
+            const resolution = chartAPI.resolution();
+
+            return new Promise((resolve) => {
+                chartAPI.getBars(symbol, resolution, { from: %d, to: %d }, (bars) => {
+                    if (!bars || bars.length === 0) resolve(null);
+                    resolve({
+                        symbol: String(symbol),
+                        bars: bars.map(b => ({
+                            time: Math.round(b.time > 1e10 ? b.time / 1000 : b.time),
+                            open: b.open, high: b.high, low: b.low, close: b.close,
+                            volume: b.volume || 0
+                        }))
+                    });
+                }, () => resolve(null));
+            });
+        }
+        """ % (int(from_ts), int(to_ts))
+        try:
+            result = await self._safe_evaluate(context, script, timeout=5.0)
+            if not result or not self._chart_symbol_matches(asset, result.get('symbol')):
+                return None
+            return result.get('bars')
+        except Exception:
+            return None
+
+    async def _backfill_candle_gaps_async(self, asset, candles, timeframe, cache=None, cache_key=None, context=None, max_gaps=5):
+        """
+        Detecta huecos en las velas del activo y rellena solo los rangos faltantes.
+        
+        Args:
+            asset: Nombre del activo
+            candles: Velas actuales (cache)
+            timeframe: Timeframe en minutos
+            cache: Diccionario de cache donde fusionar el resultado (opcional)
+            cache_key: Clave del activo en ese cache
+            context: Contexto de evaluación (página o iFrame del gráfico)
+            max_gaps: Máximo de huecos a rellenar por llamada (los más recientes)
+            
+        Returns:
+            Velas fusionadas (o las originales si no había huecos)
+        """
+        try:
+            tf_sec = int(timeframe * 60)
+            gaps = self.gap_tracker.update(asset, candles, tf_sec)
+            if not gaps or not self.use_existing or not self.page:
+                return candles
+            # Los huecos que el broker no pudo rellenar esperan su backoff antes de reintentarse
+            gaps = self.gap_tracker.due_gaps(asset, gaps)
+            if not gaps:
+                return candles
+            
+            merged = candles
+            for gap_start, gap_end in gaps[-max_gaps:]:
+                bars = await self._get_candles_range_from_chart_engine_async(
+                    asset, tf_sec, gap_start, gap_end + tf_sec, context=context
+                )
+                bars = [b for b in bars or [] if gap_start <= (candle_time(b) or 0) <= gap_end]
+                self.gap_tracker.record_backfill(asset, (gap_start, gap_end), len(bars))
+                if bars:
+                    merged = merge_candles(merged, bars, self.gap_tracker.max_candles)
+            
+            if merged is not candles:
+                self.gap_tracker.update(asset, merged, tf_sec)
+                if cache is not None and cache_key is not None:
+                    cache[cache_key] = merged
+                logger.info(f"   ✅ [GAPS] {asset}: backfill de {len(merged) - len(candles)} velas en {len(gaps)} huecos")
+            return merged
+        except Exception as e:
+            logger.debug(f"   [GAPS] Error en backfill de {asset}: {e}")
+            return candles
+
+    def get_contiguous_since(self, asset: str) -> Optional[datetime]:
+        """
+        Get the time since which the cached candles of an asset have no holes.
+        
+        Args:
+            asset: Asset name (cache key)
+            
+        Returns:
+            datetime of the contiguity watermark or None
+        """
+        ts = self.gap_tracker.get_contiguous_since(asset)
+        return datetime.fromtimestamp(ts) if ts is not None else None
+
+    def get_broker_now(self) -> datetime:
+        """
+        Get current time on the broker clock (local clock corrected by measured offset).
+        
+        Returns:
+            datetime in broker time; equals local time until timestamped frames arrive
+        """
+        return datetime.fromtimestamp(self.frame_timing.broker_now())
+
+    def get_frame_latency_report(self) -> Dict[str, Any]:
+        """
+        Get clock offset and per-asset frame transit latency histograms.
+        
+        Returns:
+            Dict with clock offset (ms), alert count and latency stats per asset
+        """
+        return self.frame_timing.get_report()
+
+    def get_candle_gap_report(self) -> Dict[str, Any]:
+        """
+        Get gap detection and backfill statistics per asset.
+        
+        Returns:
+            Dict with watermark, pending gaps and backfill counters
+        """
+        return self.gap_tracker.get_report()
+
     async def _get_candles_from_js_objects_async(self, asset, source_tag="", context=None):
         """
         🎯 PLAN C: Intenta encontrar los datos de las velas en varios objetos de JavaScript comunes.
@@ -1914,30 +2166,149 @@ class BrokerCapture:
         
         return df
     
-    async def _get_screenshot_async(self) -> Optional[bytes]:
+    async def _get_chart_clip_async(self, max_age_seconds: float = 30.0) -> Optional[Dict[str, float]]:
+        """
+        Locate the chart region on the page (cached for `max_age_seconds`).
+        
+        Returns:
+            Clip dict {x, y, width, height} or None if no chart element is visible
+        """
+        now = time.time()
+        if self._chart_clip and now - self._chart_clip_time < max_age_seconds:
+            return self._chart_clip
+        
+        chart_selectors = [
+            "iframe[title*='Chart']",
+            "iframe[name*='chart']",
+            "canvas",
+            "[class*='chart']",
+        ]
+        for selector in chart_selectors:
+            try:
+                box = await self.page.locator(selector).first.bounding_box(timeout=500)
+                if box and box['width'] > 100 and box['height'] > 100:
+                    self._chart_clip = box
+                    self._chart_clip_time = now
+                    return box
+            except Exception:
+                continue
+        return None
+
+    async def _get_screenshot_async(
+        self,
+        clip_to_chart: bool = False,
+        fast: bool = False,
+        quality: int = 70,
+        skip_unchanged: bool = False
+    ) -> Optional[bytes]:
         """
         Take screenshot of browser page asynchronously.
         
+        Args:
+            clip_to_chart: Capture only the chart region instead of the full page
+            fast: Encode as JPEG at CSS scale (much cheaper than full-resolution PNG)
+            quality: JPEG quality when fast=True
+            skip_unchanged: Return None when the frame is identical to the previous one
+            
         Returns:
-            Screenshot as bytes or None
+            Screenshot as bytes or None (error or unchanged frame)
         """
         if self.page:
             try:
-                return await self.page.screenshot()
+                options: Dict[str, Any] = {'caret': 'hide'}
+                if fast:
+                    options.update({'type': 'jpeg', 'quality': quality, 'scale': 'css'})
+                if clip_to_chart:
+                    clip = await self._get_chart_clip_async()
+                    if clip:
+                        options['clip'] = clip
+                
+                started = time.perf_counter()
+                image = await self.page.screenshot(**options)
+                self.screenshot_stats['captured'] += 1
+                self.screenshot_stats['total_ms'] += (time.perf_counter() - started) * 1000
+                
+                if skip_unchanged:
+                    key = 'chart' if 'clip' in options else 'page'
+                    digest = hashlib.blake2b(image, digest_size=16).digest()
+                    if self._last_frame_hash.get(key) == digest:
+                        self.screenshot_stats['skipped_unchanged'] += 1
+                        return None
+                    self._last_frame_hash[key] = digest
+                return image
             except Exception as e:
                 logger.info(f"      ⚠️ Error al tomar captura de pantalla: {e}")
+                # La región pudo cambiar (resize/navegación): relocalizar en la próxima
+                self._chart_clip = None
         return None
 
-    def get_screenshot(self) -> Optional[bytes]:
+    def get_screenshot(
+        self,
+        clip_to_chart: bool = False,
+        fast: bool = False,
+        quality: int = 70,
+        skip_unchanged: bool = False
+    ) -> Optional[bytes]:
         """
         Take screenshot of browser page.
         
+        Args:
+            clip_to_chart: Capture only the chart region instead of the full page
+            fast: Encode as JPEG at CSS scale
+            quality: JPEG quality when fast=True
+            skip_unchanged: Return None when the frame is identical to the previous one
+            
         Returns:
             Screenshot as bytes or None
         """
-        future = asyncio.run_coroutine_threadsafe(self._get_screenshot_async(), self.loop)
+        future = asyncio.run_coroutine_threadsafe(
+            self._get_screenshot_async(clip_to_chart, fast, quality, skip_unchanged), self.loop
+        )
         return future.result()
 
+    async def _screenshot_loop_async(self, callback, interval_seconds: float, clip_to_chart: bool, fast: bool):
+        """
+        Rate-limited capture loop: at most one capture per `interval_seconds`,
+        callback only receives frames that changed.
+        """
+        while True:
+            try:
+                started = time.monotonic()
+                image = await self._get_screenshot_async(clip_to_chart, fast, skip_unchanged=True)
+                if image is not None:
+                    callback(image)
+                elapsed = time.monotonic() - started
+                await asyncio.sleep(max(0.0, interval_seconds - elapsed))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.debug(f"   [SCREENSHOT] Error en loop de capturas: {e}")
+                await asyncio.sleep(interval_seconds)
+
+    def start_screenshot_loop(self, callback, interval_seconds: float = 1.0, clip_to_chart: bool = True, fast: bool = True) -> None:
+        """
+        Start a background capture loop that does not block the caller.
+        
+        Args:
+            callback: Function receiving screenshot bytes (runs on the Playwright thread)
+            interval_seconds: Minimum time between captures
+            clip_to_chart: Capture only the chart region
+            fast: JPEG encoding at CSS scale
+        """
+        self.stop_screenshot_loop()
+        
+        async def _create():
+            self._screenshot_task = asyncio.create_task(
+                self._screenshot_loop_async(callback, interval_seconds, clip_to_chart, fast)
+            )
+        asyncio.run_coroutine_threadsafe(_create(), self.loop).result()
+
+    def stop_screenshot_loop(self) -> None:
+        """Stop the background capture loop if running."""
+        if self._screenshot_task is not None:
+            self.loop.call_soon_threadsafe(self._screenshot_task.cancel)
+            self._screenshot_task = None
+
     async def _close_async(self):
         if self.browser:
             await self.browser.close()
@@ -0,0 +1,277 @@
+"""
+Candle Gap Tracker - Detección de huecos y backfill dirigido
+
+Funcionalidades:
+- Detección de huecos en el índice temporal de las velas de cada activo
+- Fusión de velas nuevas con el cache existente (sin duplicados)
+- Marca de agua "contiguo desde" por activo
+- Rangos exactos a rellenar para evitar re-descargar todo el histórico
+- Espera exponencial para los huecos que el broker no pudo rellenar
+
+Tipo: Soporte de captura de datos
+"""
+
+from typing import Dict, Any, Optional, List, Tuple, Callable
+import re
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def candle_time(candle: Dict[str, Any]) -> Optional[int]:
+    """
+    Obtiene el timestamp (segundos) de una vela en cualquiera de los formatos del broker.
+
+    Args:
+        candle: Vela con clave 'time' o 't' (segundos o milisegundos)
+
+    Returns:
+        Timestamp en segundos o None si no es válido
+    """
+    raw = candle.get('time')
+    if raw is None:
+        raw = candle.get('t')
+    try:
+        ts = int(float(raw))
+    except (TypeError, ValueError):
+        return None
+    # Algunos gráficos entregan milisegundos
+    if ts > 10_000_000_000:
+        ts //= 1000
+    return ts
+
+
+def normalize_symbol(name: Any) -> Tuple[str, bool]:
+    """
+    Forma canónica de un activo o símbolo del gráfico para compararlos.
+
+    'EUR/USD (OTC)', 'EURUSD_otc' y 'eurusd-otc' dan ('eurusd', True);
+    'EUR/USD' y 'EURUSD' dan ('eurusd', False). El mercado OTC y el real son
+    fuentes de precio distintas, por eso la marca OTC forma parte de la clave.
+
+    Args:
+        name: Nombre del activo o símbolo
+
+    Returns:
+        (nombre sin separadores en minúsculas y sin la marca OTC, si es OTC)
+    """
+    clean = re.sub(r'[^a-z0-9]', '', str(name or '').lower())
+    is_otc = clean.endswith('otc')
+    return (clean[:-3] if is_otc else clean), is_otc
+
+
+def merge_candles(
+    existing: List[Dict[str, Any]],
+    incoming: List[Dict[str, Any]],
+    max_candles: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Fusiona dos listas de velas ordenándolas por tiempo.
+
+    Si una vela existe en ambas listas, prevalece la de `incoming`
+    (es la más reciente, p.ej. la vela en formación).
+
+    Args:
+        existing: Velas ya en cache
+        incoming: Velas nuevas (backfill o frame del WebSocket)
+        max_candles: Máximo de velas a conservar (las más recientes)
+
+    Returns:
+        Lista fusionada y ordenada
+    """
+    by_time: Dict[int, Dict[str, Any]] = {}
+    for candle in existing or []:
+        ts = candle_time(candle)
+        if ts is not None:
+            by_time[ts] = candle
+    for candle in incoming or []:
+        ts = candle_time(candle)
+        if ts is not None:
+            by_time[ts] = candle
+
+    merged = [by_time[ts] for ts in sorted(by_time)]
+    if max_candles and len(merged) > max_candles:
+        merged = merged[-max_candles:]
+    return merged
+
+
+def find_gaps(
+    candles: List[Dict[str, Any]],
+    timeframe_sec: int,
+    max_gap_bars: int = 240
+) -> List[Tuple[int, int]]:
+    """
+    Detecta huecos en una serie de velas ordenada por tiempo.
+
+    Los huecos mayores a `max_gap_bars` se consideran cierres de sesión
+    (fin de semana, mercado cerrado) y no se reportan para backfill.
+
+    Args:
+        candles: Velas ordenadas por tiempo
+        timeframe_sec: Duración de cada vela en segundos
+        max_gap_bars: Tamaño máximo de hueco rellenable (en velas)
+
+    Returns:
+        Lista de rangos (desde, hasta) con los tiempos de las velas faltantes (inclusive)
+    """
+    gaps: List[Tuple[int, int]] = []
+    if timeframe_sec <= 0 or not candles or len(candles) < 2:
+        return gaps
+
+    prev_ts = None
+    for candle in candles:
+        ts = candle_time(candle)
+        if ts is None:
+            continue
+        if prev_ts is not None:
+            missing = (ts - prev_ts) // timeframe_sec - 1
+            if 0 < missing <= max_gap_bars:
+                gaps.append((prev_ts + timeframe_sec, ts - timeframe_sec))
+        prev_ts = ts
+    return gaps
+
+
+class CandleGapTracker:
+    """
+    Mantiene el estado de continuidad de las velas por activo.
+
+    Características:
+    - Marca de agua "contiguo desde" (inicio del tramo final sin huecos)
+    - Registro de huecos pendientes de backfill
+    - Huecos que el broker no rellena: intentos y espera exponencial antes de reintentar
+    - Estadísticas de huecos detectados y rellenados
+    """
+
+    def __init__(
+        self,
+        max_gap_bars: int = 240,
+        max_candles: int = 1000,
+        retry_backoff_s: float = 60.0,
+        max_backoff_s: float = 3600.0,
+        clock: Optional[Callable[[], float]] = None
+    ):
+        """
+        Inicializa el tracker.
+
+        Args:
+            max_gap_bars: Huecos más grandes se tratan como cierre de sesión
+            max_candles: Máximo de velas conservadas por activo al fusionar
+            retry_backoff_s: Espera tras el primer backfill fallido de un hueco (se duplica en cada fallo)
+            max_backoff_s: Espera máxima entre reintentos
+            clock: Reloj monotónico (por defecto time.monotonic)
+        """
+        self.max_gap_bars = max_gap_bars
+        self.max_candles = max_candles
+        self.retry_backoff_s = retry_backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.clock = clock or time.monotonic
+        self.contiguous_since: Dict[str, Optional[int]] = {}
+        self.pending_gaps: Dict[str, List[Tuple[int, int]]] = {}
+        self.failed_gaps: Dict[str, Dict[Tuple[int, int], Dict[str, float]]] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _asset_stats(self, asset: str) -> Dict[str, int]:
+        if asset not in self.stats:
+            self.stats[asset] = {'gaps_detected': 0, 'gaps_filled': 0, 'bars_backfilled': 0, 'backfill_failures': 0}
+        return self.stats[asset]
+
+    def update(self, asset: str, candles: List[Dict[str, Any]], timeframe_sec: int) -> List[Tuple[int, int]]:
+        """
+        Revisa las velas del activo, actualiza la marca de agua y los huecos pendientes.
+
+        Args:
+            asset: Nombre del activo (clave del cache)
+            candles: Velas ordenadas por tiempo
+            timeframe_sec: Duración de cada vela en segundos
+
+        Returns:
+            Huecos rellenables detectados
+        """
+        gaps = find_gaps(candles, timeframe_sec, self.max_gap_bars)
+
+        # La marca de agua es el inicio del último tramo sin huecos
+        # (un cierre de sesión también rompe la continuidad)
+        watermark = None
+        prev_ts = None
+        for candle in candles or []:
+            ts = candle_time(candle)
+            if ts is None:
+                continue
+            if watermark is None or (prev_ts is not None and ts - prev_ts > timeframe_sec):
+                watermark = ts
+            prev_ts = ts
+        self.contiguous_since[asset] = watermark
+
+        previous = set(self.pending_gaps.get(asset, []))
+        new_gaps = [g for g in gaps if g not in previous]
+        if new_gaps:
+            self._asset_stats(asset)['gaps_detected'] += len(new_gaps)
+            logger.debug(f"[GAPS] {asset}: {len(new_gaps)} huecos nuevos detectados")
+        self.pending_gaps[asset] = gaps
+
+        # Los fallos de huecos que ya no existen (rellenados por el WebSocket o fuera del cache) se olvidan
+        failed = self.failed_gaps.get(asset)
+        if failed:
+            current = set(gaps)
+            for gap in [g for g in failed if g not in current]:
+                del failed[gap]
+        return gaps
+
+    def due_gaps(self, asset: str, gaps: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Filtra los huecos cuya espera tras un backfill fallido aún no ha vencido.
+
+        Args:
+            asset: Nombre del activo
+            gaps: Huecos detectados
+
+        Returns:
+            Huecos que se pueden pedir al broker ahora
+        """
+        failed = self.failed_gaps.get(asset)
+        if not failed:
+            return gaps
+        now = self.clock()
+        return [g for g in gaps if g not in failed or failed[g]['retry_at'] <= now]
+
+    def record_backfill(self, asset: str, gap: Tuple[int, int], bars_received: int) -> None:
+        """
+        Registra el resultado de un backfill dirigido.
+
+        Args:
+            asset: Nombre del activo
+            gap: Rango rellenado
+            bars_received: Velas recibidas para el rango
+        """
+        stats = self._asset_stats(asset)
+        failed = self.failed_gaps.setdefault(asset, {})
+        if bars_received > 0:
+            stats['gaps_filled'] += 1
+            stats['bars_backfilled'] += bars_received
+            failed.pop(gap, None)
+            return
+
+        stats['backfill_failures'] += 1
+        entry = failed.setdefault(gap, {'attempts': 0, 'retry_at': 0.0})
+        entry['attempts'] += 1
+        backoff = min(self.retry_backoff_s * 2 ** (entry['attempts'] - 1), self.max_backoff_s)
+        entry['retry_at'] = self.clock() + backoff
+        logger.debug(f"[GAPS] {asset}: hueco {gap} sin velas (intento {entry['attempts']}), reintento en {backoff:.0f}s")
+
+    def get_contiguous_since(self, asset: str) -> Optional[int]:
+        """Retorna el timestamp desde el cual las velas del activo son contiguas."""
+        return self.contiguous_since.get(asset)
+
+    def get_report(self) -> Dict[str, Any]:
+        """Retorna estado de huecos y marcas de agua por activo."""
+        now = self.clock()
+        return {
+            asset: {
+                'contiguous_since': self.contiguous_since.get(asset),
+                'pending_gaps': len(self.pending_gaps.get(asset, [])),
+                'gaps_in_backoff': sum(1 for e in self.failed_gaps.get(asset, {}).values() if e['retry_at'] > now),
+                **self._asset_stats(asset)
+            }
+            for asset in set(self.contiguous_since) | set(self.pending_gaps)
+        }
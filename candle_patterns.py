@@ -0,0 +1,235 @@
+"""
+Candle Patterns - Detección vectorizada de patrones de velas
+=============================================================
+
+Calcula en una sola pasada NumPy, para todas las velas de un DataFrame,
+los patrones clásicos de velas japonesas como arrays booleanos o de fuerza:
+
+  - doji, hammer, inverted_hammer, marubozu alcista/bajista
+  - engulfing alcista/bajista, harami alcista/bajista
+  - inside bar / outside bar
+  - morning star / evening star
+
+El análisis en vivo usa solo la cola; el backtester y el entrenamiento
+pueden usar los arrays completos como features históricas.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Umbrales de forma de vela
+DOJI_BODY_RATIO = 0.1        # cuerpo / rango
+WICK_BODY_MULTIPLIER = 2.0   # mecha / cuerpo para hammer
+SMALL_WICK_RATIO = 0.25      # mecha opuesta / rango para hammer
+MARUBOZU_BODY_RATIO = 0.95   # cuerpo / rango
+LARGE_BODY_MULTIPLIER = 1.5  # cuerpo / cuerpo previo
+
+# Confianzas del detector heredado de PatternRecognizer
+LEGACY_CONFIDENCE = {
+    'doji': 0.6,
+    'long_wick': 0.55,
+    'large_body': 0.65
+}
+
+PATTERN_COLUMNS = [
+    'doji', 'hammer', 'inverted_hammer', 'long_wick',
+    'bullish_marubozu', 'bearish_marubozu',
+    'bullish_engulfing', 'bearish_engulfing', 'large_body',
+    'bullish_harami', 'bearish_harami',
+    'inside_bar', 'outside_bar',
+    'morning_star', 'evening_star'
+]
+
+
+def _shift(values: np.ndarray, periods: int = 1, fill=np.nan) -> np.ndarray:
+    """Desplaza el último eje hacia adelante rellenando el inicio (como Series.shift)."""
+    result = np.empty_like(values)
+    result[..., :periods] = fill
+    result[..., periods:] = values[..., :-periods]
+    return result
+
+
+def compute_candle_patterns(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula todos los patrones de velas para cada barra.
+
+    Args:
+        open_, high, low, close: Arrays OHLC de igual forma, (n,) o (series, n);
+                                 las velas van en el último eje
+
+    Returns:
+        Dict con arrays booleanos por patrón (PATTERN_COLUMNS) y arrays
+        de fuerza: body_ratio, upper_wick_ratio, lower_wick_ratio, engulfing_strength
+    """
+    o = np.asarray(open_, dtype=float)
+    h = np.asarray(high, dtype=float)
+    l = np.asarray(low, dtype=float)
+    c = np.asarray(close, dtype=float)
+    n = c.shape[-1] if c.ndim else 0
+    if n == 0:
+        empty = {name: np.zeros(0, dtype=bool) for name in PATTERN_COLUMNS}
+        empty.update({k: np.zeros(0) for k in ('body_ratio', 'upper_wick_ratio', 'lower_wick_ratio', 'engulfing_strength')})
+        return empty
+
+    body = np.abs(c - o)
+    top = np.maximum(o, c)
+    bottom = np.minimum(o, c)
+    upper_wick = h - top
+    lower_wick = bottom - l
+    full_range = h - l
+    has_range = full_range > 0
+    safe_range = np.where(has_range, full_range, 1.0)
+
+    body_ratio = np.where(has_range, body / safe_range, 0.0)
+    upper_ratio = np.where(has_range, upper_wick / safe_range, 0.0)
+    lower_ratio = np.where(has_range, lower_wick / safe_range, 0.0)
+
+    bullish = c > o
+    bearish = c < o
+
+    # Forma de una sola vela
+    doji = has_range & (body_ratio < DOJI_BODY_RATIO)
+    long_lower = lower_wick > body * WICK_BODY_MULTIPLIER
+    long_upper = upper_wick > body * WICK_BODY_MULTIPLIER
+    long_wick = has_range & (long_lower | long_upper)
+    hammer = has_range & long_lower & (upper_ratio <= SMALL_WICK_RATIO)
+    inverted_hammer = has_range & long_upper & (lower_ratio <= SMALL_WICK_RATIO)
+    bullish_marubozu = bullish & (body_ratio >= MARUBOZU_BODY_RATIO)
+    bearish_marubozu = bearish & (body_ratio >= MARUBOZU_BODY_RATIO)
+
+    # Patrones de dos velas (la primera barra no tiene previa)
+    prev_o = _shift(o)
+    prev_c = _shift(c)
+    prev_h = _shift(h)
+    prev_l = _shift(l)
+    prev_body = _shift(body)
+    prev_top = np.fmax(prev_o, prev_c)
+    prev_bottom = np.fmin(prev_o, prev_c)
+    prev_bullish = prev_c > prev_o
+    prev_bearish = prev_c < prev_o
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        engulfing_strength = np.where(prev_body > 0, body / prev_body, 0.0)
+    engulfing_strength[..., 0] = 0.0
+
+    large_body = has_range & (body > prev_body * LARGE_BODY_MULTIPLIER)
+    bullish_engulfing = bullish & prev_bearish & (c >= prev_o) & (o <= prev_c) & (body > prev_body)
+    bearish_engulfing = bearish & prev_bullish & (c <= prev_o) & (o >= prev_c) & (body > prev_body)
+    bullish_harami = bullish & prev_bearish & (top <= prev_top) & (bottom >= prev_bottom) & (body < prev_body)
+    bearish_harami = bearish & prev_bullish & (top <= prev_top) & (bottom >= prev_bottom) & (body < prev_body)
+    inside_bar = (h < prev_h) & (l > prev_l)
+    outside_bar = (h > prev_h) & (l < prev_l)
+
+    # Patrones de tres velas: vela grande, vela pequeña, vela que recupera la mitad de la primera
+    first_o = _shift(o, 2)
+    first_c = _shift(c, 2)
+    first_body = np.abs(first_c - first_o)
+    first_mid = (first_o + first_c) / 2
+    middle_small = _shift(body_ratio, 1, 0.0) < 0.3
+    morning_star = (first_c < first_o) & middle_small & bullish & (c > first_mid) & (body > first_body * 0.5)
+    evening_star = (first_c > first_o) & middle_small & bearish & (c < first_mid) & (body > first_body * 0.5)
+
+    return {
+        'doji': doji,
+        'hammer': hammer,
+        'inverted_hammer': inverted_hammer,
+        'long_wick': long_wick,
+        'bullish_marubozu': bullish_marubozu,
+        'bearish_marubozu': bearish_marubozu,
+        'bullish_engulfing': bullish_engulfing,
+        'bearish_engulfing': bearish_engulfing,
+        'large_body': large_body,
+        'bullish_harami': bullish_harami,
+        'bearish_harami': bearish_harami,
+        'inside_bar': inside_bar,
+        'outside_bar': outside_bar,
+        'morning_star': morning_star,
+        'evening_star': evening_star,
+        'body_ratio': body_ratio,
+        'upper_wick_ratio': upper_ratio,
+        'lower_wick_ratio': lower_ratio,
+        'engulfing_strength': engulfing_strength
+    }
+
+
+def detect_candle_patterns(df: pd.DataFrame, tail: Optional[int] = None) -> pd.DataFrame:
+    """
+    Patrones de velas para todas las barras de un DataFrame OHLC.
+
+    Args:
+        df: DataFrame con columnas open, high, low, close
+        tail: Si se indica, solo calcula las últimas `tail` barras
+              (se incluyen 2 barras previas para los patrones multi-vela)
+
+    Returns:
+        DataFrame con el mismo índice (o su cola) y una columna por patrón
+    """
+    if tail is not None:
+        source = df.iloc[-(tail + 2):]
+    else:
+        source = df
+
+    arrays = compute_candle_patterns(
+        source['open'].to_numpy(),
+        source['high'].to_numpy(),
+        source['low'].to_numpy(),
+        source['close'].to_numpy()
+    )
+    result = pd.DataFrame(arrays, index=source.index)
+    if tail is not None:
+        result = result.iloc[-tail:]
+    return result
+
+
+def legacy_candle_confidence(patterns: Dict[str, np.ndarray], lookback: int = 3) -> float:
+    """
+    Confianza de patrón de velas con las reglas originales de PatternRecognizer.
+
+    Sobre las últimas `lookback` barras: doji 0.6, mecha larga 0.55 y cuerpo
+    grande respecto a la vela previa 0.65 (solo si la previa también está
+    en la ventana). Se toma el máximo.
+
+    Args:
+        patterns: Resultado de compute_candle_patterns
+        lookback: Número de barras finales a considerar
+
+    Returns:
+        Confianza entre 0.0 y 0.65
+    """
+    if patterns['doji'].shape[-1] < lookback:
+        return 0.0
+
+    confidence = 0.0
+    if patterns['doji'][-lookback:].any():
+        confidence = max(confidence, LEGACY_CONFIDENCE['doji'])
+    if patterns['long_wick'][-lookback:].any():
+        confidence = max(confidence, LEGACY_CONFIDENCE['long_wick'])
+    if lookback > 1 and patterns['large_body'][-(lookback - 1):].any():
+        confidence = max(confidence, LEGACY_CONFIDENCE['large_body'])
+    return confidence
+
+
+def active_patterns(patterns: pd.DataFrame, position: int = -1) -> List[str]:
+    """
+    Nombres de los patrones activos en una barra.
+
+    Args:
+        patterns: DataFrame de detect_candle_patterns
+        position: Posición de la barra (por defecto la última)
+
+    Returns:
+        Lista de nombres de patrón
+    """
+    if patterns.empty:
+        return []
+    row = patterns.iloc[position]
+    return [name for name in PATTERN_COLUMNS if bool(row[name])]
@@ -0,0 +1,334 @@
+"""
+Correlation Engine - Correlación rolling entre activos, incremental por vela
+============================================================================
+
+Mantiene una covarianza EWMA (estilo RiskMetrics) de los log-retornos de
+todos los activos seguidos, actualizada al cerrar cada vela con coste O(k²)
+y sin recalcular ventanas:
+
+  - Las velas cerradas de cada activo se agrupan por tiempo; cuando una vela
+    tiene el dato de todos los activos (o se queda atrás más de `max_pending`
+    velas) se aplica la actualización sobre los pares presentes.
+  - Cada par lleva su propio peso acumulado, de modo que la correlación es
+    correcta aunque los activos empiecen a seguirse en momentos distintos.
+  - Los grupos por divisa de asset_correlations.json se orientan por el lado
+    del par (EUR/USD está "largo" en EUR y "corto" en USD), así la correlación
+    de un activo con su grupo mide cuánto se mueve con esa divisa.
+  - La exposición correlacionada suma, para una señal candidata, la
+    correlación orientada por dirección con las señales aún abiertas.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple, Any, Optional
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUPS_PATH = 'asset_correlations.json'
+
+
+def normalize_asset(name: str) -> str:
+    """Normaliza el nombre de un activo: 'EUR/USD (OTC)' -> 'EURUSD'."""
+    return name.replace('(OTC)', '').replace('/', '').replace('-', '').replace(' ', '').upper()
+
+
+def load_correlation_groups(path: str = DEFAULT_GROUPS_PATH) -> Dict[str, List[str]]:
+    """
+    Carga los grupos de activos por divisa.
+
+    Args:
+        path: Ruta del JSON (relativa al directorio actual o al del módulo)
+
+    Returns:
+        Dict grupo -> lista de activos (vacío si no existe el archivo)
+    """
+    candidates = [path, os.path.join(os.path.dirname(os.path.abspath(__file__)), path)]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            try:
+                with open(candidate, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"[CORR] No se pudo leer {candidate}: {e}")
+                return {}
+    logger.debug(f"[CORR] Sin archivo de grupos de correlación ({path})")
+    return {}
+
+
+def group_orientation(asset: str, group: str) -> float:
+    """
+    Signo del activo respecto a la divisa del grupo.
+
+    +1 si la divisa es la base del par (o el grupo no es una divisa), -1 si es la cotizada.
+    """
+    symbol = normalize_asset(asset)
+    if len(group) == 3 and len(symbol) == 6 and symbol[3:] == group.upper():
+        return -1.0
+    return 1.0
+
+
+class CorrelationEngine:
+    """
+    Covarianza/correlación EWMA incremental entre activos.
+
+    Características:
+    - Actualización por vela cerrada O(k²) (solo pares presentes en esa vela)
+    - Peso acumulado por par (sin sesgo de arranque)
+    - Correlación con el grupo de divisa orientada por lado del par
+    - Exposición correlacionada de una señal frente a las abiertas
+    """
+
+    def __init__(
+        self,
+        groups: Optional[Dict[str, List[str]]] = None,
+        halflife: float = 120.0,
+        min_bars: int = 30,
+        max_pending: int = 3
+    ):
+        """
+        Inicializa el motor de correlación.
+
+        Args:
+            groups: Grupos de activos por divisa (asset_correlations.json)
+            halflife: Vida media de la EWMA en velas
+            min_bars: Observaciones conjuntas mínimas para reportar una correlación
+            max_pending: Velas que se espera a los activos rezagados antes de actualizar
+        """
+        self.decay = 0.5 ** (1.0 / halflife)
+        self.min_bars = min_bars
+        self.max_pending = max_pending
+
+        # Grupos por nombre normalizado: activo -> [(grupo, orientación)]
+        self.groups: Dict[str, List[str]] = {}
+        self.asset_groups: Dict[str, List[Tuple[str, float]]] = {}
+        for group, members in (groups or {}).items():
+            normalized = [normalize_asset(m) for m in members]
+            self.groups[group] = normalized
+            for member, key in zip(members, normalized):
+                self.asset_groups.setdefault(key, []).append((group, group_orientation(member, group)))
+
+        # Matrices k x k (crecen al aparecer activos nuevos)
+        self.index: Dict[str, int] = {}
+        self.cov = np.zeros((0, 0))
+        self.weight = np.zeros((0, 0))
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+
+        # Estado de ingesta por activo y velas pendientes de completar
+        self.last_time: Dict[str, Any] = {}
+        self.last_close: Dict[str, float] = {}
+        self.pending: Dict[Any, Dict[int, float]] = {}
+        self.watermark: Any = None  # última vela aplicada
+        self.bars_applied = 0
+
+    def _asset_index(self, asset: str) -> int:
+        key = normalize_asset(asset)
+        idx = self.index.get(key)
+        if idx is None:
+            idx = self.index[key] = len(self.index)
+            k = len(self.index)
+            if k > self.cov.shape[0]:
+                size = max(8, 2 * self.cov.shape[0])
+                for name in ('cov', 'weight', 'counts'):
+                    old = getattr(self, name)
+                    grown = np.zeros((size, size), dtype=old.dtype)
+                    grown[:old.shape[0], :old.shape[1]] = old
+                    setattr(self, name, grown)
+        return idx
+
+    def sync(self, asset: str, df: pd.DataFrame) -> int:
+        """
+        Ingiere las velas cerradas nuevas del activo (la última fila es la vela en formación).
+
+        Args:
+            asset: Activo
+            df: DataFrame OHLC
+
+        Returns:
+            Número de retornos ingeridos
+        """
+        if df is None or len(df) < 3:
+            return 0
+        key = normalize_asset(asset)
+        idx = self._asset_index(asset)
+        index = df.index
+        end = len(df) - 1  # excluir la vela en formación
+
+        start = None
+        last = self.last_time.get(key)
+        if last is not None and index.is_monotonic_increasing:
+            pos = index.searchsorted(last)
+            if pos < end and index[pos] == last:
+                start = pos + 1
+        if start is None:
+            # Activo nuevo o sin solape: solo las velas que aún pueden entrar en una actualización
+            start = max(1, end - self.max_pending)
+            self.last_close[key] = float(df['close'].iloc[start - 1])
+
+        closes = df['close'].to_numpy(dtype=float)
+        ingested = 0
+        prev_close = self.last_close[key]
+        for i in range(start, end):
+            time = index[i]
+            close = closes[i]
+            if prev_close > 0 and close > 0 and (self.watermark is None or time > self.watermark):
+                self.pending.setdefault(time, {})[idx] = float(np.log(close / prev_close))
+                ingested += 1
+            prev_close = close
+        self.last_close[key] = prev_close
+        self.last_time[key] = index[end - 1]
+        self._flush()
+        return ingested
+
+    def _flush(self) -> None:
+        """Aplica las velas completas y las que llevan más de `max_pending` velas esperando."""
+        if not self.pending:
+            return
+        times = sorted(self.pending)
+        tracked = len(self.index)
+        complete_until = -1
+        for pos, time in enumerate(times):
+            if len(self.pending[time]) >= tracked:
+                complete_until = pos
+        flush_count = max(complete_until + 1, len(times) - self.max_pending)
+        for time in times[:flush_count]:
+            self._apply(self.pending.pop(time))
+            self.watermark = time
+
+    def _apply(self, returns: Dict[int, float]) -> None:
+        """Actualización EWMA de los pares presentes en una vela (O(k²))."""
+        idx = np.fromiter(returns.keys(), dtype=np.int64, count=len(returns))
+        r = np.fromiter(returns.values(), dtype=float, count=len(returns))
+        block = np.ix_(idx, idx)
+        decay = self.decay
+        self.cov[block] = decay * self.cov[block] + (1 - decay) * np.outer(r, r)
+        self.weight[block] = decay * self.weight[block] + (1 - decay)
+        self.counts[block] += 1
+        self.bars_applied += 1
+
+    def covariance(self, a: str, b: str) -> Optional[float]:
+        """Covarianza EWMA de retornos entre dos activos (None si no hay datos suficientes)."""
+        i = self.index.get(normalize_asset(a))
+        j = self.index.get(normalize_asset(b))
+        if i is None or j is None or self.counts[i, j] < self.min_bars:
+            return None
+        return float(self.cov[i, j] / self.weight[i, j])
+
+    def correlation(self, a: str, b: str) -> Optional[float]:
+        """Correlación EWMA entre dos activos (None si no hay datos suficientes)."""
+        i = self.index.get(normalize_asset(a))
+        j = self.index.get(normalize_asset(b))
+        if i is None or j is None or self.counts[i, j] < self.min_bars:
+            return None
+        return self._corr(i, j)
+
+    def _corr(self, i: int, j: int) -> float:
+        cov_ij = self.cov[i, j] / self.weight[i, j]
+        var_i = self.cov[i, i] / self.weight[i, i]
+        var_j = self.cov[j, j] / self.weight[j, j]
+        denom = np.sqrt(var_i * var_j)
+        return float(np.clip(cov_ij / denom, -1.0, 1.0)) if denom > 0 else 0.0
+
+    def correlation_matrix(self) -> pd.DataFrame:
+        """Matriz de correlación de los activos seguidos (NaN donde faltan datos)."""
+        k = len(self.index)
+        cov = self.cov[:k, :k]
+        weight = np.where(self.weight[:k, :k] > 0, self.weight[:k, :k], 1.0)
+        norm = cov / weight
+        std = np.sqrt(np.diag(norm))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.clip(norm / np.outer(std, std), -1.0, 1.0)
+        corr[self.counts[:k, :k] < self.min_bars] = np.nan
+        names = sorted(self.index, key=self.index.get)
+        return pd.DataFrame(corr, index=names, columns=names)
+
+    def group_correlations(self, asset: str) -> Dict[str, float]:
+        """
+        Correlación media del activo con cada uno de sus grupos de divisa.
+
+        Las correlaciones se orientan por el lado del par, de modo que un valor
+        alto indica que el activo se mueve con la divisa del grupo.
+
+        Returns:
+            Dict grupo -> correlación orientada (solo grupos con datos suficientes)
+        """
+        key = normalize_asset(asset)
+        i = self.index.get(key)
+        if i is None:
+            return {}
+        result = {}
+        for group, sign in self.asset_groups.get(key, []):
+            values = []
+            for member in self.groups[group]:
+                j = self.index.get(member)
+                if member == key or j is None or self.counts[i, j] < self.min_bars:
+                    continue
+                other_sign = next(s for g, s in self.asset_groups[member] if g == group)
+                values.append(sign * other_sign * self._corr(i, j))
+            if values:
+                result[group] = float(np.mean(values))
+        return result
+
+    def exposure(self, asset: str, direction: str, open_positions: List[Tuple[str, str]]) -> float:
+        """
+        Exposición correlacionada de una señal frente a las posiciones abiertas.
+
+        Suma de corr(activo, otro) * dir * dir_otro: positivo si la señal duplica
+        riesgo ya abierto, negativo si lo cubre.
+
+        Args:
+            asset: Activo de la señal candidata
+            direction: 'CALL' o 'PUT'
+            open_positions: Lista de (activo, dirección) abiertas
+
+        Returns:
+            Exposición (0.0 sin posiciones correlacionadas)
+        """
+        i = self.index.get(normalize_asset(asset))
+        if i is None:
+            return 0.0
+        sign = 1.0 if direction == 'CALL' else -1.0
+        total = 0.0
+        for other, other_direction in open_positions:
+            j = self.index.get(normalize_asset(other))
+            if j is None:
+                continue
+            other_sign = 1.0 if other_direction == 'CALL' else -1.0
+            if i == j:
+                total += sign * other_sign
+            elif self.counts[i, j] >= self.min_bars:
+                total += sign * other_sign * self._corr(i, j)
+        return total
+
+    def analyze(self, asset: str, direction: str, open_positions: List[Tuple[str, str]]) -> Dict[str, float]:
+        """
+        Resumen de correlación para AISignal.correlation_analysis.
+
+        Returns:
+            Dict con correlación por grupo ('group_<GRUPO>'), media de grupos,
+            máxima correlación absoluta con otro activo, exposición correlacionada
+            y factor de escala sugerido para el tamaño de posición
+        """
+        key = normalize_asset(asset)
+        i = self.index.get(key)
+        if i is None:
+            return {}
+        analysis: Dict[str, float] = {}
+        groups = self.group_correlations(asset)
+        for group, value in groups.items():
+            analysis[f'group_{group}'] = round(value, 4)
+        if groups:
+            analysis['group_correlation'] = round(float(np.mean(list(groups.values()))), 4)
+
+        k = len(self.index)
+        peers = [j for j in range(k) if j != i and self.counts[i, j] >= self.min_bars]
+        if peers:
+            analysis['max_pair_correlation'] = round(max(abs(self._corr(i, j)) for j in peers), 4)
+
+        exposure = self.exposure(asset, direction, open_positions)
+        analysis['exposure'] = round(exposure, 4)
+        analysis['exposure_scale'] = round(1.0 / (1.0 + max(0.0, exposure)), 4)
+        analysis['observations'] = float(self.counts[i, i])
+        return analysis
@@ -0,0 +1,385 @@
+"""
+Engine Kernels - Bucles numéricos con JIT opcional
+==================================================
+
+Núcleos con forma de bucle del motor (rachas y drawdown del backtest, zigzag
+de los patrones armónicos) con dos implementaciones equivalentes:
+
+  - Bucle escrito para compilarse con Numba (njit) si está instalado.
+  - Respaldo sin Numba: NumPy vectorizado donde el cálculo lo permite (rachas,
+    drawdown); el zigzag es secuencial y sin JIT lo sigue haciendo el
+    ZigZag incremental de harmonic_patterns.
+
+warm_up() compila los núcleos al arrancar y comprueba cada uno contra la
+referencia NumPy/Python con datos aleatorios; si alguno difiere o no compila
+se queda con el respaldo. Las funciones públicas no cambian de firma según el
+backend.
+"""
+
+import numpy as np
+from typing import Dict, Tuple, Any
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    njit = None
+    NUMBA_AVAILABLE = False
+
+NUMBA = 'numba'
+NUMPY = 'numpy'
+
+WIN = 1
+LOSS = -1
+DRAW = 0
+
+# Estado del zigzag como vector float64 (ver zigzag_state / apply_zigzag_state)
+ZZ_HAS_AVG, ZZ_AVG, ZZ_DIRECTION, ZZ_EXT_INDEX, ZZ_EXT_PRICE, ZZ_HI_INDEX, ZZ_HI_PRICE, ZZ_LO_INDEX, ZZ_LO_PRICE = range(9)
+ZZ_STATE_SIZE = 9
+
+
+# ----------------------------------------------------------------------
+# Bucles (objetivo de Numba; en Python puro sirven de referencia)
+# ----------------------------------------------------------------------
+
+def _max_streaks_loop(outcomes):
+    max_wins = 0
+    max_losses = 0
+    current_wins = 0
+    current_losses = 0
+    for i in range(outcomes.shape[0]):
+        if outcomes[i] == 1:
+            current_wins += 1
+            current_losses = 0
+            if current_wins > max_wins:
+                max_wins = current_wins
+        elif outcomes[i] == -1:
+            current_losses += 1
+            current_wins = 0
+            if current_losses > max_losses:
+                max_losses = current_losses
+    return max_wins, max_losses
+
+
+def _max_drawdown_loop(equity):
+    max_equity = equity[0]
+    max_dd = 0.0
+    for i in range(equity.shape[0]):
+        if equity[i] > max_equity:
+            max_equity = equity[i]
+        dd = (max_equity - equity[i]) / max_equity
+        if dd > max_dd:
+            max_dd = dd
+    return max_dd
+
+
+def _zigzag_loop(high, low, start_index, atr_multiplier, alpha, state):
+    """
+    Mismo algoritmo que ZigZag.update sobre un bloque de velas cerradas.
+
+    Returns:
+        (vela que confirma, índice del pivote, precio, tipo) de cada pivote y el estado final
+    """
+    n = high.shape[0]
+    confirm = np.empty(n, np.int64)
+    index = np.empty(n, np.int64)
+    price = np.empty(n, np.float64)
+    kind = np.empty(n, np.int64)
+    count = 0
+
+    s = state.copy()
+    has_avg = s[0] != 0.0
+    avg = s[1]
+    direction = int(s[2])
+    ext_index = int(s[3])
+    ext_price = s[4]
+    hi_index = int(s[5])
+    hi_price = s[6]
+    lo_index = int(s[7])
+    lo_price = s[8]
+
+    for i in range(n):
+        bar = start_index + i
+        h = high[i]
+        l = low[i]
+        bar_range = h - l
+        if not has_avg:
+            avg = bar_range
+            has_avg = True
+        else:
+            avg += alpha * (bar_range - avg)
+        deviation = atr_multiplier * avg
+        if deviation <= 0:
+            continue
+
+        if direction == 0:
+            if h > hi_price:
+                hi_index = bar
+                hi_price = h
+            if l < lo_price:
+                lo_index = bar
+                lo_price = l
+            if hi_price - lo_price < deviation:
+                continue
+            confirm[count] = bar
+            if lo_index <= hi_index:
+                index[count] = lo_index
+                price[count] = lo_price
+                kind[count] = -1
+                direction = 1
+                ext_index = hi_index
+                ext_price = hi_price
+            else:
+                index[count] = hi_index
+                price[count] = hi_price
+                kind[count] = 1
+                direction = -1
+                ext_index = lo_index
+                ext_price = lo_price
+            count += 1
+        elif direction == 1:
+            if h > ext_price:
+                ext_index = bar
+                ext_price = h
+            elif ext_price - l >= deviation:
+                confirm[count] = bar
+                index[count] = ext_index
+                price[count] = ext_price
+                kind[count] = 1
+                count += 1
+                direction = -1
+                ext_index = bar
+                ext_price = l
+        else:
+            if l < ext_price:
+                ext_index = bar
+                ext_price = l
+            elif h - ext_price >= deviation:
+                confirm[count] = bar
+                index[count] = ext_index
+                price[count] = ext_price
+                kind[count] = -1
+                count += 1
+                direction = 1
+                ext_index = bar
+                ext_price = h
+
+    s[0] = 1.0 if has_avg else 0.0
+    s[1] = avg
+    s[2] = direction
+    s[3] = ext_index
+    s[4] = ext_price
+    s[5] = hi_index
+    s[6] = hi_price
+    s[7] = lo_index
+    s[8] = lo_price
+    return confirm[:count], index[:count], price[:count], kind[:count], s
+
+
+# ----------------------------------------------------------------------
+# Respaldo NumPy
+# ----------------------------------------------------------------------
+
+def _max_streaks_numpy(outcomes: np.ndarray) -> Tuple[int, int]:
+    # Los empates no cortan ni suman a la racha: se descartan
+    decided = outcomes[outcomes != DRAW]
+    if len(decided) == 0:
+        return 0, 0
+    starts = np.flatnonzero(np.concatenate(([True], decided[1:] != decided[:-1])))
+    lengths = np.diff(np.append(starts, len(decided)))
+    values = decided[starts]
+    wins = lengths[values == WIN]
+    losses = lengths[values == LOSS]
+    return int(wins.max()) if len(wins) else 0, int(losses.max()) if len(losses) else 0
+
+
+def _max_drawdown_numpy(equity: np.ndarray) -> float:
+    peaks = np.maximum.accumulate(equity)
+    return max(0.0, float(((peaks - equity) / peaks).max()))
+
+
+_REFERENCE = {
+    'max_streaks': _max_streaks_numpy,
+    'max_drawdown': _max_drawdown_numpy,
+    'zigzag': _zigzag_loop,
+}
+_LOOPS = {
+    'max_streaks': _max_streaks_loop,
+    'max_drawdown': _max_drawdown_loop,
+    'zigzag': _zigzag_loop,
+}
+
+_kernels: Dict[str, Any] = dict(_REFERENCE)
+_backend = NUMPY
+_warmed = False
+_warmup_report: Dict[str, Any] = {}
+
+
+# ----------------------------------------------------------------------
+# Arranque
+# ----------------------------------------------------------------------
+
+def _self_check(name: str, compiled, rng: np.random.Generator) -> bool:
+    """Compara un núcleo compilado con la referencia sobre datos aleatorios."""
+    reference = _REFERENCE[name]
+    for size in (1, 2, 17, 1000):
+        if name == 'max_streaks':
+            args = (rng.integers(-1, 2, size).astype(np.int8),)
+            return_equal = lambda a, b: tuple(int(v) for v in a) == tuple(b)
+        elif name == 'max_drawdown':
+            args = (1000.0 + np.cumsum(rng.normal(0, 10, size)),)
+            return_equal = lambda a, b: abs(float(a) - b) <= 1e-12
+        else:
+            close = 100.0 + np.cumsum(rng.normal(0, 0.3, size))
+            high = close + np.abs(rng.normal(0, 0.2, size))
+            low = close - np.abs(rng.normal(0, 0.2, size))
+            args = (high, low, 0, 3.0, 2.0 / 15, initial_zigzag_state())
+            return_equal = lambda a, b: all(np.array_equal(x, y) for x, y in zip(a, b))
+        if not return_equal(compiled(*args), reference(*args)):
+            return False
+    return True
+
+
+def warm_up(use_jit: bool = True) -> str:
+    """
+    Elige el backend y compila los núcleos (una vez por proceso).
+
+    Con Numba disponible y use_jit, cada núcleo se compila, se ejecuta y se
+    compara con la referencia; el que falla se queda en NumPy.
+
+    Args:
+        use_jit: Permitir Numba (config ai_engine.jit_kernels)
+
+    Returns:
+        Backend activo: 'numba' (al menos un núcleo compilado) o 'numpy'
+    """
+    global _backend, _warmed
+    if _warmed:
+        return _backend
+    _warmed = True
+    if not (use_jit and NUMBA_AVAILABLE):
+        _warmup_report.update({'backend': NUMPY, 'numba_available': NUMBA_AVAILABLE, 'compiled': []})
+        return _backend
+
+    rng = np.random.default_rng(0)
+    compiled_names = []
+    start = time.perf_counter()
+    for name, loop in _LOOPS.items():
+        try:
+            compiled = njit(cache=True)(loop)
+            if _self_check(name, compiled, rng):
+                _kernels[name] = compiled
+                compiled_names.append(name)
+            else:
+                logger.warning(f"[KERNELS] '{name}' compilado no coincide con la referencia; se usa NumPy")
+        except Exception as e:
+            logger.warning(f"[KERNELS] No se pudo compilar '{name}': {e}")
+    elapsed = time.perf_counter() - start
+
+    _backend = NUMBA if compiled_names else NUMPY
+    _warmup_report.update({
+        'backend': _backend,
+        'numba_available': True,
+        'compiled': compiled_names,
+        'warmup_ms': elapsed * 1000.0
+    })
+    logger.info(f"[KERNELS] Backend {_backend}: {len(compiled_names)}/{len(_LOOPS)} núcleos compilados en {elapsed:.2f}s")
+    return _backend
+
+
+def backend() -> str:
+    """Backend activo ('numba' o 'numpy')."""
+    return _backend
+
+
+def is_compiled(name: str) -> bool:
+    """Indica si el núcleo `name` corre compilado."""
+    return _kernels[name] is not _REFERENCE[name]
+
+
+def get_stats() -> Dict[str, Any]:
+    return dict(_warmup_report) if _warmup_report else {'backend': _backend, 'warmed': _warmed}
+
+
+# ----------------------------------------------------------------------
+# API
+# ----------------------------------------------------------------------
+
+def outcome_codes(results) -> np.ndarray:
+    """Convierte resultados 'win'/'loss'/'draw' en códigos WIN/LOSS/DRAW (int8)."""
+    codes = {'win': WIN, 'loss': LOSS}
+    return np.fromiter((codes.get(r, DRAW) for r in results), dtype=np.int8)
+
+
+def max_streaks(outcomes: np.ndarray) -> Tuple[int, int]:
+    """
+    Rachas máximas de ganancias y pérdidas consecutivas.
+
+    Args:
+        outcomes: Códigos WIN/LOSS/DRAW en orden; los empates no cortan la racha
+
+    Returns:
+        (máximo de ganancias seguidas, máximo de pérdidas seguidas)
+    """
+    if not _warmed:
+        warm_up()
+    wins, losses = _kernels['max_streaks'](np.ascontiguousarray(outcomes, dtype=np.int8))
+    return int(wins), int(losses)
+
+
+def max_drawdown(equity: np.ndarray) -> float:
+    """
+    Máximo drawdown relativo de una curva de capital.
+
+    Returns:
+        Máximo de (pico previo - capital) / pico previo; 0 con menos de 2 puntos
+    """
+    if not _warmed:
+        warm_up()
+    equity = np.ascontiguousarray(equity, dtype=np.float64)
+    if len(equity) < 2:
+        return 0.0
+    return float(_kernels['max_drawdown'](equity))
+
+
+def initial_zigzag_state() -> np.ndarray:
+    """Estado de un ZigZag recién reiniciado."""
+    state = np.zeros(ZZ_STATE_SIZE)
+    state[ZZ_HI_PRICE] = -np.inf
+    state[ZZ_LO_PRICE] = np.inf
+    return state
+
+
+def zigzag(
+    high: np.ndarray,
+    low: np.ndarray,
+    start_index: int,
+    atr_multiplier: float,
+    alpha: float,
+    state: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Zigzag por desviación sobre un bloque de velas cerradas.
+
+    Args:
+        high, low: Máximos y mínimos del bloque
+        start_index: Índice de vela de la primera fila
+        atr_multiplier: Desviación en múltiplos del rango medio
+        alpha: Factor de la media exponencial del rango
+        state: Estado al empezar el bloque (initial_zigzag_state o el devuelto antes)
+
+    Returns:
+        (vela que confirma, índice del pivote, precio, tipo HIGH=1/LOW=-1, estado final)
+    """
+    if not _warmed:
+        warm_up()
+    return _kernels['zigzag'](
+        np.ascontiguousarray(high, dtype=np.float64),
+        np.ascontiguousarray(low, dtype=np.float64),
+        int(start_index), float(atr_multiplier), float(alpha),
+        np.ascontiguousarray(state, dtype=np.float64)
+    )
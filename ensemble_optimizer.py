@@ -0,0 +1,482 @@
+"""
+Ensemble Optimizer - Ajuste de pesos y umbrales del EnsemblePredictor
+=====================================================================
+
+Evalúa miles de combinaciones de pesos (technical/ml/sentiment/pattern) y
+umbrales CALL/PUT a la vez sobre arrays de scores ya calculados y sus
+resultados reales, sin repetir backtests:
+
+  - Scores normalizados (n, 4) @ pesos (4, m) -> score ponderado (n, m),
+    procesado por bloques de candidatos para acotar memoria
+  - Métricas por candidato: operaciones, aciertos, win rate, beneficio por
+    unidad apostada con el payout del broker y expectativa por operación
+  - Búsquedas: grid (símplex de pesos x umbrales), aleatoria (Dirichlet) y
+    por coordenadas desde la configuración actual; grid y aleatoria se
+    reparten entre procesos
+
+Fuentes de muestras:
+  - samples_from_feature_matrix: features de todo el histórico (feature_matrix)
+    y dirección realizada a `horizon` velas
+  - samples_from_journal: señales con resultado del SignalJournal
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import product
+from typing import Dict, Tuple, Any, Optional
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MODEL_KEYS = ('technical', 'ml', 'sentiment', 'pattern')
+
+# Elementos (muestras x candidatos) evaluados por bloque
+CHUNK_ELEMENTS = 4_000_000
+
+# Muestras del proceso worker (se envían una sola vez en el inicializador)
+_WORKER_SAMPLES = None
+
+
+@dataclass
+class EnsembleSamples:
+    """Scores de entrada del ensemble y dirección realizada por muestra."""
+    technical: np.ndarray   # [-1, 1]
+    ml: np.ndarray          # [0, 1]
+    sentiment: np.ndarray   # [-1, 1]
+    pattern: np.ndarray     # [0, 1]
+    outcome: np.ndarray     # +1 subió, -1 bajó, 0 sin cambio
+
+    def __len__(self) -> int:
+        return len(self.outcome)
+
+    def normalized(self) -> np.ndarray:
+        """Matriz (n, 4) con los scores en [0, 1], como en EnsemblePredictor."""
+        return np.column_stack([
+            (self.technical + 1) / 2,
+            self.ml,
+            (self.sentiment + 1) / 2,
+            self.pattern
+        ]).astype(float)
+
+
+def samples_from_feature_matrix(matrix: pd.DataFrame, close: pd.Series, horizon: int = 1) -> EnsembleSamples:
+    """
+    Muestras a partir de build_feature_matrix y la dirección del precio a `horizon` velas.
+
+    El score de patrones es la media de candle_pattern y chart_pattern (la
+    matriz no incluye el patrón armónico).
+
+    Args:
+        matrix: Resultado de build_feature_matrix
+        close: Serie de cierres alineada con la matriz
+        horizon: Velas hasta la expiración
+
+    Returns:
+        EnsembleSamples sin las filas incompletas
+    """
+    closes = close.to_numpy(dtype=float)
+    future = np.full(len(closes), np.nan)
+    future[:-horizon] = closes[horizon:]
+    outcome = np.sign(future - closes)
+    pattern = (matrix['candle_pattern'].to_numpy(dtype=float) + matrix['chart_pattern'].to_numpy(dtype=float)) / 2
+    columns = [
+        matrix['technical_score'].to_numpy(dtype=float),
+        matrix['ml_score'].to_numpy(dtype=float),
+        matrix['sentiment_score'].to_numpy(dtype=float),
+        pattern
+    ]
+    valid = np.isfinite(outcome)
+    for col in columns:
+        valid &= np.isfinite(col)
+    return EnsembleSamples(*(col[valid] for col in columns), outcome=outcome[valid])
+
+
+def samples_from_journal(journal) -> EnsembleSamples:
+    """
+    Muestras a partir de las señales con resultado de un SignalJournal.
+
+    La dirección realizada se reconstruye de la dirección de la señal y su
+    resultado (win = el precio fue en la dirección de la señal).
+    """
+    from signal_journal import OUTCOME_PENDING, OUTCOME_WIN, OUTCOME_LOSS
+
+    rows = journal.ordered_records()
+    if getattr(journal, 'spill_path', None):
+        rows = np.concatenate([journal.load_spilled(), rows])
+    rows = rows[rows['outcome'] != OUTCOME_PENDING]
+    result = np.where(rows['outcome'] == OUTCOME_WIN, 1, np.where(rows['outcome'] == OUTCOME_LOSS, -1, 0))
+    return EnsembleSamples(
+        technical=rows['technical_score'].astype(float),
+        ml=rows['ml_score'].astype(float),
+        sentiment=rows['sentiment_score'].astype(float),
+        pattern=rows['pattern_score'].astype(float),
+        outcome=(rows['direction'] * result).astype(float)
+    )
+
+
+def evaluate_candidates(
+    samples: EnsembleSamples,
+    weights: np.ndarray,
+    call_thresholds: np.ndarray,
+    put_thresholds: np.ndarray,
+    payout: float = 0.85,
+    min_confidence: float = 0.55,
+    normalized: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Evalúa m configuraciones del ensemble sobre todas las muestras.
+
+    Reproduce predict_direction + la confianza mínima de should_trade:
+    CALL si score > umbral CALL y min(0.95, score) >= min_confidence,
+    PUT si score < umbral PUT y min(0.95, 1 - score) >= min_confidence.
+
+    Args:
+        samples: Muestras
+        weights: (m, 4) pesos por candidato (orden MODEL_KEYS)
+        call_thresholds: (m,) umbral CALL
+        put_thresholds: (m,) umbral PUT
+        payout: Payout del broker (ganancia por unidad en acierto)
+        min_confidence: Confianza mínima para operar
+        normalized: Matriz normalizada precalculada (opcional)
+
+    Returns:
+        Dict de arrays (m,): trades, wins, win_rate, profit, expectancy
+    """
+    scores = samples.normalized() if normalized is None else normalized
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    call_thresholds = np.broadcast_to(np.asarray(call_thresholds, dtype=float), (len(weights),))
+    put_thresholds = np.broadcast_to(np.asarray(put_thresholds, dtype=float), (len(weights),))
+    scores = np.asarray(scores, dtype=np.float32)
+    up = (samples.outcome > 0).astype(np.float32)
+    down = (samples.outcome < 0).astype(np.float32)
+    # Umbrales efectivos con la confianza mínima (min(0.95, s) >= c equivale a s >= c si c <= 0.95)
+    call_floor = min(min_confidence, 0.95)
+    put_ceiling = 1 - call_floor
+
+    m = len(weights)
+    trades = np.zeros(m, dtype=np.int64)
+    wins = np.zeros(m, dtype=np.int64)
+    step = max(1, CHUNK_ELEMENTS // max(len(scores), 1))
+    for start in range(0, m, step):
+        block = slice(start, start + step)
+        weighted = scores @ weights[block].T.astype(np.float32)
+        # Umbral efectivo por candidato: el más exigente entre ensemble y confianza mínima
+        calls = (weighted > call_thresholds[block].astype(np.float32)) & (weighted >= np.float32(call_floor))
+        puts = (weighted < put_thresholds[block].astype(np.float32)) & (weighted <= np.float32(put_ceiling))
+        trades[block] = np.count_nonzero(calls, axis=0) + np.count_nonzero(puts, axis=0)
+        # Aciertos como producto matricial (más rápido que reducir máscaras combinadas)
+        wins[block] = np.rint(up @ calls.astype(np.float32) + down @ puts.astype(np.float32)).astype(np.int64)
+
+    losses = trades - wins
+    profit = wins * payout - losses
+    with np.errstate(invalid='ignore', divide='ignore'):
+        win_rate = np.where(trades > 0, wins / np.maximum(trades, 1), 0.0)
+        expectancy = np.where(trades > 0, profit / np.maximum(trades, 1), 0.0)
+    return {'trades': trades, 'wins': wins, 'win_rate': win_rate, 'profit': profit, 'expectancy': expectancy}
+
+
+def simplex_grid(step: float = 0.05, minimum: float = 0.0) -> np.ndarray:
+    """Todas las combinaciones de 4 pesos múltiplos de `step` que suman 1."""
+    units = int(round(1 / step))
+    low = int(round(minimum / step))
+    rows = [
+        (a, b, c, units - a - b - c)
+        for a in range(low, units + 1)
+        for b in range(low, units + 1 - a)
+        for c in range(low, units + 1 - a - b)
+        if units - a - b - c >= low
+    ]
+    return np.array(rows, dtype=float) / units
+
+
+def _init_worker(normalized: np.ndarray, outcome: np.ndarray) -> None:
+    global _WORKER_SAMPLES
+    _WORKER_SAMPLES = (normalized, outcome)
+
+
+def _evaluate_chunk(weights, call_thresholds, put_thresholds, payout, min_confidence) -> Dict[str, np.ndarray]:
+    normalized, outcome = _WORKER_SAMPLES
+    empty = np.zeros(len(outcome))
+    samples = EnsembleSamples(empty, empty, empty, empty, outcome)
+    return evaluate_candidates(
+        samples, weights, call_thresholds, put_thresholds, payout, min_confidence, normalized=normalized
+    )
+
+
+class EnsembleOptimizer:
+    """
+    Búsqueda de pesos y umbrales del ensemble sobre scores registrados.
+
+    Características:
+    - Evaluación vectorizada de miles de candidatos por pasada
+    - Grid, aleatoria y por coordenadas
+    - Reparto entre procesos para grid y aleatoria
+    - Resultado listo para EnsemblePredictor.apply_config
+    """
+
+    def __init__(
+        self,
+        samples: EnsembleSamples,
+        payout: float = 0.85,
+        min_confidence: float = 0.55,
+        min_trades: int = 30,
+        objective: str = 'profit',
+        max_workers: int = 1
+    ):
+        """
+        Inicializa el optimizador.
+
+        Args:
+            samples: Muestras (scores y dirección realizada)
+            payout: Payout del broker
+            min_confidence: Confianza mínima de AdaptiveRiskManager.should_trade
+            min_trades: Operaciones mínimas para que un candidato sea válido
+            objective: 'profit', 'expectancy' o 'win_rate'
+            max_workers: Procesos para grid/aleatoria (1 = en el proceso actual)
+        """
+        if objective not in ('profit', 'expectancy', 'win_rate'):
+            raise ValueError(f"Objetivo no soportado: {objective}")
+        self.samples = samples
+        self.normalized = samples.normalized()
+        self.payout = payout
+        self.min_confidence = min_confidence
+        self.min_trades = min_trades
+        self.objective = objective
+        self.max_workers = max_workers
+        self.best: Optional[Dict[str, Any]] = None
+        self.evaluated = 0
+
+    def evaluate(
+        self,
+        weights: np.ndarray,
+        call_thresholds: np.ndarray,
+        put_thresholds: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """Evalúa candidatos (en procesos si max_workers > 1 y hay suficientes)."""
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        m = len(weights)
+        call_thresholds = np.broadcast_to(np.asarray(call_thresholds, dtype=float), (m,))
+        put_thresholds = np.broadcast_to(np.asarray(put_thresholds, dtype=float), (m,))
+        self.evaluated += m
+
+        if self.max_workers <= 1 or m < 2 * self.max_workers:
+            return evaluate_candidates(
+                self.samples, weights, call_thresholds, put_thresholds,
+                self.payout, self.min_confidence, normalized=self.normalized
+            )
+
+        bounds = np.linspace(0, m, self.max_workers + 1).astype(int)
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(self.normalized, self.samples.outcome)
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _evaluate_chunk, weights[a:b], call_thresholds[a:b], put_thresholds[a:b],
+                    self.payout, self.min_confidence
+                )
+                for a, b in zip(bounds[:-1], bounds[1:]) if b > a
+            ]
+            parts = [f.result() for f in futures]
+        return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+    def _select(
+        self,
+        weights: np.ndarray,
+        call_thresholds: np.ndarray,
+        put_thresholds: np.ndarray,
+        metrics: Dict[str, np.ndarray]
+    ) -> Optional[Dict[str, Any]]:
+        """Mejor candidato de una evaluación; actualiza self.best."""
+        objective = np.where(metrics['trades'] >= self.min_trades, metrics[self.objective].astype(float), -np.inf)
+        idx = int(np.argmax(objective))
+        if not np.isfinite(objective[idx]):
+            return self.best
+        candidate = {
+            'model_weights': {key: round(float(w), 4) for key, w in zip(MODEL_KEYS, np.atleast_2d(weights)[idx])},
+            'call_threshold': round(float(np.broadcast_to(call_thresholds, (len(objective),))[idx]), 4),
+            'put_threshold': round(float(np.broadcast_to(put_thresholds, (len(objective),))[idx]), 4),
+            'metrics': {key: float(values[idx]) for key, values in metrics.items()}
+        }
+        if self.best is None or candidate['metrics'][self.objective] > self.best['metrics'][self.objective]:
+            self.best = candidate
+        return self.best
+
+    def grid_search(
+        self,
+        weight_step: float = 0.05,
+        call_thresholds: Tuple[float, ...] = (0.52, 0.55, 0.58, 0.60, 0.62, 0.65),
+        put_thresholds: Optional[Tuple[float, ...]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Grid sobre el símplex de pesos x umbrales.
+
+        Args:
+            weight_step: Paso de los pesos
+            call_thresholds: Umbrales CALL a probar
+            put_thresholds: Umbrales PUT (por defecto simétricos: 1 - CALL)
+
+        Returns:
+            Mejor configuración encontrada
+        """
+        grid = simplex_grid(weight_step)
+        if put_thresholds is None:
+            pairs = [(c, 1 - c) for c in call_thresholds]
+        else:
+            pairs = list(product(call_thresholds, put_thresholds))
+        weights = np.repeat(grid, len(pairs), axis=0)
+        calls = np.tile([p[0] for p in pairs], len(grid))
+        puts = np.tile([p[1] for p in pairs], len(grid))
+        logger.info(f"[ENSEMBLE-OPT] Grid: {len(weights)} candidatos sobre {len(self.samples)} muestras")
+        return self._select(weights, calls, puts, self.evaluate(weights, calls, puts))
+
+    def random_search(
+        self,
+        n_candidates: int = 20000,
+        threshold_range: Tuple[float, float] = (0.50, 0.70),
+        symmetric: bool = True,
+        seed: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Búsqueda aleatoria: pesos Dirichlet(1) y umbrales uniformes.
+
+        Args:
+            n_candidates: Candidatos a evaluar
+            threshold_range: Rango del umbral CALL (PUT = 1 - CALL si symmetric)
+            symmetric: Umbrales simétricos alrededor de 0.5
+            seed: Semilla
+
+        Returns:
+            Mejor configuración encontrada
+        """
+        rng = np.random.default_rng(seed)
+        weights = rng.dirichlet(np.ones(len(MODEL_KEYS)), size=n_candidates)
+        calls = rng.uniform(*threshold_range, size=n_candidates)
+        puts = 1 - calls if symmetric else 1 - rng.uniform(*threshold_range, size=n_candidates)
+        logger.info(f"[ENSEMBLE-OPT] Aleatoria: {n_candidates} candidatos sobre {len(self.samples)} muestras")
+        return self._select(weights, calls, puts, self.evaluate(weights, calls, puts))
+
+    def coordinate_search(
+        self,
+        start: Optional[Dict[str, Any]] = None,
+        steps: Tuple[float, ...] = (0.10, 0.05, 0.02, 0.01),
+        span: int = 5,
+        max_rounds: int = 20
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Búsqueda por coordenadas desde una configuración inicial.
+
+        En cada ronda se prueba, para cada peso y cada umbral, un abanico de
+        valores alrededor del actual (todos en una evaluación vectorizada); los
+        pesos se renormalizan a suma 1. El paso se reduce cuando no hay mejora.
+
+        Args:
+            start: Configuración inicial (por defecto la del EnsemblePredictor original)
+            steps: Pasos sucesivos
+            span: Valores a cada lado del actual por coordenada
+            max_rounds: Rondas máximas por paso
+
+        Returns:
+            Mejor configuración encontrada
+        """
+        start = start or {
+            'model_weights': {'technical': 0.40, 'ml': 0.35, 'sentiment': 0.15, 'pattern': 0.10},
+            'call_threshold': 0.55,
+            'put_threshold': 0.45
+        }
+        current = np.array([start['model_weights'][k] for k in MODEL_KEYS] + [start['call_threshold'], start['put_threshold']])
+        metrics = self.evaluate(current[:4], current[4], current[5])
+        best_value = self._objective_value(metrics, 0)
+        self._select(current[:4], current[4], current[5], metrics)
+
+        offsets = np.arange(-span, span + 1)
+        for step in steps:
+            for _ in range(max_rounds):
+                candidates = []
+                for coord in range(len(current)):
+                    for offset in offsets:
+                        if offset == 0:
+                            continue
+                        candidate = current.copy()
+                        candidate[coord] += offset * step
+                        if candidate[coord] < 0 or candidate[coord] > 1:
+                            continue
+                        candidate[:4] /= max(candidate[:4].sum(), 1e-12)
+                        candidates.append(candidate)
+                if not candidates:
+                    break
+                candidates = np.array(candidates)
+                metrics = self.evaluate(candidates[:, :4], candidates[:, 4], candidates[:, 5])
+                values = np.array([self._objective_value(metrics, i) for i in range(len(candidates))])
+                idx = int(np.argmax(values))
+                if values[idx] <= best_value:
+                    break
+                best_value = values[idx]
+                current = candidates[idx]
+                self._select(candidates, candidates[:, 4], candidates[:, 5], metrics)
+        logger.info(f"[ENSEMBLE-OPT] Coordenadas: {self.evaluated} candidatos evaluados")
+        return self.best
+
+    def _objective_value(self, metrics: Dict[str, np.ndarray], idx: int) -> float:
+        if metrics['trades'][idx] < self.min_trades:
+            return -np.inf
+        return float(metrics[self.objective][idx])
+
+    def save(self, path: str) -> None:
+        """Guarda la mejor configuración en JSON (formato de EnsemblePredictor.apply_config)."""
+        if self.best is None:
+            raise ValueError("No hay configuración optimizada que guardar")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.best, f, indent=2)
+        logger.info(f"[ENSEMBLE-OPT] Configuración guardada en {path}")
+
+
+def optimize_from_dataframe(
+    df: pd.DataFrame,
+    horizon: int = 1,
+    method: str = 'random',
+    max_workers: Optional[int] = None,
+    **kwargs
+) -> Optional[Dict[str, Any]]:
+    """
+    Atajo: features de todo el histórico + búsqueda.
+
+    Args:
+        df: DataFrame OHLCV
+        horizon: Velas hasta la expiración
+        method: 'grid', 'random' o 'coordinate'
+        max_workers: Procesos (por defecto núcleos - 1)
+        **kwargs: Argumentos del método de búsqueda
+
+    Returns:
+        Mejor configuración
+    """
+    from feature_matrix import build_feature_matrix
+    samples = samples_from_feature_matrix(build_feature_matrix(df), df['close'], horizon)
+    workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+    optimizer = EnsembleOptimizer(samples, max_workers=workers)
+    search = {
+        'grid': optimizer.grid_search,
+        'random': optimizer.random_search,
+        'coordinate': optimizer.coordinate_search
+    }[method]
+    return search(**kwargs)
+
+
+if __name__ == '__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2:
+        print("Uso: python ensemble_optimizer.py <velas.csv> [grid|random|coordinate] [salida.json]")
+        sys.exit(1)
+    data = pd.read_csv(sys.argv[1], index_col=0, parse_dates=True)
+    best = optimize_from_dataframe(data, method=sys.argv[2] if len(sys.argv) > 2 else 'random')
+    print(json.dumps(best, indent=2))
+    if len(sys.argv) > 3 and best is not None:
+        with open(sys.argv[3], 'w', encoding='utf-8') as f:
+            json.dump(best, f, indent=2)
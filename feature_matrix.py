@@ -0,0 +1,461 @@
+"""
+Feature Matrix - Features de AdvancedAIEngine para todo el histórico
+====================================================================
+
+Calcula, para cada vela de un histórico largo, las mismas features que
+AdvancedAIEngine obtiene solo para la última vela:
+
+  - trend_strength, market_phase, sentimiento, volatilidad
+  - soporte/resistencia (rango + histograma), pivot points
+  - confianza de patrones de velas y de gráfico
+  - estimadores de volatilidad (EWMA, Parkinson, Garman-Klass, ATR) en
+    build_feature_matrix, con prefijo 'vol_'
+  - technical score, ml score (proxy RSI) y probabilidad de reversión
+
+Sin linregress por vela: las regresiones y estadísticos móviles se calculan
+con ventanas deslizantes (sliding_window_view) y productos con pesos fijos,
+procesadas por bloques para acotar memoria.
+
+Los kernels operan sobre el último eje, así que aceptan una serie (n,) o
+varias series alineadas (activos, n).
+
+Las filas sin ventana completa quedan en NaN.
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, Optional, List
+import logging
+
+from candle_patterns import compute_candle_patterns, LEGACY_CONFIDENCE
+from volatility_estimators import compute_volatility
+
+logger = logging.getLogger(__name__)
+
+# Ventanas usadas por AdvancedAIEngine
+TREND_WINDOW = 20
+PHASE_WINDOW = 50
+SENTIMENT_WINDOW = 20
+SR_RANGE_WINDOW = 50
+SR_HIST_WINDOW = 100
+SR_BINS = 20
+
+# Códigos de market_phase (mismo orden que MarketPhase)
+PHASE_CODES: List[str] = [
+    'strong_uptrend', 'weak_uptrend', 'consolidation',
+    'weak_downtrend', 'strong_downtrend', 'volatile', 'transition'
+]
+
+# Ventanas procesadas por bloque en los kernels deslizantes
+CHUNK_WINDOWS = 65536
+
+
+# ----------------------------------------------------------------------
+# Kernels genéricos sobre el último eje
+# ----------------------------------------------------------------------
+
+def _pad_front(values: np.ndarray, window: int) -> np.ndarray:
+    """Antepone window-1 NaN para alinear el resultado con la vela final de cada ventana."""
+    pad = np.full(values.shape[:-1] + (window - 1,), np.nan)
+    return np.concatenate([pad, values], axis=-1)
+
+
+def _chunked_windows(x: np.ndarray, window: int, func) -> np.ndarray:
+    """Aplica func(ventanas[..., k, window]) por bloques y alinea el resultado."""
+    x = np.asarray(x, dtype=float)
+    n = x.shape[-1]
+    if n < window:
+        return np.full(x.shape, np.nan)
+    views = sliding_window_view(x, window, axis=-1)
+    count = views.shape[-2]
+    parts = [func(views[..., start:start + CHUNK_WINDOWS, :]) for start in range(0, count, CHUNK_WINDOWS)]
+    return _pad_front(np.concatenate(parts, axis=-1), window)
+
+
+def rolling_mean_std(x: np.ndarray, window: int) -> Dict[str, np.ndarray]:
+    """Media y desviación poblacional móviles (como np.mean / np.std sobre la ventana)."""
+    mean = _chunked_windows(x, window, lambda w: w.mean(axis=-1))
+    std = _chunked_windows(x, window, lambda w: w.std(axis=-1))
+    return {'mean': mean, 'std': std}
+
+
+def rolling_min(x: np.ndarray, window: int) -> np.ndarray:
+    return _chunked_windows(x, window, lambda w: w.min(axis=-1))
+
+
+def rolling_max(x: np.ndarray, window: int) -> np.ndarray:
+    return _chunked_windows(x, window, lambda w: w.max(axis=-1))
+
+
+def rolling_regression(y: np.ndarray, window: int) -> Dict[str, np.ndarray]:
+    """
+    Regresión lineal móvil de y sobre x = 0..window-1 (equivalente a linregress por ventana).
+
+    Forma cerrada: slope = Σ(x - x̄)·y / Sxx, r = Σ(x - x̄)·y / sqrt(Sxx·Syy).
+
+    Returns:
+        Dict con 'slope' y 'r' alineados con la última vela de cada ventana
+    """
+    xc = np.arange(window, dtype=float) - (window - 1) / 2.0
+    sxx = float(xc @ xc)
+
+    def slope(w):
+        return (w @ xc) / sxx
+
+    def r_value(w):
+        sxy = w @ xc
+        centred = w - w.mean(axis=-1, keepdims=True)
+        syy = np.einsum('...i,...i->...', centred, centred)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = np.where(syy > 0, sxy / np.sqrt(sxx * syy), 0.0)
+        return np.clip(r, -1.0, 1.0)
+
+    return {'slope': _chunked_windows(y, window, slope), 'r': _chunked_windows(y, window, r_value)}
+
+
+def pct_returns(x: np.ndarray) -> np.ndarray:
+    """Retornos simples alineados con x (el primero es NaN)."""
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out[..., 1:] = np.diff(x, axis=-1) / x[..., :-1]
+    return out
+
+
+def rolling_histogram_mode(x: np.ndarray, window: int, bins: int) -> Dict[str, np.ndarray]:
+    """
+    Bin más poblado del histograma de cada ventana (mismos bordes y reglas que np.histogram).
+
+    Returns:
+        Dict con 'low_edge' y 'high_edge' del bin modal
+    """
+    def mode_edges(w):
+        lo = w.min(axis=-1)
+        hi = w.max(axis=-1)
+        flat = lo == hi
+        lo = np.where(flat, lo - 0.5, lo)
+        hi = np.where(flat, hi + 0.5, hi)
+        # Bordes de cada ventana (linspace vectorizado)
+        steps = np.arange(bins + 1) / bins
+        edges = lo[..., None] + (hi - lo)[..., None] * steps
+        edges[..., -1] = hi
+
+        norm = bins / (hi - lo)
+        idx = np.floor((w - lo[..., None]) * norm[..., None]).astype(np.int64)
+        idx = np.clip(idx, 0, bins - 1)
+        # Corrección por redondeo contra los bordes, igual que np.histogram
+        below = w < np.take_along_axis(edges, idx, axis=-1)
+        idx = idx - below
+        above = (w >= np.take_along_axis(edges, idx + 1, axis=-1)) & (idx != bins - 1)
+        idx = idx + above
+
+        rows = idx.reshape(-1, idx.shape[-1])
+        offsets = (np.arange(rows.shape[0]) * bins)[:, None]
+        counts = np.bincount((rows + offsets).ravel(), minlength=rows.shape[0] * bins)
+        counts = counts.reshape(idx.shape[:-1] + (bins,))
+        peak = counts.argmax(axis=-1)[..., None]
+        low_edge = np.take_along_axis(edges, peak, axis=-1)[..., 0]
+        high_edge = np.take_along_axis(edges, peak + 1, axis=-1)[..., 0]
+        return np.stack([low_edge, high_edge])
+
+    x = np.asarray(x, dtype=float)
+    if x.shape[-1] < window:
+        nan = np.full(x.shape, np.nan)
+        return {'low_edge': nan, 'high_edge': nan.copy()}
+    views = sliding_window_view(x, window, axis=-1)
+    parts = [mode_edges(views[..., s:s + CHUNK_WINDOWS, :]) for s in range(0, views.shape[-2], CHUNK_WINDOWS)]
+    stacked = np.concatenate(parts, axis=-1)
+    return {'low_edge': _pad_front(stacked[0], window), 'high_edge': _pad_front(stacked[1], window)}
+
+
+def _rolling_any(flags: np.ndarray, window: int) -> np.ndarray:
+    """True si alguna de las últimas `window` velas cumple (False donde no hay ventana)."""
+    result = _chunked_windows(flags.astype(float), window, lambda w: w.max(axis=-1))
+    return np.nan_to_num(result, nan=0.0) > 0
+
+
+# ----------------------------------------------------------------------
+# Indicadores por defecto (cuando no vienen columnas calculadas)
+# ----------------------------------------------------------------------
+
+def _ewm(x: np.ndarray, **kwargs) -> np.ndarray:
+    """EWM de pandas sobre el último eje (x puede ser (n,) o (series, n))."""
+    x = np.asarray(x, dtype=float)
+    frame = pd.DataFrame(x.reshape(-1, x.shape[-1]).T)
+    return frame.ewm(**kwargs).mean().to_numpy().T.reshape(x.shape)
+
+
+def default_indicators(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    RSI(14), histograma MACD(12, 26, 9), posición en Bandas de Bollinger(20, 2)
+    y estocástico %K(14), vectorizados.
+
+    Returns:
+        Dict con 'rsi', 'macd_histogram', 'bb_position', 'stoch_k'
+    """
+    close = np.asarray(close, dtype=float)
+    delta = np.diff(close, axis=-1, prepend=np.nan)
+    gain = _ewm(np.where(delta > 0, delta, 0.0), alpha=1 / 14, adjust=False)
+    loss = _ewm(np.where(delta < 0, -delta, 0.0), alpha=1 / 14, adjust=False)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi = np.where(loss > 0, 100 - 100 / (1 + gain / loss), 100.0)
+    rsi[..., :14] = np.nan
+
+    macd = _ewm(close, span=12, adjust=False) - _ewm(close, span=26, adjust=False)
+    macd_histogram = macd - _ewm(macd, span=9, adjust=False)
+    macd_histogram[..., :25] = np.nan
+
+    bb = rolling_mean_std(close, 20)
+    upper = bb['mean'] + 2 * bb['std']
+    lower = bb['mean'] - 2 * bb['std']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bb_position = np.where(upper > lower, (close - lower) / (upper - lower), 0.5)
+    bb_position[np.isnan(bb['mean'])] = np.nan
+
+    lowest = rolling_min(low, 14)
+    highest = rolling_max(high, 14)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stoch_k = np.where(highest > lowest, (close - lowest) / (highest - lowest) * 100, 50.0)
+    stoch_k[np.isnan(lowest)] = np.nan
+
+    return {'rsi': rsi, 'macd_histogram': macd_histogram, 'bb_position': bb_position, 'stoch_k': stoch_k}
+
+
+# ----------------------------------------------------------------------
+# Scores derivados de indicadores (mismas reglas que AdvancedAIEngine)
+# ----------------------------------------------------------------------
+
+def technical_score(ind: Dict[str, np.ndarray]) -> np.ndarray:
+    """Equivalente vectorizado de AdvancedAIEngine._calculate_technical_score."""
+    shape = ind['rsi'].shape
+    score = np.zeros(shape)
+    weights = np.zeros(shape)
+
+    def add(mask, value, weight):
+        nonlocal score, weights
+        score = score + np.where(mask, value * weight, 0.0)
+        weights = weights + np.where(mask, weight, 0.0)
+
+    rsi = ind.get('rsi')
+    if rsi is not None:
+        add(rsi < 30, 0.8, 0.20)
+        add(rsi > 70, -0.8, 0.20)
+    hist = ind.get('macd_histogram')
+    if hist is not None:
+        valid = ~np.isnan(hist)
+        add(valid & (hist > 0), 0.6, 0.25)
+        add(valid & ~(hist > 0), -0.6, 0.25)
+    bb = ind.get('bb_position')
+    if bb is not None:
+        add(bb < 0.2, 0.7, 0.20)
+        add(bb > 0.8, -0.7, 0.20)
+    adx = ind.get('adx')
+    if adx is not None:
+        direction = ind.get('adx_signal', np.zeros(shape))
+        strong = adx > 25
+        add(strong & (direction > 0), 0.5, 0.20)
+        add(strong & ~(direction > 0), -0.5, 0.20)
+    k = ind.get('stoch_k')
+    if k is not None:
+        add(k < 20, 0.6, 0.15)
+        add(k > 80, -0.6, 0.15)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalized = np.where(weights > 0, score / weights, 0.0)
+    return np.tanh(normalized)
+
+
+def reversal_probability(ind: Dict[str, np.ndarray]) -> np.ndarray:
+    """Equivalente vectorizado de AdvancedAIEngine._calculate_reversal_probability."""
+    shape = ind['rsi'].shape
+    rsi = np.nan_to_num(ind.get('rsi', np.full(shape, 50.0)), nan=50.0)
+    k = np.nan_to_num(ind.get('stoch_k', np.full(shape, 50.0)), nan=50.0)
+    bb = np.nan_to_num(ind.get('bb_position', np.full(shape, 0.5)), nan=0.5)
+
+    rsi_hit = (rsi < 20) | (rsi > 80)
+    k_hit = (k < 10) | (k > 90)
+    bb_hit = (bb < 0.05) | (bb > 0.95)
+    probability = 0.7 * rsi_hit + 0.6 * k_hit + 0.5 * bb_hit
+    count = rsi_hit.astype(int) + k_hit + bb_hit
+    return probability / np.maximum(count, 1)
+
+
+def ml_proxy_score(rsi: np.ndarray) -> np.ndarray:
+    """Equivalente vectorizado del placeholder AdvancedAIEngine._get_ml_prediction."""
+    return np.clip((np.nan_to_num(rsi, nan=50.0) - 30) / 40, 0, 1)
+
+
+# ----------------------------------------------------------------------
+# Matriz completa
+# ----------------------------------------------------------------------
+
+def compute_features(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: Optional[np.ndarray] = None,
+    indicators: Optional[Dict[str, np.ndarray]] = None,
+    include_indicators: bool = True
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula todas las features por vela.
+
+    Args:
+        open_, high, low, close: Arrays (n,) o (series, n)
+        volume: Array de volumen (opcional)
+        indicators: Arrays de indicadores ya calculados ('rsi', 'macd_histogram',
+                    'bb_position', 'stoch_k', 'adx', 'adx_signal'); los que
+                    falten se calculan con default_indicators
+        include_indicators: Si False, omite indicadores y scores derivados
+                            (cuando se calculan aparte, p.ej. desde dicts en vivo)
+
+    Returns:
+        Dict nombre -> array con la misma forma que close
+    """
+    o = np.asarray(open_, dtype=float)
+    h = np.asarray(high, dtype=float)
+    l = np.asarray(low, dtype=float)
+    c = np.asarray(close, dtype=float)
+    features: Dict[str, np.ndarray] = {}
+
+    # Tendencia
+    trend = rolling_regression(c, TREND_WINDOW)
+    features['trend_slope'] = trend['slope']
+    features['trend_strength'] = np.tanh(trend['slope'] * 1000) * trend['r'] ** 2
+
+    # Sentimiento (últimas 20 velas: 19 retornos)
+    returns = pct_returns(c)
+    sentiment_returns = rolling_mean_std(returns, SENTIMENT_WINDOW - 1)
+    bullish_ratio = _chunked_windows((c > o).astype(float), SENTIMENT_WINDOW, lambda w: w.sum(axis=-1)) / SENTIMENT_WINDOW
+    features['bullish_pressure'] = np.minimum(1.0, bullish_ratio * 1.5)
+    features['bearish_pressure'] = 1.0 - features['bullish_pressure']
+    features['sentiment_score'] = features['bullish_pressure'] - features['bearish_pressure']
+    features['momentum'] = sentiment_returns['mean'] * 100
+    features['volatility'] = sentiment_returns['std']
+
+    if volume is not None:
+        v = np.asarray(volume, dtype=float)
+        short = rolling_mean_std(v, 5)['mean']
+        long_ = rolling_mean_std(v, 10)['mean']
+        features['volume_strength'] = np.minimum(1.0, short / (long_ + 1e-10))
+        volume_slope = rolling_regression(v, TREND_WINDOW)['slope']
+        features['bearish_divergence'] = (trend['slope'] > 0) & (volume_slope < 0)
+        features['bullish_divergence'] = (trend['slope'] < 0) & (volume_slope > 0)
+    else:
+        features['volume_strength'] = np.full(c.shape, 0.5)
+        features['bearish_divergence'] = np.zeros(c.shape, dtype=bool)
+        features['bullish_divergence'] = np.zeros(c.shape, dtype=bool)
+
+    # Fase de mercado (50 velas)
+    phase = rolling_regression(c, PHASE_WINDOW)
+    phase_vol = rolling_mean_std(returns, PHASE_WINDOW - 1)['std']
+    r2 = phase['r'] ** 2
+    trending = r2 > 0.7
+    calm = phase_vol < 0.01
+    up = phase['slope'] > 0
+    codes = np.select(
+        [trending & up & calm, trending & up, trending & calm, trending, phase_vol > 0.02],
+        [0, 1, 4, 3, 5],
+        default=2
+    )
+    codes = np.where(np.isnan(phase['slope']), 6, codes)
+    features['market_phase'] = codes.astype(np.int8)
+
+    # Patrones de gráfico y de velas
+    closes50 = rolling_mean_std(c, PHASE_WINDOW)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        chart_vol = closes50['std'] / closes50['mean']
+    features['chart_pattern'] = np.select([chart_vol < 0.005, chart_vol > 0.02], [0.6, 0.5], default=0.0)
+    candles = compute_candle_patterns(o, h, l, c)
+    candle_conf = np.zeros(c.shape)
+    candle_conf = np.where(_rolling_any(candles['doji'], 3), LEGACY_CONFIDENCE['doji'], candle_conf)
+    candle_conf = np.where(_rolling_any(candles['long_wick'], 3) & (candle_conf < LEGACY_CONFIDENCE['long_wick']),
+                           LEGACY_CONFIDENCE['long_wick'], candle_conf)
+    candle_conf = np.where(_rolling_any(candles['large_body'], 2), LEGACY_CONFIDENCE['large_body'], candle_conf)
+    candle_conf[..., :2] = 0.0
+    features['candle_pattern'] = candle_conf
+
+    # Soporte y resistencia
+    lowest = rolling_min(c, SR_RANGE_WINDOW)
+    highest = rolling_max(c, SR_RANGE_WINDOW)
+    mode = rolling_histogram_mode(c, SR_HIST_WINDOW, SR_BINS)
+    features['support'] = (lowest + mode['low_edge']) / 2
+    features['resistance'] = (highest + mode['high_edge']) / 2
+
+    # Pivot points de la vela
+    pivot = (h + l + c) / 3
+    features['pivot'] = pivot
+    features['r1'] = 2 * pivot - l
+    features['s1'] = 2 * pivot - h
+    features['r2'] = pivot + (h - l)
+    features['s2'] = pivot - (h - l)
+    features['r3'] = h + 2 * (pivot - l)
+    features['s3'] = l - 2 * (h - pivot)
+
+    if not include_indicators:
+        return features
+
+    # Indicadores y scores
+    ind = dict(indicators or {})
+    missing = [k for k in ('rsi', 'macd_histogram', 'bb_position', 'stoch_k') if k not in ind]
+    if missing:
+        defaults = default_indicators(h, l, c)
+        for key in missing:
+            ind[key] = defaults[key]
+    ind = {k: np.asarray(v, dtype=float) for k, v in ind.items()}
+    features.update({k: ind[k] for k in ('rsi', 'macd_histogram', 'bb_position', 'stoch_k')})
+    features['technical_score'] = technical_score(ind)
+    features['reversal_probability'] = reversal_probability(ind)
+    features['ml_score'] = ml_proxy_score(ind['rsi'])
+
+    return features
+
+
+INDICATOR_COLUMNS = {
+    'rsi': 'rsi',
+    'macd_histogram': 'macd_histogram',
+    'bb_position': 'bb_position',
+    'stoch_k': 'stoch_k',
+    'adx': 'adx',
+    'adx_signal': 'adx_signal'
+}
+
+
+def build_feature_matrix(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Matriz de features por vela para un DataFrame OHLC(V).
+
+    Si el DataFrame trae columnas de indicadores (rsi, macd_histogram,
+    bb_position, stoch_k, adx, adx_signal) se usan; si no, se calculan.
+    Incluye los estimadores de volatilidad (columnas 'vol_*') que el motor
+    mantiene en vivo por vela.
+
+    Returns:
+        DataFrame con el mismo índice y una columna por feature;
+        'market_phase_name' traduce el código de fase
+    """
+    indicators = {key: df[col].to_numpy() for key, col in INDICATOR_COLUMNS.items() if col in df.columns}
+    features = compute_features(
+        df['open'].to_numpy(),
+        df['high'].to_numpy(),
+        df['low'].to_numpy(),
+        df['close'].to_numpy(),
+        df['volume'].to_numpy() if 'volume' in df.columns else None,
+        indicators
+    )
+    volatility = compute_volatility(
+        df['open'].to_numpy(dtype=float),
+        df['high'].to_numpy(dtype=float),
+        df['low'].to_numpy(dtype=float),
+        df['close'].to_numpy(dtype=float)
+    )
+    features.update({f'vol_{name}': values for name, values in volatility.items()})
+    matrix = pd.DataFrame(features, index=df.index)
+    matrix['market_phase_name'] = pd.Categorical.from_codes(matrix['market_phase'], PHASE_CODES)
+    return matrix
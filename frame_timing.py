@@ -0,0 +1,192 @@
+"""
+Frame Timing Monitor - Latencia de tránsito y offset de reloj del broker
+
+Funcionalidades:
+- Estimación del offset reloj local / reloj del broker a partir de frames con timestamp
+- Histograma de latencia de tránsito por activo
+- "Broker now" corregido para resolver expiraciones
+- Alertas cuando la latencia supera un umbral
+
+Método: cada frame con timestamp da una muestra (local - broker) = offset + tránsito.
+El mínimo de las muestras en una ventana deslizante estima el offset (tránsito mínimo ≈ 0);
+la latencia de cada frame es su muestra menos ese offset.
+
+Tipo: Soporte de captura de datos
+"""
+
+from typing import Dict, Any, Optional, List, Callable
+from collections import deque
+import bisect
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class LatencyHistogram:
+    """Histograma de latencias con buckets fijos (memoria constante)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def add(self, latency_ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+        self.last_ms = latency_ms
+
+    def percentile(self, pct: float) -> float:
+        """Percentil aproximado (límite superior del bucket que lo contiene)."""
+        if self.total == 0:
+            return 0.0
+        target = self.total * pct / 100.0
+        cumulative = 0
+        for idx, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return float(LATENCY_BUCKETS_MS[idx]) if idx < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            'samples': self.total,
+            'mean_ms': self.sum_ms / self.total if self.total else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'max_ms': self.max_ms,
+            'last_ms': self.last_ms,
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class FrameTimingMonitor:
+    """
+    Mide el retraso de los datos del WebSocket y el desfase de reloj con el broker.
+
+    Características:
+    - Mínimo deslizante O(1) amortizado para el offset
+    - Histograma por activo de latencia de tránsito
+    - Alertas con cooldown por activo
+    """
+
+    def __init__(
+        self,
+        alert_threshold_ms: float = 500.0,
+        offset_window_seconds: float = 300.0,
+        alert_cooldown_seconds: float = 30.0
+    ):
+        """
+        Inicializa el monitor.
+
+        Args:
+            alert_threshold_ms: Latencia a partir de la cual se dispara alerta
+            offset_window_seconds: Ventana para estimar el offset de reloj
+            alert_cooldown_seconds: Tiempo mínimo entre alertas del mismo activo
+        """
+        self.alert_threshold_ms = alert_threshold_ms
+        self.offset_window_seconds = offset_window_seconds
+        self.alert_cooldown_seconds = alert_cooldown_seconds
+
+        # Deque monótono (local_ts, muestra) para el mínimo deslizante
+        self._offset_window: deque = deque()
+        self.clock_offset: Optional[float] = None  # segundos, local - broker
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.alert_count = 0
+        self._last_alert: Dict[str, float] = {}
+        self._alert_callbacks: List[Callable[[str, float], None]] = []
+
+    @staticmethod
+    def _to_seconds(broker_ts: Any) -> Optional[float]:
+        try:
+            ts = float(broker_ts)
+        except (TypeError, ValueError):
+            return None
+        if ts <= 0:
+            return None
+        return ts / 1000.0 if ts > 10_000_000_000 else ts
+
+    def add_alert_callback(self, callback: Callable[[str, float], None]) -> None:
+        """Registra una función callback(asset, latency_ms) para alertas de latencia."""
+        self._alert_callbacks.append(callback)
+
+    def record(self, asset: str, broker_ts: Any, local_ts: Optional[float] = None) -> Optional[float]:
+        """
+        Registra un frame con timestamp del broker.
+
+        Args:
+            asset: Activo del frame
+            broker_ts: Timestamp del broker (segundos o milisegundos)
+            local_ts: Hora local de recepción (time.time()); por defecto ahora
+
+        Returns:
+            Latencia de tránsito estimada en ms, o None si el timestamp no es válido
+        """
+        broker_sec = self._to_seconds(broker_ts)
+        if broker_sec is None:
+            return None
+        if local_ts is None:
+            local_ts = time.time()
+
+        sample = local_ts - broker_sec
+
+        # Mínimo deslizante: descartar muestras mayores y las que salen de la ventana
+        window = self._offset_window
+        while window and window[-1][1] >= sample:
+            window.pop()
+        window.append((local_ts, sample))
+        while window and window[0][0] < local_ts - self.offset_window_seconds:
+            window.popleft()
+        self.clock_offset = window[0][1]
+
+        latency_ms = max(0.0, (sample - self.clock_offset) * 1000.0)
+        histogram = self.histograms.get(asset)
+        if histogram is None:
+            histogram = self.histograms[asset] = LatencyHistogram()
+        histogram.add(latency_ms)
+
+        if latency_ms > self.alert_threshold_ms:
+            self._alert(asset, latency_ms, local_ts)
+        return latency_ms
+
+    def _alert(self, asset: str, latency_ms: float, now: float) -> None:
+        self.alert_count += 1
+        if now - self._last_alert.get(asset, 0.0) < self.alert_cooldown_seconds:
+            return
+        self._last_alert[asset] = now
+        logger.warning(
+            f"[LATENCY] {asset}: frame con {latency_ms:.0f}ms de retraso "
+            f"(umbral {self.alert_threshold_ms:.0f}ms)"
+        )
+        for callback in self._alert_callbacks:
+            try:
+                callback(asset, latency_ms)
+            except Exception as e:
+                logger.debug(f"[LATENCY] Error en callback de alerta: {e}")
+
+    def broker_now(self, local_ts: Optional[float] = None) -> float:
+        """
+        Hora actual en el reloj del broker (segundos epoch).
+
+        Sin muestras todavía, asume que ambos relojes coinciden.
+        """
+        if local_ts is None:
+            local_ts = time.time()
+        return local_ts - (self.clock_offset or 0.0)
+
+    def get_report(self) -> Dict[str, Any]:
+        """Retorna offset de reloj, alertas e histogramas por activo."""
+        return {
+            'clock_offset_ms': self.clock_offset * 1000.0 if self.clock_offset is not None else None,
+            'alert_threshold_ms': self.alert_threshold_ms,
+            'alerts': self.alert_count,
+            'assets': {asset: hist.to_dict() for asset, hist in self.histograms.items()}
+        }
@@ -0,0 +1,476 @@
+"""
+Harmonic Patterns - Búsqueda XABCD sobre pivotes zigzag
+=======================================================
+
+Construye una secuencia de pivotes zigzag (alternando máximos y mínimos) y
+busca combinaciones X-A-B-C-D que cumplan las plantillas de ratios de
+Fibonacci (Gartley, Butterfly, Bat) con una tolerancia.
+
+Plantillas: `point_ratios` = [AB/XA, BC/AB, AD/XA].
+
+Rendimiento:
+  - El zigzag se actualiza en O(1) por vela.
+  - Solo se buscan combinaciones que terminan en el pivote recién confirmado
+    (como C para proyectar la zona de completitud, o como D para completar).
+  - Poda: X-A-B se descarta si AB/XA está fuera de los límites de todas las
+    plantillas antes de enumerar C, y X-A-B-C si BC/AB también lo está.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple, Optional, Any
+from dataclasses import dataclass, field
+from collections import deque
+import logging
+
+import engine_kernels
+
+logger = logging.getLogger(__name__)
+
+# Tolerancia relativa por ratio [AB/XA, BC/AB, AD/XA]; BC es el tramo más flexible
+DEFAULT_TOLERANCES = (0.10, 0.60, 0.10)
+
+DEFAULT_TEMPLATES = {
+    'gartley': [0.618, 0.382, 0.886],
+    'butterfly': [0.786, 0.382, 1.272],
+    'bat': [0.500, 0.382, 0.886],
+}
+
+HIGH = 1
+LOW = -1
+
+
+@dataclass
+class Pivot:
+    """Punto de giro confirmado del zigzag."""
+    index: int
+    time: Any
+    price: float
+    kind: int  # HIGH o LOW
+
+
+@dataclass
+class HarmonicMatch:
+    """Patrón armónico encontrado (completo o pendiente de D)."""
+    pattern: str  # p.ej. 'bullish_gartley'
+    direction: str  # 'bullish' o 'bearish'
+    points: Dict[str, Tuple[int, float]]  # etiqueta -> (índice de vela, precio)
+    ratios: Dict[str, float]
+    score: float  # 0..1 (1 = ratios exactos)
+    prz_low: float  # Zona de completitud (Potential Reversal Zone)
+    prz_high: float
+    completed: bool
+    detected_at: int = field(default=0)  # índice de vela del último pivote usado
+
+    def contains(self, price: float) -> bool:
+        """Indica si un precio está dentro de la zona de completitud."""
+        return self.prz_low <= price <= self.prz_high
+
+
+def templates_from_point_ratios(harmonic_patterns: Dict[str, Dict[str, List[float]]]) -> Dict[str, List[float]]:
+    """
+    Convierte el formato de PatternRecognizer ('bullish_gartley': {'point_ratios': [...]})
+    a plantillas por nombre base ('gartley': [...]).
+    """
+    templates = {}
+    for name, spec in harmonic_patterns.items():
+        base = name.split('_', 1)[-1]
+        templates[base] = list(spec['point_ratios'])
+    return templates
+
+
+class ZigZag:
+    """
+    Zigzag incremental por desviación absoluta.
+
+    La desviación se adapta al activo: `atr_multiplier` veces la media
+    exponencial del rango de las velas.
+    """
+
+    def __init__(self, atr_multiplier: float = 3.0, atr_period: int = 14):
+        self.atr_multiplier = atr_multiplier
+        self.alpha = 2.0 / (atr_period + 1)
+        self.reset()
+
+    def reset(self) -> None:
+        self.avg_range: Optional[float] = None
+        self.direction = 0
+        self.ext_index = 0
+        self.ext_time: Any = None
+        self.ext_price = 0.0
+        # Extremos mientras no hay dirección
+        self._hi = (0, None, -np.inf)
+        self._lo = (0, None, np.inf)
+
+    @property
+    def deviation(self) -> float:
+        return self.atr_multiplier * (self.avg_range or 0.0)
+
+    def update(self, index: int, time: Any, high: float, low: float) -> Optional[Pivot]:
+        """
+        Procesa una vela cerrada.
+
+        Returns:
+            El pivote confirmado por esta vela, o None
+        """
+        bar_range = high - low
+        if self.avg_range is None:
+            self.avg_range = bar_range
+        else:
+            self.avg_range += self.alpha * (bar_range - self.avg_range)
+        deviation = self.deviation
+        if deviation <= 0:
+            return None
+
+        if self.direction == 0:
+            if high > self._hi[2]:
+                self._hi = (index, time, high)
+            if low < self._lo[2]:
+                self._lo = (index, time, low)
+            if self._hi[2] - self._lo[2] < deviation:
+                return None
+            # El extremo más antiguo es el pivote; el más reciente marca la dirección
+            if self._lo[0] <= self._hi[0]:
+                pivot = Pivot(self._lo[0], self._lo[1], self._lo[2], LOW)
+                self.direction = 1
+                self.ext_index, self.ext_time, self.ext_price = self._hi
+            else:
+                pivot = Pivot(self._hi[0], self._hi[1], self._hi[2], HIGH)
+                self.direction = -1
+                self.ext_index, self.ext_time, self.ext_price = self._lo
+            return pivot
+
+        if self.direction == 1:
+            if high > self.ext_price:
+                self.ext_index, self.ext_time, self.ext_price = index, time, high
+            elif self.ext_price - low >= deviation:
+                pivot = Pivot(self.ext_index, self.ext_time, self.ext_price, HIGH)
+                self.direction = -1
+                self.ext_index, self.ext_time, self.ext_price = index, time, low
+                return pivot
+        else:
+            if low < self.ext_price:
+                self.ext_index, self.ext_time, self.ext_price = index, time, low
+            elif high - self.ext_price >= deviation:
+                pivot = Pivot(self.ext_index, self.ext_time, self.ext_price, LOW)
+                self.direction = 1
+                self.ext_index, self.ext_time, self.ext_price = index, time, high
+                return pivot
+        return None
+
+    def export_state(self) -> np.ndarray:
+        """Estado como vector para engine_kernels.zigzag."""
+        state = engine_kernels.initial_zigzag_state()
+        state[engine_kernels.ZZ_HAS_AVG] = 0.0 if self.avg_range is None else 1.0
+        state[engine_kernels.ZZ_AVG] = self.avg_range or 0.0
+        state[engine_kernels.ZZ_DIRECTION] = self.direction
+        state[engine_kernels.ZZ_EXT_INDEX] = self.ext_index
+        state[engine_kernels.ZZ_EXT_PRICE] = self.ext_price
+        state[engine_kernels.ZZ_HI_INDEX], state[engine_kernels.ZZ_HI_PRICE] = self._hi[0], self._hi[2]
+        state[engine_kernels.ZZ_LO_INDEX], state[engine_kernels.ZZ_LO_PRICE] = self._lo[0], self._lo[2]
+        return state
+
+    def known_times(self) -> Dict[int, Any]:
+        """Horas de las velas que el estado referencia (las anteriores al bloque siguiente)."""
+        return {i: t for i, t in (self._hi[:2], self._lo[:2], (self.ext_index, self.ext_time)) if t is not None}
+
+    def import_state(self, state: np.ndarray, time_of) -> None:
+        """
+        Carga el estado devuelto por engine_kernels.zigzag.
+
+        Args:
+            state: Vector de estado
+            time_of: Función índice de vela -> hora
+        """
+        has_avg = state[engine_kernels.ZZ_HAS_AVG] != 0.0
+        self.avg_range = float(state[engine_kernels.ZZ_AVG]) if has_avg else None
+        self.direction = int(state[engine_kernels.ZZ_DIRECTION])
+        self.ext_index = int(state[engine_kernels.ZZ_EXT_INDEX])
+        self.ext_time = time_of(self.ext_index) if self.direction != 0 else None
+        self.ext_price = float(state[engine_kernels.ZZ_EXT_PRICE])
+        hi_index, lo_index = int(state[engine_kernels.ZZ_HI_INDEX]), int(state[engine_kernels.ZZ_LO_INDEX])
+        hi_price, lo_price = float(state[engine_kernels.ZZ_HI_PRICE]), float(state[engine_kernels.ZZ_LO_PRICE])
+        self._hi = (hi_index, time_of(hi_index) if np.isfinite(hi_price) else None, hi_price)
+        self._lo = (lo_index, time_of(lo_index) if np.isfinite(lo_price) else None, lo_price)
+
+
+def _ratio_bounds(templates: Dict[str, List[float]], position: int, tolerance: float) -> Tuple[float, float]:
+    values = [t[position] for t in templates.values()]
+    return min(values) * (1 - tolerance), max(values) * (1 + tolerance)
+
+
+def _score(ratios: Tuple[float, ...], targets: List[float], tolerances: Tuple[float, ...]) -> Optional[float]:
+    """Puntaje 0..1 según la desviación relativa de cada ratio; None si alguno excede la tolerancia."""
+    penalty = 0.0
+    for actual, target, tolerance in zip(ratios, targets, tolerances):
+        deviation = abs(actual / target - 1.0)
+        if deviation > tolerance:
+            return None
+        penalty += deviation / tolerance
+    return 1.0 - penalty / len(ratios)
+
+
+def search_patterns(
+    pivots: List[Pivot],
+    templates: Dict[str, List[float]],
+    tolerances: Tuple[float, float, float] = DEFAULT_TOLERANCES,
+    max_span: int = 12
+) -> List[HarmonicMatch]:
+    """
+    Busca patrones que terminan en el último pivote de la lista.
+
+    El último pivote se prueba como D (patrón completo) y como C
+    (patrón pendiente con zona de completitud proyectada).
+
+    Args:
+        pivots: Pivotes alternados, del más antiguo al más reciente
+        templates: Ratios [AB/XA, BC/AB, AD/XA] por nombre base
+        tolerances: Tolerancia relativa de cada ratio
+        max_span: Máximo de pivotes hacia atrás que puede abarcar un patrón
+
+    Returns:
+        Coincidencias ordenadas por puntaje descendente
+    """
+    matches: List[HarmonicMatch] = []
+    if len(pivots) < 4 or not templates:
+        return matches
+
+    ab_min, ab_max = _ratio_bounds(templates, 0, tolerances[0])
+    bc_min, bc_max = _ratio_bounds(templates, 1, tolerances[1])
+    window = pivots[-(max_span + 1):]
+    last = len(window) - 1
+
+    for completed in (True, False):
+        end = window[last]
+        # Completo: el último pivote es D (mismo tipo que X y B); pendiente: es C (tipo de A)
+        x_kind = end.kind if completed else -end.kind
+        c_candidates = range(0, last) if completed else (last,)
+
+        for xi in range(0, last):
+            x = window[xi]
+            if x.kind != x_kind:
+                continue
+            for ai in range(xi + 1, last):
+                a = window[ai]
+                if a.kind == x_kind:
+                    continue
+                xa = a.price - x.price
+                # Bullish: X mínimo, A máximo (xa > 0); bearish al revés
+                if xa == 0 or (xa > 0) != (x_kind == LOW):
+                    continue
+                for bi in range(ai + 1, last):
+                    b = window[bi]
+                    if b.kind != x_kind:
+                        continue
+                    ab = a.price - b.price
+                    ab_ratio = ab / xa
+                    # Poda: AB/XA fuera de todas las plantillas
+                    if not ab_min <= ab_ratio <= ab_max:
+                        continue
+                    for ci in c_candidates:
+                        if ci <= bi:
+                            continue
+                        c = window[ci]
+                        if c.kind == x_kind:
+                            continue
+                        bc_ratio = (c.price - b.price) / ab
+                        if not bc_min <= bc_ratio <= bc_max:
+                            continue
+                        if completed:
+                            matches.extend(_match_completed(x, a, b, c, end, xa, ab_ratio, bc_ratio, templates, tolerances))
+                        else:
+                            matches.extend(_match_pending(x, a, b, c, xa, ab_ratio, bc_ratio, templates, tolerances))
+
+    matches.sort(key=lambda m: m.score, reverse=True)
+    return matches
+
+
+def _direction(xa: float) -> str:
+    return 'bullish' if xa > 0 else 'bearish'
+
+
+def _match_completed(x, a, b, c, d, xa, ab_ratio, bc_ratio, templates, tolerances) -> List[HarmonicMatch]:
+    ad_ratio = (a.price - d.price) / xa
+    # D debe estar más allá de C en la dirección del patrón
+    if (d.price - c.price) * xa >= 0:
+        return []
+    found = []
+    direction = _direction(xa)
+    for name, targets in templates.items():
+        score = _score((ab_ratio, bc_ratio, ad_ratio), targets, tolerances)
+        if score is None:
+            continue
+        prz_a = a.price - xa * targets[2] * (1 - tolerances[2])
+        prz_b = a.price - xa * targets[2] * (1 + tolerances[2])
+        found.append(HarmonicMatch(
+            pattern=f"{direction}_{name}",
+            direction=direction,
+            points={'X': (x.index, x.price), 'A': (a.index, a.price), 'B': (b.index, b.price),
+                    'C': (c.index, c.price), 'D': (d.index, d.price)},
+            ratios={'AB/XA': ab_ratio, 'BC/AB': bc_ratio, 'AD/XA': ad_ratio},
+            score=score,
+            prz_low=min(prz_a, prz_b),
+            prz_high=max(prz_a, prz_b),
+            completed=True,
+            detected_at=d.index
+        ))
+    return found
+
+
+def _match_pending(x, a, b, c, xa, ab_ratio, bc_ratio, templates, tolerances) -> List[HarmonicMatch]:
+    found = []
+    direction = _direction(xa)
+    for name, targets in templates.items():
+        score = _score((ab_ratio, bc_ratio), targets[:2], tolerances[:2])
+        if score is None:
+            continue
+        prz_a = a.price - xa * targets[2] * (1 - tolerances[2])
+        prz_b = a.price - xa * targets[2] * (1 + tolerances[2])
+        found.append(HarmonicMatch(
+            pattern=f"{direction}_{name}",
+            direction=direction,
+            points={'X': (x.index, x.price), 'A': (a.index, a.price), 'B': (b.index, b.price),
+                    'C': (c.index, c.price)},
+            ratios={'AB/XA': ab_ratio, 'BC/AB': bc_ratio},
+            score=score,
+            prz_low=min(prz_a, prz_b),
+            prz_high=max(prz_a, prz_b),
+            completed=False,
+            detected_at=c.index
+        ))
+    return found
+
+
+class HarmonicDetector:
+    """
+    Detector armónico incremental para un activo.
+
+    Características:
+    - sync(df) procesa solo las velas cerradas nuevas
+    - Búsqueda XABCD solo al confirmarse un pivote
+    - Patrones pendientes (XABC) con zona de completitud proyectada
+    """
+
+    def __init__(
+        self,
+        templates: Optional[Dict[str, List[float]]] = None,
+        tolerances: Tuple[float, float, float] = DEFAULT_TOLERANCES,
+        atr_multiplier: float = 3.0,
+        max_pivots: int = 50,
+        max_span: int = 12,
+        warmup_bars: int = 500
+    ):
+        """
+        Inicializa el detector.
+
+        Args:
+            templates: Ratios [AB/XA, BC/AB, AD/XA] por nombre base
+            tolerances: Tolerancia relativa de cada ratio
+            atr_multiplier: Desviación del zigzag en múltiplos del rango medio
+            max_pivots: Pivotes conservados
+            max_span: Pivotes que puede abarcar un patrón
+            warmup_bars: Velas usadas al reconstruir el estado
+        """
+        self.templates = templates or dict(DEFAULT_TEMPLATES)
+        self.tolerances = tolerances
+        self.max_span = max_span
+        self.warmup_bars = warmup_bars
+        self.max_pivots = max_pivots
+        self.zigzag = ZigZag(atr_multiplier=atr_multiplier)
+        self.reset()
+
+    def reset(self) -> None:
+        self.zigzag.reset()
+        self.pivots: deque = deque(maxlen=self.max_pivots)
+        self.completed: deque = deque(maxlen=20)
+        self.pending: List[HarmonicMatch] = []
+        self.bar_count = 0
+        self.last_closed_time = None
+        self.searches = 0
+
+    def push_bar(self, time: Any, high: float, low: float) -> Optional[Pivot]:
+        """Procesa una vela cerrada; busca patrones si confirma un pivote."""
+        index = self.bar_count
+        self.bar_count += 1
+        self.last_closed_time = time
+        pivot = self.zigzag.update(index, time, high, low)
+        if pivot is not None:
+            self._on_pivot(pivot)
+        return pivot
+
+    def _on_pivot(self, pivot: Pivot) -> None:
+        self.pivots.append(pivot)
+        self.searches += 1
+        matches = search_patterns(list(self.pivots), self.templates, self.tolerances, self.max_span)
+        # Los pendientes anteriores terminaban en C; con un pivote nuevo ya no aplican
+        self.pending = [m for m in matches if not m.completed]
+        for match in matches:
+            if match.completed:
+                self.completed.append(match)
+
+    def sync(self, df: pd.DataFrame) -> int:
+        """
+        Procesa las velas cerradas nuevas del DataFrame (la última fila es la vela en formación).
+
+        Returns:
+            Número de velas procesadas
+        """
+        if df is None or len(df) < 2:
+            return 0
+        index = df.index
+        start = None
+        if self.last_closed_time is not None and index.is_monotonic_increasing:
+            pos = index.searchsorted(self.last_closed_time)
+            if pos < len(index) and index[pos] == self.last_closed_time:
+                start = pos + 1
+        if start is None:
+            self.reset()
+            start = max(0, len(df) - 1 - self.warmup_bars)
+
+        highs = df['high'].to_numpy(dtype=float)
+        lows = df['low'].to_numpy(dtype=float)
+        end = len(df) - 1
+        if end - start > 1 and engine_kernels.is_compiled('zigzag'):
+            self._sync_block(index[start:end], highs[start:end], lows[start:end])
+        else:
+            for i in range(start, end):
+                self.push_bar(index[i], highs[i], lows[i])
+        return max(0, end - start)
+
+    def _sync_block(self, times: pd.Index, highs: np.ndarray, lows: np.ndarray) -> None:
+        """Equivale a push_bar por cada vela, con el zigzag del bloque en un núcleo compilado."""
+        zigzag = self.zigzag
+        base = self.bar_count
+        known = zigzag.known_times()
+        time_of = lambda i: times[i - base] if i >= base else known.get(i)
+        _, pivot_index, pivot_price, pivot_kind, state = engine_kernels.zigzag(
+            highs, lows, base, zigzag.atr_multiplier, zigzag.alpha, zigzag.export_state()
+        )
+        for i, price, kind in zip(pivot_index.tolist(), pivot_price.tolist(), pivot_kind.tolist()):
+            self._on_pivot(Pivot(i, time_of(i), price, kind))
+        zigzag.import_state(state, time_of)
+        self.bar_count = base + len(times)
+        self.last_closed_time = times[-1]
+
+    def current_match(self, last_price: Optional[float] = None, max_age_bars: int = 10) -> Optional[HarmonicMatch]:
+        """
+        Patrón vigente para la vela actual.
+
+        Prioridad: patrón pendiente cuyo PRZ contiene el precio actual (D formándose),
+        luego el mejor patrón completo reciente.
+
+        Args:
+            last_price: Precio actual (vela en formación)
+            max_age_bars: Antigüedad máxima de D para considerar un patrón completo
+
+        Returns:
+            HarmonicMatch o None
+        """
+        if last_price is not None:
+            in_zone = [m for m in self.pending if m.contains(last_price)]
+            if in_zone:
+                return max(in_zone, key=lambda m: m.score)
+        recent = [m for m in self.completed if self.bar_count - m.detected_at <= max_age_bars]
+        if recent:
+            return max(recent, key=lambda m: m.score)
+        return None
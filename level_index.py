@@ -0,0 +1,280 @@
+"""
+Level Index - Perfil de precios incremental para soporte y resistencia
+======================================================================
+
+Mantiene por activo un perfil de precios (volumen por nivel, o toques si no hay
+volumen) en varias resoluciones de cubeta, actualizado en O(cubetas tocadas)
+por vela cerrada:
+
+  - Rejilla en log-precio calibrada con las primeras velas (mitad del rango
+    mediano alto/bajo por vela); las resoluciones son múltiplos de esa cubeta
+    base. La rejilla no cambia después, así que el perfil nunca se recalcula.
+  - Cada vela reparte su peso (volumen o 1) entre las cubetas de su rango; los
+    pivotes confirmados (giros) suman un toque puntual en su precio.
+  - Decaimiento exponencial de los toques antiguos (vida media en velas) con un
+    factor de escala global: no hay que recorrer el perfil en cada vela.
+  - Los niveles son los máximos locales de cada resolución con masa de al menos
+    `min_strength` veces la del máximo mayor; los de distintas resoluciones que
+    coinciden se fusionan y suman fuerza.
+  - Los niveles se recalculan solo cuando entra una vela cerrada; la consulta
+    del soporte/resistencia más cercano es una búsqueda binaria.
+"""
+
+import numpy as np
+from bisect import bisect_right
+from typing import Dict, List, Tuple, Optional, Any
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESOLUTIONS = (1, 4, 16)
+CALIBRATION_BARS = 30
+DECAY_HALFLIFE = 720
+MIN_STRENGTH = 0.3
+PEAK_RADIUS = 2
+TOUCH_WEIGHT = 5.0
+
+_RESCALE_LIMIT = 1e150
+
+
+class _Profile:
+    """Perfil de una resolución: array denso de pesos con desplazamiento."""
+
+    def __init__(self, width: float):
+        self.width = width  # Ancho de cubeta en log-precio
+        self.offset = 0     # Cubeta del índice 0
+        self.weights = np.zeros(0)
+
+    def _ensure(self, first: int, last: int) -> None:
+        """Amplía el array para cubrir las cubetas [first, last] con margen."""
+        size = len(self.weights)
+        if size == 0:
+            margin = max(16, last - first + 1)
+            self.offset = first - margin
+            self.weights = np.zeros(last - first + 1 + 2 * margin)
+            return
+        end = self.offset + size
+        if first >= self.offset and last < end:
+            return
+        margin = max(16, size // 2)
+        before = max(0, self.offset - first + margin) if first < self.offset else 0
+        after = max(0, last - end + 1 + margin) if last >= end else 0
+        self.weights = np.concatenate([np.zeros(before), self.weights, np.zeros(after)])
+        self.offset -= before
+
+    def add(self, log_low: float, log_high: float, weight: float) -> None:
+        first = math.floor(log_low / self.width)
+        last = math.floor(log_high / self.width)
+        self._ensure(first, last)
+        self.weights[first - self.offset:last - self.offset + 1] += weight / (last - first + 1)
+
+    def peaks(self, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Máximos locales del perfil (máximo en ±radius cubetas).
+
+        Returns:
+            (log-precio del nivel, masa relativa al máximo mayor) de cada máximo; el
+            nivel y la masa son los de la cubeta y sus vecinas inmediatas
+        """
+        w = self.weights
+        if len(w) == 0 or w.max() <= 0:
+            return np.zeros(0), np.zeros(0)
+        n = len(w)
+        padded = np.concatenate([np.zeros(radius), w, np.zeros(radius)])
+        # En mesetas solo cuenta la primera cubeta (estrictamente mayor que las de la izquierda)
+        left = padded[radius - 1:radius - 1 + n].copy()
+        right = padded[radius + 1:radius + 1 + n].copy()
+        for k in range(2, radius + 1):
+            np.maximum(left, padded[radius - k:radius - k + n], out=left)
+            np.maximum(right, padded[radius + k:radius + k + n], out=right)
+        idx = np.flatnonzero((w > left) & (w >= right))
+        if len(idx) == 0:
+            return np.zeros(0), np.zeros(0)
+
+        neighbours = padded[idx[:, None] + radius + np.arange(-1, 2)[None, :]]
+        centers = (self.offset + idx[:, None] + np.arange(-1, 2)[None, :] + 0.5) * self.width
+        mass = neighbours.sum(axis=1)
+        levels = (neighbours * centers).sum(axis=1) / mass
+        return levels, mass / mass.max()
+
+
+class LevelIndex:
+    """
+    Niveles de soporte/resistencia de un activo a partir de su perfil de precios.
+
+    Características:
+    - push_closed en O(cubetas tocadas) con decaimiento exponencial
+    - Varias resoluciones; los niveles coincidentes se fusionan y suman fuerza
+    - nearest: soporte y resistencia más cercanos en O(log niveles)
+    """
+
+    def __init__(
+        self,
+        resolutions: Tuple[int, ...] = DEFAULT_RESOLUTIONS,
+        calibration_bars: int = CALIBRATION_BARS,
+        halflife: float = DECAY_HALFLIFE,
+        min_strength: float = MIN_STRENGTH,
+        peak_radius: int = PEAK_RADIUS,
+        touch_weight: float = TOUCH_WEIGHT
+    ):
+        """
+        Inicializa el índice.
+
+        Args:
+            resolutions: Múltiplos de la cubeta base para cada resolución
+            calibration_bars: Velas para calibrar la cubeta base
+            halflife: Vida media de los toques en velas (None = sin decaimiento)
+            min_strength: Masa mínima de un máximo relativa al mayor de su resolución
+            peak_radius: Cubetas a cada lado para considerar un máximo local
+            touch_weight: Peso de un pivote en velas medias
+        """
+        self.resolutions = tuple(sorted(resolutions))
+        self.calibration_bars = calibration_bars
+        self.growth = 2.0 ** (1.0 / halflife) if halflife else 1.0
+        self.min_strength = min_strength
+        self.peak_radius = peak_radius
+        self.touch_weight = touch_weight
+
+        self.base_width: Optional[float] = None
+        self.profiles: List[_Profile] = []
+        self.bars = 0
+        self._scale = 1.0
+        self._bar_weight: Optional[float] = None  # Peso medio reciente de una vela
+        self._pending: List[Tuple[float, float, float, bool]] = []  # (log bajo, log alto, peso, es vela)
+
+        self._levels: List[float] = []
+        self._strengths: List[float] = []
+        self._dirty = False
+
+    @property
+    def ready(self) -> bool:
+        return self.base_width is not None
+
+    def push_closed(self, high: float, low: float, volume: float = 0.0) -> None:
+        """Agrega una vela cerrada al perfil (peso = volumen, o 1 sin volumen)."""
+        if not (high > 0 and low > 0):
+            return
+        if high < low:
+            high, low = low, high
+        weight = volume if volume > 0 else 1.0
+        self._bar_weight = weight if self._bar_weight is None else self._bar_weight + 0.05 * (weight - self._bar_weight)
+        self.bars += 1
+        self._push(math.log(low), math.log(high), weight, True)
+
+    def push_touch(self, price: float) -> None:
+        """Agrega un toque puntual (pivote confirmado) de `touch_weight` velas medias."""
+        if not price > 0 or self._bar_weight is None:
+            return
+        log_price = math.log(price)
+        self._push(log_price, log_price, self.touch_weight * self._bar_weight, False)
+
+    def _push(self, log_low: float, log_high: float, weight: float, is_bar: bool) -> None:
+        if self.base_width is None:
+            self._pending.append((log_low, log_high, weight, is_bar))
+            if sum(1 for p in self._pending if p[3]) >= self.calibration_bars:
+                self._calibrate()
+            return
+        self._add(log_low, log_high, weight, is_bar)
+
+    def _calibrate(self) -> None:
+        bars = [(lo, hi) for lo, hi, _, is_bar in self._pending if is_bar]
+        ranges = np.array([hi - lo for lo, hi in bars])
+        ranges = ranges[ranges > 0]
+        if len(ranges):
+            # Mitad del rango mediano de una vela
+            self.base_width = max(float(np.median(ranges)) / 2, 1e-6)
+        else:
+            # Velas sin rango (solo cierres): movimiento mediano entre cierres
+            moves = np.abs(np.diff([lo for lo, _ in bars]))
+            moves = moves[moves > 0]
+            self.base_width = max(float(np.median(moves)) if len(moves) else 0.0, 1e-6)
+        self.profiles = [_Profile(self.base_width * r) for r in self.resolutions]
+        pending, self._pending = self._pending, []
+        for lo, hi, weight, is_bar in pending:
+            self._add(lo, hi, weight, is_bar)
+
+    def _add(self, log_low: float, log_high: float, weight: float, is_bar: bool) -> None:
+        # Decaimiento: cada vela hace crecer los pesos nuevos en lugar de encoger los antiguos
+        if is_bar:
+            self._scale *= self.growth
+            if self._scale > _RESCALE_LIMIT:
+                for profile in self.profiles:
+                    profile.weights /= self._scale
+                self._scale = 1.0
+        for profile in self.profiles:
+            profile.add(log_low, log_high, weight * self._scale)
+        self._dirty = True
+
+    def _refresh(self) -> None:
+        """
+        Recalcula los niveles de fina a gruesa.
+
+        Un máximo de una resolución más gruesa confirma (suma su masa a) los
+        niveles más finos a menos de media cubeta; si no hay ninguno, crea un nivel.
+        """
+        levels: List[float] = []            # log-precio, ordenados
+        masses: List[List[float]] = []      # masa por resolución de cada nivel
+        resolutions = len(self.profiles)
+        for r, profile in enumerate(self.profiles):
+            peaks, peak_masses = profile.peaks(self.peak_radius)
+            keep = peak_masses >= self.min_strength
+            half = profile.width / 2
+            for level, mass in zip(peaks[keep].tolist(), peak_masses[keep].tolist()):
+                lo = bisect_right(levels, level - half)
+                hi = bisect_right(levels, level + half)
+                if lo < hi and r > 0:
+                    for i in range(lo, hi):
+                        masses[i][r] = max(masses[i][r], mass)
+                else:
+                    levels.insert(hi, level)
+                    entry = [0.0] * resolutions
+                    entry[r] = mass
+                    masses.insert(hi, entry)
+
+        # Fuerza = masa relativa media entre resoluciones (1.0 = máximo mayor en todas)
+        self._levels = [math.exp(level) for level in levels]
+        self._strengths = [sum(entry) / resolutions for entry in masses]
+        self._dirty = False
+
+    def levels(self) -> List[Tuple[float, float]]:
+        """Niveles significativos (precio, fuerza) ordenados por precio."""
+        if not self.ready:
+            return []
+        if self._dirty:
+            self._refresh()
+        return list(zip(self._levels, self._strengths))
+
+    def nearest(self, price: Optional[float]) -> Dict[str, Optional[float]]:
+        """
+        Soporte (nivel <= precio) y resistencia (nivel > precio) más cercanos.
+
+        Returns:
+            Dict 'support', 'support_strength', 'resistance', 'resistance_strength'
+            (None en el lado sin niveles o si el índice aún no está calibrado)
+        """
+        result: Dict[str, Optional[float]] = {
+            'support': None, 'support_strength': None, 'resistance': None, 'resistance_strength': None
+        }
+        if not self.ready or price is None:
+            return result
+        if self._dirty:
+            self._refresh()
+        below = bisect_right(self._levels, price) - 1
+        if below >= 0:
+            result['support'] = self._levels[below]
+            result['support_strength'] = self._strengths[below]
+        above = below + 1
+        if above < len(self._levels):
+            result['resistance'] = self._levels[above]
+            result['resistance_strength'] = self._strengths[above]
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'bars': self.bars,
+            'ready': self.ready,
+            'base_width': self.base_width,
+            'buckets': [len(p.weights) for p in self.profiles],
+            'levels': len(self.levels())
+        }
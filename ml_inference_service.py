@@ -0,0 +1,347 @@
+"""
+ML Inference Service - Inferencia por micro-lotes para AdvancedAIEngine
+=======================================================================
+
+Sustituye las llamadas fila a fila a `predict_proba` por lotes:
+
+  - Los modelos por categoría (MLTradingModel.models o un dict de estimadores
+    con predict_proba) se cargan una sola vez y se calientan con una
+    predicción de prueba.
+  - Las peticiones concurrentes de varios activos se encolan y un hilo
+    despachador las agrupa dentro de una ventana corta (window_ms) o hasta
+    max_batch filas: una sola llamada predict_proba por categoría y lote.
+  - predict_many resuelve de forma síncrona todo un ciclo (analyze_assets)
+    con una llamada por categoría.
+  - Se exportan latencia por petición, tiempo de predict_proba y tamaño de lote.
+
+Las features se construyen desde el dict de indicadores del motor con una
+lista de rutas 'indicador.campo' configurable, que debe coincidir con el
+orden de columnas con que se entrenó el modelo.
+"""
+
+import numpy as np
+import threading
+import queue
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List, Tuple, Any, Optional, Callable
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FEATURE_KEYS = [
+    'rsi.value',
+    'macd.histogram',
+    'bollinger.price_position',
+    'stochastic.k',
+    'adx.value'
+]
+
+DEFAULT_CATEGORY = 'default'
+
+
+def indicator_features(indicators: Dict[str, Any], feature_keys: List[str] = DEFAULT_FEATURE_KEYS) -> np.ndarray:
+    """
+    Vector de features a partir del dict de indicadores del motor.
+
+    Args:
+        indicators: Indicadores ({'rsi': {'value': ..}, ...})
+        feature_keys: Rutas 'indicador.campo' en el orden de entrenamiento
+
+    Returns:
+        Array (n_features,) con NaN donde falta el indicador
+    """
+    values = np.full(len(feature_keys), np.nan)
+    for i, path in enumerate(feature_keys):
+        group, _, field = path.partition('.')
+        value = indicators.get(group)
+        if isinstance(value, dict):
+            value = value.get(field)
+        try:
+            values[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return values
+
+
+class MLInferenceService:
+    """
+    Servicio de inferencia con micro-lotes.
+
+    Características:
+    - Modelos por categoría cargados y calentados una vez
+    - Agrupación de peticiones concurrentes en una ventana corta
+    - Predicción síncrona por lotes para ciclos completos
+    - Métricas de latencia y tamaño de lote
+    """
+
+    def __init__(
+        self,
+        models: Dict[str, Any],
+        category_resolver: Optional[Callable[[str], str]] = None,
+        feature_keys: Optional[List[str]] = None,
+        window_ms: float = 5.0,
+        max_batch: int = 256
+    ):
+        """
+        Inicializa el servicio.
+
+        Args:
+            models: Dict categoría -> estimador con predict_proba
+            category_resolver: Función activo -> categoría (por defecto 'default')
+            feature_keys: Rutas de features (ver indicator_features)
+            window_ms: Ventana de agrupación de peticiones concurrentes
+            max_batch: Filas máximas por lote
+        """
+        self.models = dict(models)
+        self.category_resolver = category_resolver or (lambda asset: DEFAULT_CATEGORY)
+        self.feature_keys = list(feature_keys or DEFAULT_FEATURE_KEYS)
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._queue: "queue.Queue[Optional[Tuple[str, np.ndarray, Future, float]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.stats = {'requests': 0, 'batches': 0, 'rows': 0, 'max_batch_size': 0, 'errors': 0}
+        self.latencies: deque = deque(maxlen=1000)      # s por petición (encolado -> resultado)
+        self.predict_times: deque = deque(maxlen=1000)  # s por llamada a predict_proba
+        self.batch_sizes: deque = deque(maxlen=1000)
+
+    @classmethod
+    def from_trading_model(cls, model: Any, **kwargs) -> 'MLInferenceService':
+        """
+        Crea el servicio desde un MLTradingModel (solo categorías entrenadas).
+
+        Args:
+            model: Objeto con `models`, `is_trained` y `get_category_for_asset`
+            **kwargs: Resto de argumentos del constructor
+        """
+        trained = {
+            category: estimator for category, estimator in model.models.items()
+            if getattr(model, 'is_trained', {}).get(category, True)
+        }
+        resolver = getattr(model, 'get_category_for_asset', None)
+        return cls(trained, category_resolver=resolver, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    def warm_up(self) -> Dict[str, bool]:
+        """
+        Ejecuta una predicción de prueba por modelo (carga perezosa, JIT, caches).
+
+        La prueba usa el vector que construye indicator_features con las
+        feature_keys del servicio: un modelo entrenado con otro número de
+        features fallaría en cada predicción, así que se descarta aquí.
+
+        Returns:
+            Dict categoría -> si el modelo respondió; los que fallan se descartan
+        """
+        status = {}
+        expected = len(indicator_features({}, self.feature_keys))
+        for category, model in list(self.models.items()):
+            n_features = getattr(model, 'n_features_in_', None)
+            if n_features is not None and n_features != expected:
+                logger.error(
+                    f"[ML-INFER] Modelo '{category}' descartado: entrenado con {n_features} features "
+                    f"y feature_keys produce {expected}"
+                )
+                del self.models[category]
+                status[category] = False
+                continue
+            try:
+                model.predict_proba(np.zeros((1, expected)))
+                status[category] = True
+            except Exception as e:
+                logger.warning(f"[ML-INFER] Modelo '{category}' descartado en el calentamiento: {e}")
+                del self.models[category]
+                status[category] = False
+        logger.info(f"[ML-INFER] {sum(status.values())}/{len(status)} modelos listos")
+        return status
+
+    def has_model(self, asset: str) -> bool:
+        return self.category_resolver(asset) in self.models
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._dispatch_loop, name='ml-inference', daemon=True)
+                    self._thread.start()
+
+    def shutdown(self) -> None:
+        """Detiene el hilo despachador (las peticiones pendientes se resuelven antes)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Peticiones
+    # ------------------------------------------------------------------
+
+    def submit(self, asset: str, indicators: Dict[str, Any]) -> Future:
+        """
+        Encola una predicción; se resuelve con P(clase 1) del modelo de su categoría.
+
+        Args:
+            asset: Activo (determina la categoría)
+            indicators: Indicadores del activo
+
+        Returns:
+            Future con la probabilidad
+        """
+        future: Future = Future()
+        category = self.category_resolver(asset)
+        if category not in self.models:
+            future.set_exception(KeyError(f"Sin modelo para la categoría {category}"))
+            return future
+        self._ensure_thread()
+        self._queue.put((category, indicator_features(indicators, self.feature_keys), future, time.perf_counter()))
+        return future
+
+    def predict(self, asset: str, indicators: Dict[str, Any], timeout: float = 1.0) -> float:
+        """Predicción bloqueante de un activo (agrupada con las concurrentes)."""
+        return self.submit(asset, indicators).result(timeout=timeout)
+
+    def predict_many(self, requests: List[Tuple[str, Dict[str, Any]]]) -> List[Optional[float]]:
+        """
+        Predice un ciclo completo de forma síncrona: una llamada por categoría.
+
+        Args:
+            requests: Lista de (activo, indicadores)
+
+        Returns:
+            Probabilidad por petición (None si no hay modelo o falla)
+        """
+        start = time.perf_counter()
+        groups: Dict[str, List[int]] = {}
+        for i, (asset, _) in enumerate(requests):
+            category = self.category_resolver(asset)
+            if category in self.models:
+                groups.setdefault(category, []).append(i)
+
+        results: List[Optional[float]] = [None] * len(requests)
+        for category, positions in groups.items():
+            features = np.vstack([indicator_features(requests[i][1], self.feature_keys) for i in positions])
+            try:
+                probabilities = self._predict(category, features)
+            except Exception as e:
+                logger.debug(f"[ML-INFER] Error en predict_proba ({category}): {e}")
+                continue
+            for i, p in zip(positions, probabilities):
+                results[i] = float(p)
+
+        elapsed = time.perf_counter() - start
+        self.stats['requests'] += len(requests)
+        self.latencies.extend([elapsed] * len(requests))
+        return results
+
+    def _predict(self, category: str, features: np.ndarray) -> np.ndarray:
+        """Una llamada predict_proba sobre un lote; registra métricas."""
+        start = time.perf_counter()
+        try:
+            proba = self.models[category].predict_proba(np.nan_to_num(features, nan=0.0))
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+        self.predict_times.append(time.perf_counter() - start)
+        size = len(features)
+        self.batch_sizes.append(size)
+        self.stats['batches'] += 1
+        self.stats['rows'] += size
+        self.stats['max_batch_size'] = max(self.stats['max_batch_size'], size)
+        proba = np.asarray(proba)
+        return proba[:, 1] if proba.ndim == 2 and proba.shape[1] > 1 else proba.ravel()
+
+    def _dispatch_loop(self) -> None:
+        """Hilo despachador: agrupa peticiones durante `window` y las resuelve por categoría."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.window
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._resolve(batch)
+            if stop:
+                return
+
+    def _resolve(self, batch: List[Tuple[str, np.ndarray, Future, float]]) -> None:
+        groups: Dict[str, List[Tuple[np.ndarray, Future, float]]] = {}
+        for category, features, future, queued_at in batch:
+            groups.setdefault(category, []).append((features, future, queued_at))
+        for category, items in groups.items():
+            try:
+                probabilities = self._predict(category, np.vstack([f for f, _, _ in items]))
+            except Exception as e:
+                for _, future, _ in items:
+                    future.set_exception(e)
+                continue
+            now = time.perf_counter()
+            for (_, future, queued_at), p in zip(items, probabilities):
+                self.latencies.append(now - queued_at)
+                future.set_result(float(p))
+            self.stats['requests'] += len(items)
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Latencias (ms), tiempo de predict_proba y tamaño de lote."""
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        predict_times = np.array(self.predict_times) * 1000 if self.predict_times else np.zeros(1)
+        return {
+            **self.stats,
+            'models': sorted(self.models),
+            'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            'latency_ms_p50': float(np.percentile(latencies, 50)),
+            'latency_ms_p95': float(np.percentile(latencies, 95)),
+            'predict_ms_mean': float(np.mean(predict_times))
+        }
+
+
+def load_inference_service(config: Dict[str, Any]) -> Optional[MLInferenceService]:
+    """
+    Crea el servicio desde el MLTradingModel del bot si está disponible.
+
+    Usa config['ai_engine']['ml_inference'] (window_ms, max_batch, feature_keys).
+
+    Returns:
+        Servicio calentado o None si el modelo no está disponible
+    """
+    settings = config.get('ai_engine', {}).get('ml_inference', {})
+    try:
+        from ml_model import MLTradingModel
+    except ImportError:
+        logger.warning("[ML-INFER] ml_model no disponible; se mantiene el score proxy")
+        return None
+    try:
+        model = MLTradingModel(config)
+        service = MLInferenceService.from_trading_model(
+            model,
+            feature_keys=settings.get('feature_keys'),
+            window_ms=settings.get('window_ms', 5.0),
+            max_batch=settings.get('max_batch', 256)
+        )
+    except Exception as e:
+        logger.warning(f"[ML-INFER] No se pudo cargar el modelo ML: {e}")
+        return None
+    service.warm_up()
+    return service if service.models else None
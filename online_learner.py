@@ -0,0 +1,347 @@
+"""
+Online Learner - Actualización incremental del modelo ML con resultados reales
+==============================================================================
+
+Aprendizaje en línea a partir de los resultados de las señales, sin
+reentrenar sobre toda la base de datos:
+
+  - Al emitir una señal se guarda su vector de features (mismas rutas de
+    indicadores que el servicio de inferencia).
+  - Al liquidarse, el resultado se encola sin bloquear el bucle de trading;
+    un hilo en segundo plano aplica un paso SGD de regresión logística al
+    modelo en línea de la categoría y guarda la muestra en un buffer de
+    repetición acotado.
+  - Periódicamente se consolida: el modelo se repasa con el buffer completo
+    (varias épocas en mini-lotes) y se publica en el dict de modelos del
+    servicio de inferencia. Si el modelo servido de la categoría admite
+    partial_fit (p. ej. SGDClassifier) se actualiza una copia de ese modelo;
+    los modelos entrenados offline sin partial_fit no se sustituyen.
+
+Etiqueta: 1 si el precio se movió al alza (CALL ganada o PUT perdida), igual
+que el score ML del motor (> 0.5 alcista). Los empates se ignoran.
+"""
+
+import numpy as np
+import threading
+import queue
+import time
+import copy
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Callable
+import logging
+
+from ml_inference_service import indicator_features, DEFAULT_FEATURE_KEYS, DEFAULT_CATEGORY
+
+logger = logging.getLogger(__name__)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class OnlineLogisticModel:
+    """
+    Regresión logística entrenada por SGD con estandarización en línea.
+
+    Compatible con el servicio de inferencia (predict_proba, n_features_in_)
+    y con la interfaz partial_fit de scikit-learn.
+    """
+
+    def __init__(self, n_features: int, learning_rate: float = 0.05, l2: float = 1e-4):
+        """
+        Inicializa el modelo.
+
+        Args:
+            n_features: Número de features
+            learning_rate: Paso de SGD
+            l2: Regularización L2 de los coeficientes
+        """
+        self.n_features_in_ = n_features
+        self.classes_ = np.array([0, 1])
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.coef = np.zeros(n_features)
+        self.intercept = 0.0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.count = 0
+        self.updates = 0
+
+    def _observe(self, X: np.ndarray) -> None:
+        """Actualiza media y varianza de las features (fórmula de Chan por bloques)."""
+        n = len(X)
+        batch_mean = X.mean(axis=0)
+        delta = batch_mean - self.mean
+        total = self.count + n
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + ((X - batch_mean) ** 2).sum(axis=0) + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def _scale(self, X: np.ndarray) -> np.ndarray:
+        std = np.sqrt(self.m2 / self.count) if self.count else np.ones(self.n_features_in_)
+        return (X - self.mean) / np.where(std > 1e-12, std, 1.0)
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray, classes: Any = None, observe: bool = True) -> 'OnlineLogisticModel':
+        """
+        Un paso de SGD sobre un mini-lote.
+
+        Args:
+            X: Features (n x n_features)
+            y: Etiquetas 0/1
+            classes: Ignorado (compatibilidad con scikit-learn)
+            observe: Actualizar la estandarización con este lote
+
+        Returns:
+            El propio modelo
+        """
+        X = np.nan_to_num(np.atleast_2d(np.asarray(X, dtype=float)), nan=0.0)
+        y = np.asarray(y, dtype=float).ravel()
+        if observe:
+            self._observe(X)
+        Z = self._scale(X)
+        error = _sigmoid(Z @ self.coef + self.intercept) - y
+        self.coef -= self.learning_rate * (Z.T @ error / len(y) + self.l2 * self.coef)
+        self.intercept -= self.learning_rate * float(error.mean())
+        self.updates += 1
+        return self
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.nan_to_num(np.atleast_2d(np.asarray(X, dtype=float)), nan=0.0)
+        p = _sigmoid(self._scale(X) @ self.coef + self.intercept)
+        return np.column_stack([1 - p, p])
+
+
+class ReplayBuffer:
+    """Buffer circular de muestras (features, etiqueta) para la consolidación."""
+
+    def __init__(self, capacity: int, n_features: int):
+        self.capacity = capacity
+        self.X = np.zeros((capacity, n_features))
+        self.y = np.zeros(capacity)
+        self.size = 0
+        self.position = 0
+
+    def add(self, x: np.ndarray, label: float) -> None:
+        self.X[self.position] = x
+        self.y[self.position] = label
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class OnlineLearner:
+    """
+    Aprendizaje en línea por categoría con consolidación periódica.
+
+    Características:
+    - Registro de resultados O(1) y sin bloqueo (cola + hilo en segundo plano)
+    - Paso SGD inmediato por resultado
+    - Buffer de repetición acotado por categoría
+    - Publicación del modelo consolidado en el dict de modelos servidos
+    """
+
+    def __init__(
+        self,
+        models: Optional[Dict[str, Any]] = None,
+        feature_keys: Optional[List[str]] = None,
+        category_resolver: Optional[Callable[[str], str]] = None,
+        buffer_size: int = 5000,
+        consolidate_every_s: float = 120.0,
+        consolidation_epochs: int = 3,
+        batch_size: int = 64,
+        learning_rate: float = 0.05,
+        l2: float = 1e-4,
+        min_samples: int = 50,
+        max_pending: int = 5000
+    ):
+        """
+        Inicializa el learner.
+
+        Args:
+            models: Dict categoría -> modelo servido (p. ej. MLInferenceService.models);
+                    la consolidación publica aquí
+            feature_keys: Rutas de features (deben coincidir con el servicio)
+            category_resolver: Función activo -> categoría
+            buffer_size: Muestras del buffer de repetición por categoría
+            consolidate_every_s: Intervalo de consolidación
+            consolidation_epochs: Épocas sobre el buffer en cada consolidación
+            batch_size: Tamaño de mini-lote de la consolidación
+            learning_rate: Paso de SGD del modelo en línea
+            l2: Regularización L2
+            min_samples: Muestras mínimas para publicar un modelo
+            max_pending: Señales emitidas cuyas features se conservan a la espera de resultado
+        """
+        self.models = models if models is not None else {}
+        self.feature_keys = list(feature_keys or DEFAULT_FEATURE_KEYS)
+        self.category_resolver = category_resolver or (lambda asset: DEFAULT_CATEGORY)
+        self.buffer_size = buffer_size
+        self.consolidate_every = consolidate_every_s
+        self.consolidation_epochs = consolidation_epochs
+        self.batch_size = batch_size
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.min_samples = min_samples
+        self.max_pending = max_pending
+
+        self.online_models: Dict[str, OnlineLogisticModel] = {}
+        self.buffers: Dict[str, ReplayBuffer] = {}
+        self._features: "OrderedDict[int, tuple]" = OrderedDict()
+        self._features_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._rng = np.random.default_rng()
+        # Último modelo publicado por categoría: (versión, modelo), para réplicas en otros procesos
+        self.published: Dict[str, tuple] = {}
+
+        self.stats = {'remembered': 0, 'outcomes': 0, 'updates': 0, 'dropped': 0, 'consolidations': 0, 'published': 0}
+
+    # ------------------------------------------------------------------
+    # Bucle de trading (no bloqueante)
+    # ------------------------------------------------------------------
+
+    def remember(self, signal_id: int, asset: str, direction: str, indicators: Dict[str, Any]) -> None:
+        """
+        Guarda las features de una señal emitida hasta que llegue su resultado.
+
+        Args:
+            signal_id: Id del journal
+            asset: Activo
+            direction: 'CALL' o 'PUT'
+            indicators: Indicadores usados al emitir la señal
+        """
+        entry = (asset, direction, indicator_features(indicators, self.feature_keys))
+        with self._features_lock:
+            self._features[signal_id] = entry
+            while len(self._features) > self.max_pending:
+                self._features.popitem(last=False)
+        self.stats['remembered'] += 1
+
+    def record_outcome(self, signal_id: int, result: str) -> bool:
+        """
+        Encola el resultado de una señal para el hilo de aprendizaje.
+
+        Args:
+            signal_id: Id del journal
+            result: 'win', 'loss' o 'draw'
+
+        Returns:
+            False si no había features de la señal, era empate o la cola estaba llena
+        """
+        with self._features_lock:
+            entry = self._features.pop(signal_id, None)
+        if entry is None or result not in ('win', 'loss'):
+            return False
+        asset, direction, features = entry
+        label = 1.0 if (direction == 'CALL') == (result == 'win') else 0.0
+        try:
+            self._queue.put_nowait((self.category_resolver(asset), features, label))
+        except queue.Full:
+            self.stats['dropped'] += 1
+            return False
+        self.stats['outcomes'] += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Hilo de aprendizaje
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Arranca el hilo de aprendizaje en segundo plano."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name='online-learner', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Procesa lo encolado, consolida y detiene el hilo."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+        self._thread = None
+
+    def _loop(self) -> None:
+        next_consolidation = time.monotonic() + self.consolidate_every
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_consolidation - time.monotonic()))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                self.consolidate()
+                return
+            if item:
+                try:
+                    self.learn(*item)
+                except Exception as e:
+                    logger.warning(f"[ONLINE-ML] Error en actualización: {e}")
+            if time.monotonic() >= next_consolidation:
+                try:
+                    self.consolidate()
+                except Exception as e:
+                    logger.warning(f"[ONLINE-ML] Error en consolidación: {e}")
+                next_consolidation = time.monotonic() + self.consolidate_every
+
+    def learn(self, category: str, features: np.ndarray, label: float) -> None:
+        """Paso SGD del modelo en línea y alta en el buffer de repetición."""
+        model = self.online_models.get(category)
+        if model is None:
+            model = self.online_models[category] = OnlineLogisticModel(len(self.feature_keys), self.learning_rate, self.l2)
+            self.buffers[category] = ReplayBuffer(self.buffer_size, len(self.feature_keys))
+        model.partial_fit(features[None, :], [label])
+        self.buffers[category].add(np.nan_to_num(features, nan=0.0), label)
+        self.stats['updates'] += 1
+
+    def consolidate(self) -> List[str]:
+        """
+        Repasa el buffer de cada categoría y publica el modelo resultante.
+
+        Returns:
+            Categorías publicadas
+        """
+        published = []
+        for category, buffer in self.buffers.items():
+            if len(buffer) < self.min_samples:
+                continue
+            served = self.models.get(category)
+            if served is not None and not isinstance(served, OnlineLogisticModel):
+                if not hasattr(served, 'partial_fit'):
+                    continue  # Modelo offline sin actualización incremental: no se sustituye
+                candidate = copy.deepcopy(served)
+            else:
+                candidate = copy.deepcopy(self.online_models[category])
+
+            X, y = buffer.X[:len(buffer)], buffer.y[:len(buffer)]
+            try:
+                for _ in range(self.consolidation_epochs):
+                    order = self._rng.permutation(len(y))
+                    for start in range(0, len(order), self.batch_size):
+                        rows = order[start:start + self.batch_size]
+                        if isinstance(candidate, OnlineLogisticModel):
+                            candidate.partial_fit(X[rows], y[rows], observe=False)
+                        else:
+                            candidate.partial_fit(X[rows], y[rows], classes=np.array([0, 1]))
+            except Exception as e:
+                logger.warning(f"[ONLINE-ML] Consolidación de '{category}' descartada: {e}")
+                continue
+
+            # Sustitución atómica en el dict servido
+            self.models[category] = candidate
+            self.published[category] = (self.stats['published'] + len(published) + 1, candidate)
+            if isinstance(candidate, OnlineLogisticModel):
+                self.online_models[category] = copy.deepcopy(candidate)
+            published.append(category)
+
+        self.stats['consolidations'] += 1
+        self.stats['published'] += len(published)
+        if published:
+            logger.info(f"[ONLINE-ML] Modelos consolidados: {', '.join(published)}")
+        return published
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'pending_features': len(self._features),
+            'queued': self._queue.qsize(),
+            'buffers': {category: len(buffer) for category, buffer in self.buffers.items()}
+        }
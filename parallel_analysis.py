@@ -0,0 +1,368 @@
+"""
+Parallel Analysis - Análisis de watchlists grandes en varios procesos
+=====================================================================
+
+Reparte el análisis de AdvancedAIEngine entre procesos worker:
+
+  - Las velas de todos los activos se copian una sola vez a bloques de
+    memoria compartida (multiprocessing.shared_memory): OHLCV en float64 y
+    el índice temporal en int64; los workers leen sus filas sin recibir
+    DataFrames serializados.
+  - Cada worker mantiene su propio AdvancedAIEngine (creado una vez en el
+    inicializador del proceso) y analiza su lote con analyze_assets.
+  - Cada activo queda asignado a un worker fijo (un executor de un solo
+    proceso por worker): su estado incremental (StreamingFeatureState con
+    niveles y pivotes, HarmonicDetector, caches) vive siempre en el mismo
+    proceso y evoluciona igual que en el análisis por lotes en proceso.
+  - El estado por activo que produce el worker (histórico de sentimiento y
+    volatilidad, patrones armónicos, señales) se fusiona en el motor padre.
+  - Los modelos que publica el aprendizaje en línea del padre se envían a
+    cada worker con su siguiente lote, antes de analizarlo.
+
+Es opcional: se activa con AdvancedAIEngine.enable_parallel() o con
+config['ai_engine']['parallel_workers'] > 0.
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, Future
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple, Any, Optional
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Columnas del bloque compartido de precios (una fila por vela)
+SHARED_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# Tipo de índice de cada activo, para reconstruir el DataFrame en el worker
+INDEX_RANGE = 0
+INDEX_NUMERIC = 1
+INDEX_DATETIME = 2
+INDEX_FLOAT = 3  # bits del float64 guardados en el bloque int64
+
+# Motor del proceso worker (uno por proceso)
+_WORKER_ENGINE = None
+
+
+def _init_worker(config: Dict[str, Any]) -> None:
+    """Inicializador del proceso worker: crea el motor local una sola vez."""
+    global _WORKER_ENGINE
+    from advanced_ai_engine import AdvancedAIEngine
+    worker_config = dict(config)
+    # El journal (y su fichero de desbordamiento) es del motor padre, que registra las señales en _finalize_signals
+    worker_config['ai_engine'] = {
+        **config.get('ai_engine', {}),
+        'parallel_workers': 0, 'online_learning': {}, 'analog_search': {}, 'journal_spill_path': None
+    }
+    _WORKER_ENGINE = AdvancedAIEngine(worker_config)
+    _WORKER_ENGINE.record_signals = False
+    logging.getLogger('advanced_ai_engine').setLevel(logging.WARNING)
+
+
+def _install_models(engine, models: Dict[str, Any]) -> None:
+    """Instala en el servicio de inferencia del worker los modelos publicados en el padre."""
+    if engine.ml_service is None:
+        from ml_inference_service import MLInferenceService
+        inference_config = engine.config.get('ai_engine', {}).get('ml_inference', {})
+        engine.ml_service = MLInferenceService(
+            {},
+            feature_keys=inference_config.get('feature_keys'),
+            window_ms=inference_config.get('window_ms', 5.0),
+            max_batch=inference_config.get('max_batch', 256)
+        )
+    engine.ml_service.models.update(models)
+
+
+class SharedFrames:
+    """Velas de varios activos en memoria compartida (precios float64 + índice int64)."""
+
+    def __init__(self, frames: Dict[str, pd.DataFrame]):
+        total = max(sum(len(df) for df in frames.values()), 1)
+        self.shape = (total, len(SHARED_COLUMNS))
+        self.price_block = shared_memory.SharedMemory(create=True, size=total * len(SHARED_COLUMNS) * 8)
+        self.index_block = shared_memory.SharedMemory(create=True, size=total * 8)
+        prices = np.ndarray(self.shape, dtype=np.float64, buffer=self.price_block.buf)
+        index_values = np.ndarray((total,), dtype=np.int64, buffer=self.index_block.buf)
+
+        self.meta: List[Dict[str, Any]] = []
+        offset = 0
+        for asset, df in frames.items():
+            n = len(df)
+            index = df.index
+            tz = None
+            unit = 'ns'
+            if isinstance(index, pd.RangeIndex) and index.step == 1:
+                kind = INDEX_RANGE
+                index_values[offset:offset + n] = np.arange(index.start, index.stop, dtype=np.int64)
+            elif isinstance(index, pd.DatetimeIndex):
+                kind = INDEX_DATETIME
+                tz = str(index.tz) if index.tz is not None else None
+                unit = getattr(index, 'unit', 'ns')  # asi8 va en la resolución del índice
+                index_values[offset:offset + n] = index.asi8
+            elif pd.api.types.is_integer_dtype(index.dtype):
+                kind = INDEX_NUMERIC
+                index_values[offset:offset + n] = index.to_numpy(dtype=np.int64)
+            elif pd.api.types.is_float_dtype(index.dtype):
+                kind = INDEX_FLOAT
+                index_values[offset:offset + n] = index.to_numpy(dtype=np.float64).view(np.int64)
+            else:
+                self.release()
+                raise ValueError(f"Índice no soportado en memoria compartida para {asset}: {index.dtype}")
+            rows = prices[offset:offset + n]
+            for col_idx, col in enumerate(SHARED_COLUMNS):
+                rows[:, col_idx] = df[col].to_numpy(dtype=np.float64) if col in df.columns else np.nan
+            self.meta.append({
+                'asset': asset,
+                'offset': offset,
+                'length': n,
+                'has_volume': 'volume' in df.columns,
+                'index_kind': kind,
+                'tz': tz,
+                'unit': unit
+            })
+            offset += n
+        del prices, index_values
+
+    @property
+    def nbytes(self) -> int:
+        return self.price_block.size + self.index_block.size
+
+    @property
+    def handle(self) -> Tuple[str, str, Tuple[int, int]]:
+        """Datos mínimos para que un worker se conecte a los bloques."""
+        return self.price_block.name, self.index_block.name, self.shape
+
+    def release(self) -> None:
+        for block in (self.price_block, self.index_block):
+            block.close()
+            block.unlink()
+
+
+def read_shared_frames(handle: Tuple[str, str, Tuple[int, int]], entries: List[Dict[str, Any]]) -> Dict[str, pd.DataFrame]:
+    """Reconstruye (copiando sus filas) los DataFrames de los activos indicados."""
+    price_name, index_name, shape = handle
+    price_block = shared_memory.SharedMemory(name=price_name)
+    index_block = shared_memory.SharedMemory(name=index_name)
+    try:
+        prices = np.ndarray(shape, dtype=np.float64, buffer=price_block.buf)
+        index_values = np.ndarray((shape[0],), dtype=np.int64, buffer=index_block.buf)
+        frames = {}
+        for entry in entries:
+            start, end = entry['offset'], entry['offset'] + entry['length']
+            rows = np.array(prices[start:end])
+            raw_index = np.array(index_values[start:end])
+            kind = entry['index_kind']
+            if kind == INDEX_DATETIME:
+                index = pd.DatetimeIndex(raw_index.view(f"datetime64[{entry['unit']}]"))
+                if entry['tz']:
+                    index = index.tz_localize('UTC').tz_convert(entry['tz'])
+            elif kind == INDEX_RANGE and len(raw_index):
+                index = pd.RangeIndex(int(raw_index[0]), int(raw_index[0]) + len(raw_index))
+            elif kind == INDEX_FLOAT:
+                index = pd.Index(raw_index.view(np.float64))
+            else:
+                index = pd.Index(raw_index)
+            columns = list(SHARED_COLUMNS) if entry['has_volume'] else list(SHARED_COLUMNS[:4])
+            frames[entry['asset']] = pd.DataFrame(rows[:, :len(columns)], index=index, columns=columns)
+        del prices, index_values
+    finally:
+        price_block.close()
+        index_block.close()
+    return frames
+
+
+def _analyze_chunk(
+    handle: Tuple[str, str, Tuple[int, int]],
+    entries: List[Dict[str, Any]],
+    indicators: Dict[str, Dict[str, Any]],
+    account_balance: float,
+    recent_win_rate: float,
+    models: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Tarea del worker: analiza un lote de activos leyendo las velas de memoria compartida."""
+    engine = _WORKER_ENGINE
+    if models:
+        _install_models(engine, models)
+    frames = read_shared_frames(handle, entries)
+
+    # El worker solo devuelve lo producido en esta tarea
+    sentiment = engine.sentiment_analyzer
+    for asset in frames:
+        sentiment.sentiment_history.pop(asset, None)
+        sentiment.volatility_history.pop(asset, None)
+
+    signals = engine.analyze_assets(frames, indicators, account_balance, recent_win_rate)
+    return {
+        'signals': signals,
+        'sentiment_history': {a: list(sentiment.sentiment_history.get(a, ())) for a in frames},
+        'volatility_history': {a: list(sentiment.volatility_history.get(a, ())) for a in frames},
+        'harmonic_matches': {a: engine.pattern_recognizer.harmonic_matches.get(a) for a in frames},
+        'pid': os.getpid()
+    }
+
+
+class ParallelAnalysisExecutor:
+    """
+    Ejecuta AdvancedAIEngine.analyze_assets repartido en procesos.
+
+    Características:
+    - Workers persistentes (los motores se reutilizan entre llamadas)
+    - Asignación estable activo -> worker (el estado por activo no cambia de proceso)
+    - Velas en memoria compartida, liberada al terminar cada llamada
+    - Fusión del estado por activo en el motor padre
+    """
+
+    def __init__(self, engine, max_workers: Optional[int] = None, min_assets: int = 8):
+        """
+        Inicializa el executor.
+
+        Args:
+            engine: AdvancedAIEngine padre (recibe el estado fusionado)
+            max_workers: Procesos del pool (por defecto núcleos - 1)
+            min_assets: Con menos activos se analiza en el proceso actual
+        """
+        self.engine = engine
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.min_assets = min_assets
+        self._pools: List[Optional[ProcessPoolExecutor]] = [None] * self.max_workers
+        self.assignment: Dict[str, int] = {}
+        self._load = [0] * self.max_workers
+        self._model_versions: List[Dict[str, int]] = [{} for _ in range(self.max_workers)]
+        self.stats = {'parallel_runs': 0, 'local_runs': 0, 'assets': 0, 'bytes_shared': 0}
+
+    def _get_pool(self, worker: int) -> ProcessPoolExecutor:
+        """Executor de un solo proceso del worker (se crea la primera vez)."""
+        pool = self._pools[worker]
+        if pool is None:
+            pool = self._pools[worker] = ProcessPoolExecutor(
+                max_workers=1,
+                initializer=_init_worker,
+                initargs=(self.engine.config,)
+            )
+            if worker == 0:
+                logger.info(f"[PARALLEL] Pool de análisis iniciado con {self.max_workers} procesos")
+        return pool
+
+    def _models_for(self, worker: int) -> Optional[Dict[str, Any]]:
+        """Modelos publicados por el aprendizaje en línea que el worker aún no tiene."""
+        learner = self.engine.online_learner
+        if learner is None:
+            return None
+        sent = self._model_versions[worker]
+        models = {}
+        for category, (version, model) in list(learner.published.items()):
+            if sent.get(category) != version:
+                models[category] = model
+                sent[category] = version
+        return models or None
+
+    def _worker_for(self, asset: str) -> int:
+        """Worker fijo del activo; los activos nuevos van al worker con menos activos."""
+        worker = self.assignment.get(asset)
+        if worker is None:
+            worker = min(range(self.max_workers), key=lambda w: self._load[w])
+            self.assignment[asset] = worker
+            self._load[worker] += 1
+        return worker
+
+    def analyze_assets(
+        self,
+        frames: Dict[str, pd.DataFrame],
+        indicators: Dict[str, Dict[str, Any]],
+        account_balance: float = 1000.0,
+        recent_win_rate: float = 0.50
+    ) -> Dict[str, Any]:
+        """
+        Analiza los activos en paralelo (o localmente si son pocos).
+
+        Returns:
+            AISignal o None por activo
+        """
+        valid = {a: df for a, df in frames.items() if df is not None and not df.empty}
+        if len(valid) < self.min_assets or self.max_workers < 2:
+            self.stats['local_runs'] += 1
+            return self.engine.analyze_assets(frames, indicators, account_balance, recent_win_rate, parallel=False)
+
+        # Las correlaciones entre activos y el índice de análogos se mantienen en el motor padre
+        for asset, df in valid.items():
+            self.engine._sync_correlation(asset, df)
+            self.engine._sync_analogs(asset, df)
+        
+        try:
+            shared = SharedFrames(valid)
+        except ValueError as e:
+            logger.warning(f"[PARALLEL] {e}; análisis local")
+            self.stats['local_runs'] += 1
+            return self.engine.analyze_assets(frames, indicators, account_balance, recent_win_rate, parallel=False)
+        self.stats['bytes_shared'] += shared.nbytes
+        try:
+            chunks: List[List[Dict[str, Any]]] = [[] for _ in range(self.max_workers)]
+            for entry in shared.meta:
+                chunks[self._worker_for(entry['asset'])].append(entry)
+            futures: List[Future] = [
+                self._get_pool(worker).submit(
+                    _analyze_chunk, shared.handle, chunk,
+                    {e['asset']: indicators.get(e['asset'], {}) for e in chunk},
+                    account_balance, recent_win_rate, self._models_for(worker)
+                )
+                for worker, chunk in enumerate(chunks) if chunk
+            ]
+            results: Dict[str, Any] = {a: None for a in frames}
+            for future in futures:
+                self._merge(future.result(), results)
+            self._finalize_signals(results, indicators, valid)
+        finally:
+            shared.release()
+
+        self.stats['parallel_runs'] += 1
+        self.stats['assets'] += len(valid)
+        return results
+
+    def _merge(self, output: Dict[str, Any], results: Dict[str, Any]) -> None:
+        """Fusiona en el motor padre el estado producido por un worker."""
+        engine = self.engine
+        sentiment = engine.sentiment_analyzer
+        for asset, values in output['sentiment_history'].items():
+            sentiment.sentiment_history[asset].extend(values)
+        for asset, values in output['volatility_history'].items():
+            sentiment.volatility_history[asset].extend(values)
+        engine.pattern_recognizer.harmonic_matches.update(output['harmonic_matches'])
+        results.update(output['signals'])
+
+    def _finalize_signals(
+        self,
+        results: Dict[str, Any],
+        indicators: Dict[str, Dict[str, Any]],
+        frames: Dict[str, pd.DataFrame]
+    ) -> None:
+        """
+        Completa las señales con el estado del motor padre, en el orden de `frames`.
+
+        Correlación, análogos e id del journal se calculan aquí; registrar en el
+        orden de entrada (no en el de llegada de los workers) da los mismos ids
+        que el análisis por lotes en proceso.
+        """
+        engine = self.engine
+        for asset in frames:
+            signal = results.get(asset)
+            if signal is None:
+                continue
+            signal.correlation_analysis = engine._correlation_analysis(asset, signal.direction)
+            analogs = engine._find_analogs(asset, frames[asset])
+            if analogs:
+                signal.additional_context['analogs'] = analogs
+            engine._record_signal(signal, indicators.get(asset, {}))
+
+    def shutdown(self) -> None:
+        """Detiene los procesos worker (su estado por activo se descarta)."""
+        if any(pool is not None for pool in self._pools):
+            for pool in self._pools:
+                if pool is not None:
+                    pool.shutdown(wait=True)
+            self._pools = [None] * self.max_workers
+            logger.info("[PARALLEL] Pool de análisis detenido")
+        self.assignment.clear()
+        self._load = [0] * self.max_workers
+        self._model_versions = [{} for _ in range(self.max_workers)]
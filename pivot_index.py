@@ -0,0 +1,286 @@
+"""
+Pivot Index - Pivotes compartidos y divergencias precio/indicador
+=================================================================
+
+Un único índice de pivotes por activo, actualizado en O(1) amortizado por vela
+cerrada, del que leen todos los análisis basados en pivotes:
+
+  - PivotIndex: pivotes confirmados (máximo/mínimo de ±window velas) de varias
+    series alineadas por índice de vela: precio (máximos sobre el alto, mínimos
+    sobre el bajo), RSI e histograma MACD.
+  - DivergenceEngine: empareja cada pivote de precio con el pivote del
+    indicador a menos de `match_tolerance` velas y lo compara con el pivote
+    anterior del mismo tipo. Solo se evalúa cuando se confirma un pivote nuevo,
+    O(pivotes nuevos) por vela.
+
+Divergencias:
+  - Regular alcista: precio mínimo más bajo, indicador mínimo más alto
+  - Regular bajista: precio máximo más alto, indicador máximo más bajo
+  - Oculta alcista: precio mínimo más alto, indicador mínimo más bajo
+  - Oculta bajista: precio máximo más bajo, indicador máximo más alto
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional, Any, Iterable
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+HIGH = 'high'
+LOW = 'low'
+PRICE = 'price'
+
+DEFAULT_INDICATORS = ('rsi', 'macd_histogram')
+
+
+@dataclass
+class Pivot:
+    """Pivote confirmado de una serie."""
+    series: str
+    kind: str  # HIGH o LOW
+    index: int  # Índice absoluto de la vela
+    time: Any
+    value: float
+
+
+class _WindowExtreme:
+    """Máximo o mínimo de una ventana deslizante por índice (empates: gana el más reciente)."""
+
+    def __init__(self, size: int, is_max: bool):
+        self.size = size
+        self.is_max = is_max
+        self.items: deque = deque()  # (index, value)
+
+    def push(self, index: int, value: float) -> None:
+        items = self.items
+        if self.is_max:
+            while items and items[-1][1] <= value:
+                items.pop()
+        else:
+            while items and items[-1][1] >= value:
+                items.pop()
+        items.append((index, value))
+        while items[0][0] <= index - self.size:
+            items.popleft()
+
+    def front(self) -> Optional[Tuple[int, float]]:
+        return self.items[0] if self.items else None
+
+
+class PivotIndex:
+    """
+    Pivotes confirmados de varias series de un activo.
+
+    Características:
+    - Un pivote se confirma `window` velas después (extremo de ±window velas)
+    - Series registrables; los valores NaN (indicador sin calentar) se omiten
+    - Historial acotado de pivotes por (serie, tipo)
+    """
+
+    def __init__(self, window: int = 5, max_pivots: int = 100, series: Iterable[str] = (PRICE,)):
+        """
+        Inicializa el índice.
+
+        Args:
+            window: Velas a cada lado para confirmar un pivote
+            max_pivots: Pivotes guardados por serie y tipo
+            series: Series iniciales
+        """
+        self.window = window
+        self.max_pivots = max_pivots
+        self._times: deque = deque(maxlen=2 * window + 1)
+        self._extremes: Dict[Tuple[str, str], _WindowExtreme] = {}
+        self.pivots: Dict[Tuple[str, str], deque] = {}
+        for name in series:
+            self.add_series(name)
+
+    def add_series(self, name: str) -> None:
+        """Registra una serie (máximos y mínimos)."""
+        span = 2 * self.window + 1
+        for kind in (HIGH, LOW):
+            if (name, kind) not in self._extremes:
+                self._extremes[(name, kind)] = _WindowExtreme(span, kind == HIGH)
+                self.pivots[(name, kind)] = deque(maxlen=self.max_pivots)
+
+    def push(self, index: int, time: Any, values: Dict[str, Tuple[float, float]]) -> List[Pivot]:
+        """
+        Agrega una vela cerrada.
+
+        Args:
+            index: Índice absoluto de la vela (creciente de uno en uno)
+            time: Hora de la vela
+            values: serie -> (valor para máximos, valor para mínimos); p. ej. el
+                    precio usa (alto, bajo) y un indicador (valor, valor)
+
+        Returns:
+            Pivotes confirmados con esta vela (de la vela index - window)
+        """
+        self._times.append(time)
+        for name, (high_value, low_value) in values.items():
+            if not math.isnan(high_value):
+                self._extremes[(name, HIGH)].push(index, high_value)
+            if not math.isnan(low_value):
+                self._extremes[(name, LOW)].push(index, low_value)
+
+        center = index - self.window
+        if center < self.window:
+            return []
+        center_time = self._times[self.window]
+        confirmed = []
+        for (name, kind), extreme in self._extremes.items():
+            front = extreme.front()
+            if front and front[0] == center:
+                pivot = Pivot(name, kind, center, center_time, float(front[1]))
+                self.pivots[(name, kind)].append(pivot)
+                confirmed.append(pivot)
+        return confirmed
+
+    def get(self, series: str, kind: str) -> deque:
+        """Pivotes confirmados de una serie y tipo (del más antiguo al más reciente)."""
+        return self.pivots.get((series, kind), deque())
+
+
+class DivergenceEngine:
+    """
+    Divergencias regulares y ocultas entre precio e indicadores sobre pivotes compartidos.
+
+    Características:
+    - Emparejado de pivotes de precio e indicador con tolerancia en velas
+    - Evaluación solo al confirmarse un pivote (O(pivotes nuevos) por vela)
+    - Historial de divergencias con su antigüedad en velas
+    """
+
+    def __init__(
+        self,
+        pivots: PivotIndex,
+        indicators: Iterable[str] = DEFAULT_INDICATORS,
+        match_tolerance: int = 3,
+        min_span: int = 5,
+        max_span: int = 60,
+        max_age: int = 10,
+        max_history: int = 50
+    ):
+        """
+        Inicializa el motor de divergencias.
+
+        Args:
+            pivots: Índice de pivotes del activo
+            indicators: Series de indicador a comparar con el precio
+            match_tolerance: Distancia máxima en velas entre pivote de precio y de indicador
+            min_span: Separación mínima en velas entre los dos pivotes comparados
+            max_span: Separación máxima en velas entre los dos pivotes comparados
+            max_age: Velas desde el último pivote durante las que una divergencia sigue activa
+            max_history: Divergencias guardadas
+        """
+        self.pivots = pivots
+        self.indicators = tuple(indicators)
+        self.match_tolerance = match_tolerance
+        self.min_span = min_span
+        self.max_span = max_span
+        self.max_age = max_age
+        self.history: deque = deque(maxlen=max_history)
+        self._seen: set = set()
+
+    def on_pivots(self, confirmed: List[Pivot]) -> List[Dict[str, Any]]:
+        """
+        Evalúa los pivotes recién confirmados.
+
+        Un pivote de indicador puede confirmarse unas velas después que el de
+        precio; por eso también se reevalúa el último pivote de precio de su tipo.
+
+        Returns:
+            Divergencias nuevas
+        """
+        found = []
+        for pivot in confirmed:
+            if pivot.series == PRICE:
+                indicators = self.indicators
+            elif pivot.series in self.indicators:
+                indicators = (pivot.series,)
+            else:
+                continue
+            for indicator in indicators:
+                divergence = self._evaluate(pivot.kind, indicator)
+                if divergence is not None:
+                    found.append(divergence)
+        return found
+
+    def _match(self, indicator: str, kind: str, index: int) -> Optional[Pivot]:
+        """Pivote del indicador más cercano a `index` dentro de la tolerancia."""
+        best = None
+        for pivot in reversed(self.pivots.get(indicator, kind)):
+            if pivot.index < index - self.match_tolerance:
+                break
+            if abs(pivot.index - index) <= self.match_tolerance:
+                if best is None or abs(pivot.index - index) < abs(best.index - index):
+                    best = pivot
+        return best
+
+    def _evaluate(self, kind: str, indicator: str) -> Optional[Dict[str, Any]]:
+        price_pivots = self.pivots.get(PRICE, kind)
+        if len(price_pivots) < 2:
+            return None
+        current, previous = price_pivots[-1], price_pivots[-2]
+        span = current.index - previous.index
+        if span < self.min_span or span > self.max_span:
+            return None
+        key = (indicator, kind, current.index)
+        if key in self._seen:
+            return None
+        current_ind = self._match(indicator, kind, current.index)
+        previous_ind = self._match(indicator, kind, previous.index)
+        if current_ind is None or previous_ind is None or current_ind.index == previous_ind.index:
+            return None
+
+        price_up = current.value > previous.value
+        indicator_up = current_ind.value > previous_ind.value
+        if current.value == previous.value or current_ind.value == previous_ind.value or price_up == indicator_up:
+            return None
+        if kind == LOW:
+            divergence_type = 'regular_bullish' if not price_up else 'hidden_bullish'
+        else:
+            divergence_type = 'regular_bearish' if price_up else 'hidden_bearish'
+
+        divergence = {
+            'type': divergence_type,
+            'indicator': indicator,
+            'start_index': previous.index,
+            'end_index': current.index,
+            'start_time': str(previous.time),
+            'end_time': str(current.time),
+            'price': (previous.value, current.value),
+            'indicator_values': (previous_ind.value, current_ind.value),
+            'price_change': (current.value - previous.value) / previous.value if previous.value else 0.0,
+            'indicator_change': current_ind.value - previous_ind.value
+        }
+        if len(self.history) == self.history.maxlen:
+            self._seen.discard(self.history[0]['key'])
+        divergence['key'] = key
+        self._seen.add(key)
+        self.history.append(divergence)
+        return divergence
+
+    def active(self, current_index: int) -> List[Dict[str, Any]]:
+        """
+        Divergencias cuyo último pivote está a menos de `max_age` velas de `current_index`.
+
+        Returns:
+            Lista de dicts con 'age' (velas desde el último pivote), más reciente primero
+        """
+        result = [
+            {**{k: v for k, v in divergence.items() if k != 'key'}, 'age': current_index - divergence['end_index']}
+            for divergence in self.history
+            if current_index - divergence['end_index'] <= self.max_age
+        ]
+        result.sort(key=lambda d: d['age'])
+        return result
+
+    @staticmethod
+    def summarize(divergences: List[Dict[str, Any]]) -> Dict[str, bool]:
+        """Indicadores booleanos por tipo ('regular_bullish', 'hidden_bearish', ...)."""
+        summary = {t: False for t in ('regular_bullish', 'regular_bearish', 'hidden_bullish', 'hidden_bearish')}
+        for divergence in divergences:
+            summary[divergence['type']] = True
+        return summary
@@ -0,0 +1,143 @@
+"""
+Quote Coalescer - Agregación de cotizaciones de alta frecuencia
+
+Funcionalidades:
+- Fusiona los ticks de 'quotes' de cada activo en una actualización por intervalo
+- Conserva open/high/low/close del intervalo para construir velas
+- Notifica a los suscriptores una sola vez por intervalo y activo
+- Ratios de coalescencia (ticks recibidos / actualizaciones emitidas) por activo
+
+Tipo: Soporte de captura de datos
+"""
+
+from typing import Dict, Any, Optional, List, Callable
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Índices del estado pendiente por activo (lista para evitar objetos por tick)
+_OPEN, _HIGH, _LOW, _CLOSE, _TICKS, _START, _END = range(7)
+
+
+class QuoteCoalescer:
+    """
+    Reduce el flujo de cotizaciones a una actualización por activo cada `interval_ms`.
+
+    Características:
+    - Coste O(1) por tick
+    - Flush perezoso al llegar un tick fuera de ventana, o explícito con flush_due()
+    - Listeners reciben dicts {asset, open, high, low, close, ticks, start, end}
+    """
+
+    def __init__(self, interval_ms: float = 50.0):
+        """
+        Inicializa el coalescer.
+
+        Args:
+            interval_ms: Duración de la ventana de coalescencia en milisegundos
+        """
+        self.interval = interval_ms / 1000.0
+        self._pending: Dict[str, List[Any]] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.ticks_in: Dict[str, int] = {}
+        self.updates_out: Dict[str, int] = {}
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """Registra una función que recibe cada actualización coalescida."""
+        self._listeners.append(callback)
+
+    def add(self, asset: str, price: Any, timestamp: Optional[float] = None) -> None:
+        """
+        Agrega un tick de precio.
+
+        Args:
+            asset: Activo de la cotización
+            price: Precio (número o texto)
+            timestamp: Hora local de recepción; por defecto ahora
+        """
+        try:
+            value = float(price)
+        except (TypeError, ValueError):
+            return
+        if timestamp is None:
+            timestamp = time.time()
+
+        self.ticks_in[asset] = self.ticks_in.get(asset, 0) + 1
+        pending = self._pending.get(asset)
+
+        if pending is not None and timestamp - pending[_START] >= self.interval:
+            self._emit(asset, pending)
+            pending = None
+
+        if pending is None:
+            self._pending[asset] = [value, value, value, value, 1, timestamp, timestamp]
+            return
+
+        if value > pending[_HIGH]:
+            pending[_HIGH] = value
+        elif value < pending[_LOW]:
+            pending[_LOW] = value
+        pending[_CLOSE] = value
+        pending[_TICKS] += 1
+        pending[_END] = timestamp
+
+    def flush_due(self, now: Optional[float] = None) -> int:
+        """
+        Emite las ventanas que ya cumplieron el intervalo (activos sin ticks nuevos).
+
+        Returns:
+            Número de actualizaciones emitidas
+        """
+        if now is None:
+            now = time.time()
+        due = [asset for asset, p in self._pending.items() if now - p[_START] >= self.interval]
+        for asset in due:
+            self._emit(asset, self._pending[asset])
+        return len(due)
+
+    def flush_all(self) -> int:
+        """Emite todas las ventanas pendientes sin esperar el intervalo."""
+        assets = list(self._pending)
+        for asset in assets:
+            self._emit(asset, self._pending[asset])
+        return len(assets)
+
+    def _emit(self, asset: str, pending: List[Any]) -> None:
+        del self._pending[asset]
+        self.updates_out[asset] = self.updates_out.get(asset, 0) + 1
+        update = {
+            'asset': asset,
+            'open': pending[_OPEN],
+            'high': pending[_HIGH],
+            'low': pending[_LOW],
+            'close': pending[_CLOSE],
+            'ticks': pending[_TICKS],
+            'start': pending[_START],
+            'end': pending[_END]
+        }
+        for callback in self._listeners:
+            try:
+                callback(update)
+            except Exception as e:
+                logger.debug(f"[COALESCE] Error en listener: {e}")
+
+    def get_report(self) -> Dict[str, Any]:
+        """Retorna ticks, actualizaciones y ratio de coalescencia por activo."""
+        assets = {}
+        for asset, ticks in self.ticks_in.items():
+            out = self.updates_out.get(asset, 0)
+            assets[asset] = {
+                'ticks_in': ticks,
+                'updates_out': out,
+                'coalescing_ratio': ticks / out if out else float(ticks)
+            }
+        total_in = sum(self.ticks_in.values())
+        total_out = sum(self.updates_out.values())
+        return {
+            'interval_ms': self.interval * 1000.0,
+            'ticks_in': total_in,
+            'updates_out': total_out,
+            'coalescing_ratio': total_in / total_out if total_out else float(total_in),
+            'assets': assets
+        }
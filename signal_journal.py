@@ -0,0 +1,311 @@
+"""
+Signal Journal - Histórico columnar compacto de señales de la IA
+================================================================
+
+Reemplaza el deque de dicts (cada uno con la AISignal completa) por un
+buffer circular NumPy de registros de ancho fijo (~56 bytes por señal):
+
+  - Columnas: id, tiempo, activo (id internado), dirección, estrategia,
+    confianza, scores, resultado y PnL
+  - Actualización del resultado en O(1) por signal_id (posición = id % capacidad)
+  - Pendientes por activo en orden FIFO para registrar resultados por activo
+  - Agregados acumulados (ventana en memoria y total histórico), de modo que
+    el resumen de rendimiento no recorre el histórico
+  - Volcado opcional a disco de los registros que salen del buffer
+"""
+
+import numpy as np
+import pandas as pd
+from collections import defaultdict, deque
+from typing import Dict, List, Any, Optional
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Resultado de la señal
+OUTCOME_PENDING = -1
+OUTCOME_LOSS = 0
+OUTCOME_WIN = 1
+OUTCOME_DRAW = 2
+
+OUTCOME_CODES = {'loss': OUTCOME_LOSS, 'win': OUTCOME_WIN, 'draw': OUTCOME_DRAW}
+
+DIRECTION_CODES = {'CALL': 1, 'PUT': -1}
+DIRECTION_NAMES = {1: 'CALL', -1: 'PUT', 0: None}
+
+JOURNAL_DTYPE = np.dtype([
+    ('signal_id', np.int64),
+    ('timestamp', np.float64),
+    ('asset_id', np.int32),
+    ('strategy_id', np.int16),
+    ('direction', np.int8),
+    ('outcome', np.int8),
+    ('confidence', np.float32),
+    ('technical_score', np.float32),
+    ('ml_score', np.float32),
+    ('sentiment_score', np.float32),
+    ('pattern_score', np.float32),
+    ('entry_price', np.float64),
+    ('profit_loss', np.float32)
+])
+
+
+class SignalJournal:
+    """
+    Histórico de señales en columnas de ancho fijo.
+
+    Características:
+    - Buffer circular de `capacity` registros (como el deque con maxlen)
+    - Resultado por signal_id en O(1)
+    - Resumen de rendimiento en tiempo constante
+    - Volcado a disco opcional de los registros expulsados
+    """
+
+    def __init__(self, capacity: int = 1000, spill_path: Optional[str] = None):
+        """
+        Inicializa el journal.
+
+        Args:
+            capacity: Señales guardadas en memoria
+            spill_path: Archivo binario donde se añaden los registros expulsados
+                        (None = se descartan); los nombres internados se guardan
+                        en `<spill_path>.names.json`
+        """
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.records = np.zeros(capacity, dtype=JOURNAL_DTYPE)
+        self.records['signal_id'] = -1
+        self.next_id = 0
+        self.first_id = 0  # id más antiguo aún en memoria
+
+        self.asset_ids: Dict[str, int] = {}
+        self.asset_names: List[str] = []
+        self.strategy_ids: Dict[str, int] = {}
+        self.strategy_names: List[str] = []
+        self.pending: Dict[int, deque] = defaultdict(deque)
+        self._saved_names = (0, 0)
+
+        # Agregados de la ventana en memoria y del total histórico
+        self.window = {'signals': 0, 'completed': 0, 'wins': 0, 'draws': 0, 'profit_loss': 0.0}
+        self.lifetime = {'signals': 0, 'completed': 0, 'wins': 0, 'draws': 0, 'profit_loss': 0.0, 'spilled': 0}
+
+    def __len__(self) -> int:
+        return self.window['signals']
+
+    @staticmethod
+    def _intern(name: Optional[str], ids: Dict[str, int], names: List[str]) -> int:
+        key = name or ''
+        code = ids.get(key)
+        if code is None:
+            code = ids[key] = len(names)
+            names.append(key)
+        return code
+
+    def record(self, signal: Any) -> int:
+        """
+        Registra una AISignal y le asigna su signal_id.
+
+        Args:
+            signal: AISignal (se leen sus campos escalares; no se guarda el objeto)
+
+        Returns:
+            signal_id asignado
+        """
+        signal_id = self.next_id
+        slot = signal_id % self.capacity
+        if signal_id - self.first_id >= self.capacity:
+            self._evict(slot)
+
+        strategy = getattr(signal.strategy, 'value', signal.strategy)
+        self.records[slot] = (
+            signal_id,
+            signal.timestamp.timestamp() if hasattr(signal.timestamp, 'timestamp') else time.time(),
+            self._intern(signal.asset, self.asset_ids, self.asset_names),
+            self._intern(strategy, self.strategy_ids, self.strategy_names),
+            DIRECTION_CODES.get(signal.direction, 0),
+            OUTCOME_PENDING,
+            signal.confidence,
+            signal.technical_score,
+            signal.ml_score,
+            signal.sentiment_score,
+            getattr(signal, 'pattern_score', np.nan),
+            signal.entry_price,
+            0.0
+        )
+        self.next_id += 1
+        queue = self.pending[int(self.records['asset_id'][slot])]
+        queue.append(signal_id)
+        while queue[0] < self.first_id:
+            queue.popleft()
+        self.window['signals'] += 1
+        self.lifetime['signals'] += 1
+        signal.signal_id = signal_id
+        return signal_id
+
+    def _evict(self, slot: int) -> None:
+        """Saca del buffer el registro más antiguo (volcándolo a disco si procede)."""
+        outcome = int(self.records['outcome'][slot])
+        self.window['signals'] -= 1
+        if outcome != OUTCOME_PENDING:
+            self.window['completed'] -= 1
+            self.window['wins'] -= outcome == OUTCOME_WIN
+            self.window['draws'] -= outcome == OUTCOME_DRAW
+            self.window['profit_loss'] -= float(self.records['profit_loss'][slot])
+        if self.spill_path:
+            try:
+                with open(self.spill_path, 'ab') as f:
+                    self.records[slot:slot + 1].tofile(f)
+                self.lifetime['spilled'] += 1
+                if self._saved_names != (len(self.asset_names), len(self.strategy_names)):
+                    self.save_names()
+            except OSError as e:
+                logger.warning(f"[JOURNAL] No se pudo volcar a {self.spill_path}: {e}")
+        self.first_id += 1
+
+    def _slot(self, signal_id: int) -> Optional[int]:
+        if signal_id < self.first_id or signal_id >= self.next_id:
+            return None
+        return signal_id % self.capacity
+
+    def record_outcome(self, signal_id: int, result: str, profit_loss: float = 0.0) -> bool:
+        """
+        Registra el resultado de una señal en O(1).
+
+        Args:
+            signal_id: Id devuelto por record
+            result: 'win', 'loss' o 'draw'
+            profit_loss: Ganancia/pérdida de la operación
+
+        Returns:
+            False si la señal ya no está en memoria o ya tenía resultado
+        """
+        slot = self._slot(signal_id)
+        outcome = OUTCOME_CODES.get(result)
+        if slot is None or outcome is None or self.records['outcome'][slot] != OUTCOME_PENDING:
+            return False
+        self.records['outcome'][slot] = outcome
+        self.records['profit_loss'][slot] = profit_loss
+        for totals in (self.window, self.lifetime):
+            totals['completed'] += 1
+            totals['wins'] += outcome == OUTCOME_WIN
+            totals['draws'] += outcome == OUTCOME_DRAW
+            totals['profit_loss'] += profit_loss
+        return True
+
+    def record_asset_outcome(self, asset: str, result: str, profit_loss: float = 0.0) -> Optional[int]:
+        """
+        Registra el resultado de la señal pendiente más antigua del activo.
+
+        Returns:
+            signal_id actualizado o None si no había pendientes
+        """
+        asset_id = self.asset_ids.get(asset)
+        if asset_id is None:
+            return None
+        queue = self.pending[asset_id]
+        while queue:
+            signal_id = queue.popleft()
+            if self.record_outcome(signal_id, result, profit_loss):
+                return signal_id
+        return None
+
+    def get(self, signal_id: int) -> Optional[Dict[str, Any]]:
+        """Registro de una señal como dict (None si ya no está en memoria)."""
+        slot = self._slot(signal_id)
+        if slot is None:
+            return None
+        return self._to_dict(self.records[slot])
+
+    def _to_dict(self, row: np.void) -> Dict[str, Any]:
+        outcome = int(row['outcome'])
+        return {
+            'signal_id': int(row['signal_id']),
+            'timestamp': float(row['timestamp']),
+            'asset': self.asset_names[row['asset_id']],
+            'strategy': self.strategy_names[row['strategy_id']],
+            'direction': DIRECTION_NAMES[int(row['direction'])],
+            'confidence': float(row['confidence']),
+            'technical_score': float(row['technical_score']),
+            'ml_score': float(row['ml_score']),
+            'sentiment_score': float(row['sentiment_score']),
+            'pattern_score': float(row['pattern_score']),
+            'entry_price': float(row['entry_price']),
+            'was_profitable': None if outcome == OUTCOME_PENDING else outcome == OUTCOME_WIN,
+            'profit_loss': float(row['profit_loss'])
+        }
+
+    def ordered_records(self) -> np.ndarray:
+        """Registros en memoria en orden cronológico (copia)."""
+        return self.records[np.arange(self.first_id, self.next_id) % self.capacity]
+
+    def recent(self, n: int = 10) -> List[Dict[str, Any]]:
+        """Últimas `n` señales como dicts (la más reciente al final)."""
+        return [self._to_dict(row) for row in self.ordered_records()[-n:]]
+
+    def open_signals(self, max_age_seconds: float, now: Optional[float] = None) -> List[tuple]:
+        """
+        Señales sin resultado emitidas en los últimos `max_age_seconds` segundos.
+
+        Returns:
+            Lista de (activo, dirección)
+        """
+        now = time.time() if now is None else now
+        rows = self.ordered_records()
+        rows = rows[(rows['outcome'] == OUTCOME_PENDING) & (rows['timestamp'] >= now - max_age_seconds)]
+        return [(self.asset_names[row['asset_id']], DIRECTION_NAMES[int(row['direction'])]) for row in rows]
+
+    def to_frame(self, include_spilled: bool = False) -> pd.DataFrame:
+        """
+        Histórico como DataFrame con nombres de activo y estrategia.
+
+        Args:
+            include_spilled: Incluir también los registros volcados a disco
+        """
+        rows = self.ordered_records()
+        if include_spilled:
+            spilled = self.load_spilled()
+            if len(spilled):
+                rows = np.concatenate([spilled, rows])
+        frame = pd.DataFrame(rows)
+        frame['asset'] = np.asarray(self.asset_names, dtype=object)[frame['asset_id']] if len(frame) else []
+        frame['strategy'] = np.asarray(self.strategy_names, dtype=object)[frame['strategy_id']] if len(frame) else []
+        return frame
+
+    def load_spilled(self) -> np.ndarray:
+        """Registros volcados a disco (vacío si no hay archivo)."""
+        if not self.spill_path:
+            return np.zeros(0, dtype=JOURNAL_DTYPE)
+        try:
+            return np.fromfile(self.spill_path, dtype=JOURNAL_DTYPE)
+        except (OSError, ValueError):
+            return np.zeros(0, dtype=JOURNAL_DTYPE)
+
+    def save_names(self) -> None:
+        """Guarda las tablas de nombres internados junto al archivo de volcado."""
+        if not self.spill_path:
+            return
+        with open(f"{self.spill_path}.names.json", 'w', encoding='utf-8') as f:
+            json.dump({'assets': self.asset_names, 'strategies': self.strategy_names}, f)
+        self._saved_names = (len(self.asset_names), len(self.strategy_names))
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Resumen de rendimiento de la ventana en memoria (tiempo constante)."""
+        window = self.window
+        completed = window['completed']
+        return {
+            'total_signals': window['signals'],
+            'completed_signals': completed,
+            'win_count': window['wins'],
+            'loss_count': completed - window['wins'],
+            'draw_count': window['draws'],
+            'win_rate': window['wins'] / completed if completed else 0.0,
+            'profit_loss': window['profit_loss'],
+            'lifetime_signals': self.lifetime['signals'],
+            'lifetime_win_rate': self.lifetime['wins'] / self.lifetime['completed'] if self.lifetime['completed'] else 0.0
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return self.records.nbytes
@@ -0,0 +1,509 @@
+"""
+Streaming Feature State - Estado incremental de features por activo
+===================================================================
+
+Mantiene por activo los agregados que AdvancedAIEngine necesita para analizar
+(regresiones móviles, volatilidad, sentimiento, pivotes, histograma de precios)
+actualizándolos en O(1) / O(log n) por vela nueva en lugar de recalcular sobre
+todo el DataFrame en cada llamada.
+
+Diseño:
+  - Las velas cerradas alimentan agregados móviles de tamaño (ventana - 1).
+  - La vela en formación (la última del DataFrame) se guarda aparte y se
+    combina con esos agregados al consultar, así una actualización intra-vela
+    no modifica el estado.
+  - Los valores coinciden con los cálculos originales sobre el DataFrame
+    (linregress, np.std, np.histogram) salvo redondeo de punto flotante.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple, Optional, Any
+from collections import deque
+from bisect import bisect_left, bisect_right, insort
+import math
+import logging
+
+from volatility_estimators import VolatilityState
+from level_index import LevelIndex
+from pivot_index import PivotIndex, DivergenceEngine, PRICE, HIGH, LOW, DEFAULT_INDICATORS
+
+logger = logging.getLogger(__name__)
+
+
+class RollingSum:
+    """Suma y suma de cuadrados de una ventana fija, con recálculo exacto periódico."""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.values: deque = deque(maxlen=self.size)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self._pushes = 0
+
+    def push(self, value: float) -> None:
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+
+        # Recalcular cada `size` inserciones evita deriva numérica (O(1) amortizado)
+        self._pushes += 1
+        if self._pushes >= self.size:
+            self._pushes = 0
+            self.total = float(sum(self.values))
+            self.total_sq = float(sum(v * v for v in self.values))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class RollingRegression:
+    """
+    Regresión lineal móvil y = a + b·x con x = 0..m-1 (equivalente a linregress
+    sobre la ventana), mantenida con sumas Σy, Σy², Σxy en O(1) por vela.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.values: deque = deque(maxlen=self.size)
+        self.ref = 0.0  # Centrado de valores para reducir cancelación numérica
+        self.sy = 0.0
+        self.syy = 0.0
+        self.sxy = 0.0
+        self._pushes = 0
+
+    def push(self, value: float) -> None:
+        y = value - self.ref
+        m = len(self.values)
+        if m == self.size:
+            y0 = self.values[0]
+            self.sxy = self.sxy - (self.sy - y0) + (self.size - 1) * y
+            self.sy += y - y0
+            self.syy += y * y - y0 * y0
+        else:
+            self.sxy += m * y
+            self.sy += y
+            self.syy += y * y
+        self.values.append(y)
+
+        self._pushes += 1
+        if self._pushes >= self.size:
+            self._recompute(value)
+
+    def _recompute(self, new_ref: float) -> None:
+        shift = new_ref - self.ref
+        self.values = deque((v - shift for v in self.values), maxlen=self.size)
+        self.ref = new_ref
+        self.sy = float(sum(self.values))
+        self.syy = float(sum(v * v for v in self.values))
+        self.sxy = float(sum(i * v for i, v in enumerate(self.values)))
+        self._pushes = 0
+
+    def stats(self, live: Optional[float] = None) -> Tuple[float, float, float, float, int]:
+        """
+        Estadísticos de la ventana (incluyendo el valor en formación si se indica).
+
+        Returns:
+            (slope, r_value, mean, std_poblacional, n)
+        """
+        m = len(self.values)
+        sy, syy, sxy = self.sy, self.syy, self.sxy
+        if live is not None:
+            y = live - self.ref
+            sxy += m * y
+            sy += y
+            syy += y * y
+            m += 1
+        if m == 0:
+            return 0.0, 0.0, 0.0, 0.0, 0
+
+        mean = sy / m
+        syy_c = max(0.0, syy - sy * mean)
+        std = math.sqrt(syy_c / m)
+        if m < 2:
+            return 0.0, 0.0, mean + self.ref, std, m
+
+        sxx_c = m * (m * m - 1) / 12.0
+        sxy_c = sxy - (m * (m - 1) / 2.0) * mean
+        slope = sxy_c / sxx_c
+        r_value = sxy_c / math.sqrt(sxx_c * syy_c) if syy_c > 0 else 0.0
+        return slope, max(-1.0, min(1.0, r_value)), mean + self.ref, std, m
+
+
+class MonotonicExtreme:
+    """Máximo o mínimo de una ventana deslizante en O(1) amortizado."""
+
+    def __init__(self, size: int, mode: str = 'max'):
+        self.size = max(1, size)
+        self.is_max = mode == 'max'
+        self.items: deque = deque()  # (index, value)
+
+    def push(self, index: int, value: float) -> None:
+        items = self.items
+        if self.is_max:
+            while items and items[-1][1] <= value:
+                items.pop()
+        else:
+            while items and items[-1][1] >= value:
+                items.pop()
+        items.append((index, value))
+        while items[0][0] <= index - self.size:
+            items.popleft()
+
+    def front(self) -> Optional[Tuple[int, float]]:
+        return self.items[0] if self.items else None
+
+
+class OscillatorState:
+    """
+    RSI de Wilder e histograma MACD por vela cerrada en O(1), con los mismos
+    valores que feature_matrix.default_indicators (NaN mientras calientan).
+    """
+
+    def __init__(self, rsi_period: int = 14, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.rsi_period = rsi_period
+        self.rsi_alpha = 1.0 / rsi_period
+        self.fast_alpha = 2.0 / (fast + 1)
+        self.slow_alpha = 2.0 / (slow + 1)
+        self.signal_alpha = 2.0 / (signal + 1)
+        self.macd_warmup = slow - 1
+        self.count = 0
+        self.prev_close: Optional[float] = None
+        self.gain = self.loss = 0.0
+        self.fast = self.slow = self.signal = 0.0
+
+    def push(self, close: float) -> Tuple[float, float]:
+        """Agrega un cierre y retorna (rsi, histograma MACD)."""
+        if self.prev_close is None:
+            self.fast = self.slow = close
+            self.signal = 0.0
+        else:
+            delta = close - self.prev_close
+            self.gain += self.rsi_alpha * (max(delta, 0.0) - self.gain)
+            self.loss += self.rsi_alpha * (max(-delta, 0.0) - self.loss)
+            self.fast += self.fast_alpha * (close - self.fast)
+            self.slow += self.slow_alpha * (close - self.slow)
+            self.signal += self.signal_alpha * ((self.fast - self.slow) - self.signal)
+        self.prev_close = close
+        index = self.count
+        self.count += 1
+
+        rsi = math.nan
+        if index >= self.rsi_period:
+            rsi = 100 - 100 / (1 + self.gain / self.loss) if self.loss > 0 else 100.0
+        histogram = (self.fast - self.slow) - self.signal if index >= self.macd_warmup else math.nan
+        return rsi, histogram
+
+
+class SortedWindow:
+    """Ventana FIFO que además se mantiene ordenada (consultas por bisección)."""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.fifo: deque = deque()
+        self.sorted: List[float] = []
+
+    def push(self, value: float) -> None:
+        if len(self.fifo) == self.size:
+            old = self.fifo.popleft()
+            del self.sorted[bisect_left(self.sorted, old)]
+        self.fifo.append(value)
+        insort(self.sorted, value)
+
+    def __len__(self) -> int:
+        return len(self.fifo)
+
+
+class StreamingFeatureState:
+    """
+    Estado incremental de features de un activo.
+
+    Características:
+    - sync(df) ingiere solo las velas nuevas del DataFrame (O(velas nuevas))
+    - Tendencia, fase, sentimiento, divergencia y S/R en O(1) / O(log n) por consulta
+    - Índice de pivotes compartido (precio, RSI, histograma MACD) y divergencias
+      regulares/ocultas sobre esos pivotes
+    - Perfil de precios multirresolución (LevelIndex) alimentado por velas y pivotes
+    """
+
+    def __init__(
+        self,
+        trend_window: int = 20,
+        phase_window: int = 50,
+        sentiment_window: int = 20,
+        sr_window: int = 100,
+        sr_range_window: int = 50,
+        histogram_bins: int = 20,
+        volume_short: int = 5,
+        volume_long: int = 10,
+        pivot_window: int = 5,
+        max_pivots: int = 100,
+        warmup_bars: int = 300
+    ):
+        self.trend_window = trend_window
+        self.phase_window = phase_window
+        self.sentiment_window = sentiment_window
+        self.sr_window = sr_window
+        self.sr_range_window = sr_range_window
+        self.histogram_bins = histogram_bins
+        self.volume_short = volume_short
+        self.volume_long = volume_long
+        self.pivot_window = pivot_window
+        self.max_pivots = max_pivots
+        self.warmup_bars = max(warmup_bars, sr_window + 2 * pivot_window + 1)
+        self.reset()
+
+    def reset(self) -> None:
+        """Descarta todo el estado (se reconstruye en el próximo sync)."""
+        self.closed_count = 0
+        self.last_closed_time = None
+        self.last_closed_close: Optional[float] = None
+        self.live: Optional[Tuple[Any, float, float, float, float, float]] = None
+        self.has_volume = False
+
+        self._trend = RollingRegression(self.trend_window - 1)
+        self._phase = RollingRegression(self.phase_window - 1)
+        self._volume_trend = RollingRegression(self.trend_window - 1)
+        self._sentiment_returns = RollingSum(self.sentiment_window - 2)
+        self._phase_returns = RollingSum(self.phase_window - 2)
+        self._bullish = RollingSum(self.sentiment_window - 1)
+        self._volume_short = RollingSum(self.volume_short - 1)
+        self._volume_long = RollingSum(self.volume_long - 1)
+        self._sr_sorted = SortedWindow(self.sr_window - 1)
+        self._range_min = MonotonicExtreme(self.sr_range_window - 1, 'min')
+        self._range_max = MonotonicExtreme(self.sr_range_window - 1, 'max')
+        self._volatility = VolatilityState()
+        self.levels = LevelIndex()
+
+        self._oscillators = OscillatorState()
+        self.pivots = PivotIndex(self.pivot_window, self.max_pivots, series=(PRICE,) + DEFAULT_INDICATORS)
+        self.divergences = DivergenceEngine(self.pivots, DEFAULT_INDICATORS)
+
+    @property
+    def pivot_highs(self) -> deque:
+        """Máximos de precio confirmados (Pivot)."""
+        return self.pivots.get(PRICE, HIGH)
+
+    @property
+    def pivot_lows(self) -> deque:
+        """Mínimos de precio confirmados (Pivot)."""
+        return self.pivots.get(PRICE, LOW)
+
+    # ------------------------------------------------------------------
+    # Ingesta
+    # ------------------------------------------------------------------
+
+    def push_closed(self, time: Any, open_: float, high: float, low: float, close: float, volume: float = 0.0) -> None:
+        """Agrega una vela cerrada a todos los agregados."""
+        index = self.closed_count
+
+        if self.last_closed_close:
+            ret = (close - self.last_closed_close) / self.last_closed_close
+            self._sentiment_returns.push(ret)
+            self._phase_returns.push(ret)
+
+        self._trend.push(close)
+        self._phase.push(close)
+        self._volume_trend.push(volume)
+        self._bullish.push(1.0 if close > open_ else 0.0)
+        self._volume_short.push(volume)
+        self._volume_long.push(volume)
+        self._sr_sorted.push(close)
+        self._range_min.push(index, close)
+        self._range_max.push(index, close)
+        self._volatility.push_closed(open_, high, low, close)
+        self.levels.push_closed(high, low, volume)
+
+        # Pivotes confirmados (vela central de ±pivot_window) de precio e indicadores, una vez por vela
+        rsi, macd_histogram = self._oscillators.push(close)
+        confirmed = self.pivots.push(index, time, {
+            PRICE: (high, low),
+            'rsi': (rsi, rsi),
+            'macd_histogram': (macd_histogram, macd_histogram)
+        })
+        if confirmed:
+            for pivot in confirmed:
+                if pivot.series == PRICE:
+                    self.levels.push_touch(pivot.value)
+            self.divergences.on_pivots(confirmed)
+
+        self.closed_count += 1
+        self.last_closed_time = time
+        self.last_closed_close = close
+
+    def set_live(self, time: Any, open_: float, high: float, low: float, close: float, volume: float = 0.0) -> None:
+        """Actualiza la vela en formación (no modifica los agregados)."""
+        self.live = (time, open_, high, low, close, volume)
+
+    def sync(self, df: pd.DataFrame) -> int:
+        """
+        Sincroniza el estado con el DataFrame ingiriendo solo las velas nuevas.
+
+        La última fila se trata como vela en formación; las anteriores como cerradas.
+        Si el histórico no encaja con el estado (primer uso, índice desconocido o
+        desordenado) se reconstruye desde las últimas `warmup_bars` velas.
+
+        Returns:
+            Número de velas cerradas ingeridas
+        """
+        if df is None or df.empty:
+            return 0
+
+        index = df.index
+        start = None
+        if self.last_closed_time is not None and index.is_monotonic_increasing:
+            pos = index.searchsorted(self.last_closed_time)
+            if pos < len(index) and index[pos] == self.last_closed_time and pos < len(index) - 1:
+                start = pos + 1
+
+        if start is None:
+            self.reset()
+            start = max(0, len(df) - self.warmup_bars)
+        self.has_volume = 'volume' in df.columns
+
+        cols = ['open', 'high', 'low', 'close']
+        block = df.iloc[start:]
+        values = block[cols].to_numpy(dtype=float)
+        volumes = block['volume'].to_numpy(dtype=float) if self.has_volume else np.zeros(len(block))
+        times = block.index
+
+        for i in range(len(block) - 1):
+            o, h, l, c = values[i]
+            self.push_closed(times[i], o, h, l, c, volumes[i])
+        o, h, l, c = values[-1]
+        self.set_live(times[-1], o, h, l, c, volumes[-1])
+        return len(block) - 1
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    @property
+    def bar_count(self) -> int:
+        return self.closed_count + (1 if self.live is not None else 0)
+
+    @property
+    def live_close(self) -> Optional[float]:
+        return self.live[4] if self.live is not None else None
+
+    def _live_return(self) -> Optional[float]:
+        if self.live is None or not self.last_closed_close:
+            return None
+        return (self.live[4] - self.last_closed_close) / self.last_closed_close
+
+    @staticmethod
+    def _mean_std(rolling: RollingSum, extra: Optional[float]) -> Tuple[float, float]:
+        n = len(rolling)
+        total, total_sq = rolling.total, rolling.total_sq
+        if extra is not None:
+            n += 1
+            total += extra
+            total_sq += extra * extra
+        if n == 0:
+            return 0.0, 0.0
+        mean = total / n
+        return mean, math.sqrt(max(0.0, total_sq / n - mean * mean))
+
+    def trend_regression(self) -> Tuple[float, float]:
+        """(slope, r_value) de los cierres en la ventana de tendencia."""
+        slope, r_value, _, _, _ = self._trend.stats(self.live_close)
+        return slope, r_value
+
+    def trend_strength(self) -> float:
+        """Equivalente a AdvancedAIEngine._calculate_trend_strength."""
+        slope, r_value = self.trend_regression()
+        return float(np.tanh(slope * 1000) * (r_value ** 2))
+
+    def phase_inputs(self) -> Tuple[float, float, float]:
+        """(slope, r_value, volatilidad de retornos) sobre la ventana de fase."""
+        slope, r_value, _, _, _ = self._phase.stats(self.live_close)
+        _, volatility = self._mean_std(self._phase_returns, self._live_return())
+        return slope, r_value, volatility
+
+    def close_mean_std(self) -> Tuple[float, float]:
+        """Media y desviación (poblacional) de los cierres de la ventana de fase."""
+        _, _, mean, std, _ = self._phase.stats(self.live_close)
+        return mean, std
+
+    def volatility_estimates(self) -> Dict[str, float]:
+        """EWMA, Parkinson, Garman-Klass y ATR incluyendo la vela en formación."""
+        return self._volatility.estimates(self.live[1:5] if self.live is not None else None)
+
+    def price_levels(self) -> Dict[str, Optional[float]]:
+        """Soporte y resistencia más cercanos al precio actual en el perfil de precios (LevelIndex.nearest)."""
+        price = self.live_close if self.live_close is not None else self.last_closed_close
+        return self.levels.nearest(price)
+
+    def indicator_divergences(self) -> List[Dict[str, Any]]:
+        """Divergencias precio/indicador activas (DivergenceEngine.active sobre la última vela cerrada)."""
+        return self.divergences.active(self.closed_count - 1)
+
+    def volume_slope(self) -> float:
+        """Pendiente de regresión del volumen en la ventana de tendencia."""
+        live_volume = self.live[5] if self.live is not None else None
+        slope, _, _, _, _ = self._volume_trend.stats(live_volume)
+        return slope
+
+    def sentiment(self) -> Dict[str, float]:
+        """Equivalente a MarketSentimentAnalyzer.analyze_sentiment sobre las últimas velas."""
+        upward = self._bullish.total
+        if self.live is not None and self.live[4] > self.live[1]:
+            upward += 1
+        bullish_ratio = upward / self.sentiment_window
+        bullish_pressure = min(1.0, bullish_ratio * 1.5)
+
+        momentum, volatility = self._mean_std(self._sentiment_returns, self._live_return())
+        result = {
+            'bullish_pressure': bullish_pressure,
+            'bearish_pressure': 1.0 - bullish_pressure,
+            'momentum': float(momentum * 100),
+            'volatility': float(volatility),
+            'volume_strength': 0.5
+        }
+        if self.has_volume:
+            live_volume = self.live[5] if self.live is not None else None
+            short_mean, _ = self._mean_std(self._volume_short, live_volume)
+            long_mean, _ = self._mean_std(self._volume_long, live_volume)
+            result['volume_strength'] = min(1.0, short_mean / (long_mean + 1e-10))
+        return result
+
+    def support_resistance(self) -> Tuple[float, float]:
+        """
+        Equivalente a PatternRecognizer.detect_support_resistance: rango de las últimas
+        `sr_range_window` velas combinado con el bin más poblado del histograma
+        de las últimas `sr_window` (bisección sobre la ventana ordenada).
+        """
+        live = self.live_close
+        lowest = self._range_min.front()
+        highest = self._range_max.front()
+        support = min(v for v in (lowest[1] if lowest else None, live) if v is not None)
+        resistance = max(v for v in (highest[1] if highest else None, live) if v is not None)
+
+        ordered = self._sr_sorted.sorted
+        n_closed = len(ordered)
+        candidates_min = [ordered[0]] if ordered else []
+        candidates_max = [ordered[-1]] if ordered else []
+        if live is not None:
+            candidates_min.append(live)
+            candidates_max.append(live)
+        low, high = min(candidates_min), max(candidates_max)
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+
+        bins = self.histogram_bins
+        edges = np.linspace(low, high, bins + 1)
+        lefts = [bisect_left(ordered, e) for e in edges]
+        counts = [lefts[k + 1] - lefts[k] for k in range(bins - 1)]
+        counts.append(n_closed - lefts[bins - 1])
+        if live is not None:
+            live_bin = min(bisect_right(edges, live) - 1, bins - 1)
+            counts[max(0, live_bin)] += 1
+
+        peak_bin = int(np.argmax(counts))
+        cluster_support = edges[peak_bin]
+        cluster_resistance = edges[peak_bin + 1]
+        return (support + cluster_support) / 2, (resistance + cluster_resistance) / 2
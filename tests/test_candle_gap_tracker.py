@@ -0,0 +1,73 @@
+"""Reintentos con espera exponencial de los huecos que el broker no rellena."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from candle_gap_tracker import CandleGapTracker, normalize_symbol  # noqa: E402
+
+TF = 60
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _candles(times):
+    return [{'time': t, 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0} for t in times]
+
+
+def test_failed_gap_waits_for_backoff_and_doubles():
+    clock = _Clock()
+    tracker = CandleGapTracker(retry_backoff_s=30, max_backoff_s=100, clock=clock)
+    gaps = tracker.update('EURUSD', _candles([0, 60, 300, 360]), TF)
+    assert gaps == [(120, 240)]
+    assert tracker.due_gaps('EURUSD', gaps) == gaps
+
+    tracker.record_backfill('EURUSD', gaps[0], 0)
+    assert tracker.due_gaps('EURUSD', gaps) == []
+    clock.now += 30
+    assert tracker.due_gaps('EURUSD', gaps) == gaps
+
+    tracker.record_backfill('EURUSD', gaps[0], 0)
+    clock.now += 59
+    assert tracker.due_gaps('EURUSD', gaps) == []
+    clock.now += 1
+    assert tracker.due_gaps('EURUSD', gaps) == gaps
+
+    # La espera se limita a max_backoff_s
+    tracker.record_backfill('EURUSD', gaps[0], 0)
+    assert tracker.failed_gaps['EURUSD'][gaps[0]] == {'attempts': 3, 'retry_at': clock.now + 100}
+    report = tracker.get_report()['EURUSD']
+    assert report['backfill_failures'] == 3
+    assert report['gaps_in_backoff'] == 1
+
+
+def test_failure_forgotten_when_gap_is_filled_or_disappears():
+    clock = _Clock()
+    tracker = CandleGapTracker(clock=clock)
+    gaps = tracker.update('EURUSD', _candles([0, 60, 300, 600, 660]), TF)
+    assert gaps == [(120, 240), (360, 540)]
+    tracker.record_backfill('EURUSD', gaps[0], 0)
+    tracker.record_backfill('EURUSD', gaps[1], 0)
+    assert tracker.due_gaps('EURUSD', gaps) == []
+
+    # El primer hueco llega por otra vía (WebSocket); el segundo se rellena en un reintento
+    tracker.update('EURUSD', _candles([0, 60, 120, 180, 240, 300, 600, 660]), TF)
+    assert list(tracker.failed_gaps['EURUSD']) == [(360, 540)]
+    tracker.record_backfill('EURUSD', (360, 540), 4)
+    assert tracker.failed_gaps['EURUSD'] == {}
+
+
+def test_normalize_symbol_keeps_otc_and_real_markets_apart():
+    assert normalize_symbol('EUR/USD (OTC)') == normalize_symbol('EURUSD_otc') == normalize_symbol('eurusd-otc') == ('eurusd', True)
+    assert normalize_symbol('EUR/USD') == normalize_symbol('EURUSD') == ('eurusd', False)
+    assert normalize_symbol('EUR/USD (OTC)') != normalize_symbol('EURUSD')
+    assert normalize_symbol('EUR/USD') != normalize_symbol('EURUSD_otc')
+    # Un par contenido en otro símbolo ya no coincide
+    assert normalize_symbol('USD/JPY') != normalize_symbol('USDJPYX')
@@ -0,0 +1,110 @@
+"""Equivalencia de los núcleos de engine_kernels con sus referencias."""
+
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine_kernels  # noqa: E402
+from harmonic_patterns import HarmonicDetector  # noqa: E402
+
+
+def _legacy_streaks(results):
+    """Regla anterior de BacktestEngine._calculate_stats: los empates no cortan la racha."""
+    max_wins = max_losses = current_wins = current_losses = 0
+    for result in results:
+        if result == 'win':
+            current_wins += 1
+            current_losses = 0
+            max_wins = max(max_wins, current_wins)
+        elif result == 'loss':
+            current_losses += 1
+            current_wins = 0
+            max_losses = max(max_losses, current_losses)
+    return max_wins, max_losses
+
+
+def _legacy_drawdown(equity_curve):
+    """Regla anterior de BacktestEngine._calculate_max_drawdown."""
+    max_equity = equity_curve[0]
+    max_dd = 0
+    for equity in equity_curve:
+        if equity > max_equity:
+            max_equity = equity
+        max_dd = max(max_dd, (max_equity - equity) / max_equity)
+    return max_dd
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_max_streaks_numpy_matches_loop_and_legacy(seed):
+    rng = np.random.default_rng(seed)
+    results = rng.choice(['win', 'loss', 'draw'], int(rng.integers(1, 300)), p=[0.45, 0.4, 0.15]).tolist()
+    codes = engine_kernels.outcome_codes(results)
+    expected = _legacy_streaks(results)
+    assert engine_kernels._max_streaks_numpy(codes) == expected
+    assert engine_kernels._max_streaks_loop(codes) == expected
+    assert engine_kernels.max_streaks(codes) == expected
+
+
+def test_draw_does_not_break_streak():
+    codes = engine_kernels.outcome_codes(['win', 'draw', 'win', 'loss', 'draw', 'draw', 'loss', 'loss'])
+    assert engine_kernels._max_streaks_numpy(codes) == (2, 3)
+    assert engine_kernels._max_streaks_numpy(engine_kernels.outcome_codes([])) == (0, 0)
+    assert engine_kernels._max_streaks_numpy(engine_kernels.outcome_codes(['draw'])) == (0, 0)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_max_drawdown_numpy_matches_loop_and_legacy(seed):
+    rng = np.random.default_rng(seed)
+    equity = 1000.0 + np.cumsum(rng.normal(0, 10, int(rng.integers(2, 500))))
+    expected = _legacy_drawdown(equity.tolist())
+    assert engine_kernels._max_drawdown_numpy(equity) == expected
+    assert engine_kernels._max_drawdown_loop(equity) == expected
+    assert engine_kernels.max_drawdown(equity) == expected
+
+
+def _frame(seed, n=1500):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.3, n))
+    return pd.DataFrame(
+        {'open': close, 'high': close + np.abs(rng.normal(0, 0.2, n)),
+         'low': close - np.abs(rng.normal(0, 0.2, n)), 'close': close},
+        index=pd.date_range('2024-01-01', periods=n, freq='1min')
+    )
+
+
+def _snapshot(detector):
+    zigzag = detector.zigzag
+    state = (
+        detector.bar_count, detector.last_closed_time,
+        [vars(p) for p in detector.pivots], [vars(m) for m in detector.completed], [vars(m) for m in detector.pending],
+        zigzag.avg_range, zigzag.direction, zigzag.ext_index, zigzag.ext_time, zigzag.ext_price, zigzag._hi, zigzag._lo
+    )
+    # El núcleo devuelve float y el camino por vela np.float64: se comparan los valores
+    return re.sub(r"np\.float64\(([^)]*)\)", r"\1", repr(state))
+
+
+def _sync_snapshots(frame, steps):
+    detector = HarmonicDetector()
+    snapshots = []
+    for end in steps:
+        detector.sync(frame.iloc[:end])
+        snapshots.append(_snapshot(detector))
+    return snapshots, len(detector.pivots)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_harmonic_sync_block_matches_per_bar(seed, monkeypatch):
+    frame = _frame(seed)
+    # Bloques de varios tamaños, incluidos los de una vela (van por vela en ambos casos)
+    steps = [3, 4, 50, 51, 60, 700, 705, 706, 1200, 1500]
+    per_bar, pivots = _sync_snapshots(frame, steps)
+    monkeypatch.setattr(engine_kernels, 'is_compiled', lambda name: True)
+    block, _ = _sync_snapshots(frame, steps)
+    assert pivots > 0
+    assert block == per_bar
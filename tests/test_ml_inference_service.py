@@ -0,0 +1,53 @@
+"""Calentamiento de MLInferenceService: descarte de modelos con otro número de features."""
+
+import logging
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml_inference_service import MLInferenceService, DEFAULT_FEATURE_KEYS  # noqa: E402
+
+
+class _Model:
+    """Estimador mínimo con predict_proba que exige su número de features."""
+
+    def __init__(self, n_features, declare=True):
+        if declare:
+            self.n_features_in_ = n_features
+        self._n_features = n_features
+
+    def predict_proba(self, X):
+        X = np.atleast_2d(X)
+        if X.shape[1] != self._n_features:
+            raise ValueError(f"X has {X.shape[1]} features, expected {self._n_features}")
+        return np.column_stack([np.full(len(X), 0.3), np.full(len(X), 0.7)])
+
+
+def test_warm_up_drops_model_with_feature_count_mismatch(caplog):
+    service = MLInferenceService({'default': _Model(12)})
+    with caplog.at_level(logging.WARNING, logger='ml_inference_service'):
+        status = service.warm_up()
+    assert status == {'default': False}
+    assert not service.has_model('EURUSD')
+    assert any('12 features' in record.getMessage() for record in caplog.records)
+
+
+def test_warm_up_drops_undeclared_model_that_rejects_feature_vector():
+    service = MLInferenceService({'default': _Model(12, declare=False)})
+    assert service.warm_up() == {'default': False}
+    assert service.models == {}
+
+
+def test_warm_up_keeps_matching_model():
+    service = MLInferenceService({'default': _Model(len(DEFAULT_FEATURE_KEYS))})
+    assert service.warm_up() == {'default': True}
+    assert service.predict_many([('EURUSD', {'rsi': {'value': 40}})]) == [0.7]
+
+
+def test_warm_up_uses_configured_feature_keys():
+    keys = ['rsi.value', 'macd.histogram']
+    service = MLInferenceService({'default': _Model(5), 'forex': _Model(2)}, feature_keys=keys)
+    assert service.warm_up() == {'default': False, 'forex': True}
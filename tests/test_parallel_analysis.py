@@ -0,0 +1,143 @@
+"""
+Equivalencia del análisis en procesos worker con el análisis por lotes en proceso.
+
+El estado incremental por activo vive en los workers; con ventanas deslizantes
+los resultados deben coincidir vela a vela con el motor sin paralelismo.
+"""
+
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from advanced_ai_engine import AdvancedAIEngine  # noqa: E402
+
+ASSETS = [f"ASSET{i}" for i in range(9)]
+BARS = 420
+WINDOW = 300
+STEPS = 24
+
+
+def _frame(seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.3, BARS))
+    open_ = close + rng.normal(0, 0.1, BARS)
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.2, BARS))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.2, BARS))
+    volume = rng.integers(1, 100, BARS).astype(float)
+    index = pd.date_range('2024-01-01', periods=BARS, freq='1min')
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+
+
+def _comparable(signal):
+    if signal is None:
+        return None
+    # Solo la hora de creación depende del proceso
+    return repr({k: v for k, v in vars(signal).items() if k != 'timestamp'})
+
+
+def _run(config, frames):
+    engine = AdvancedAIEngine(config)
+    outputs = []
+    try:
+        for step in range(STEPS):
+            # Ventana deslizante: cada paso cierra una vela nueva y el orden de los activos rota
+            end = WINDOW + step * 4
+            order = ASSETS[step % len(ASSETS):] + ASSETS[:step % len(ASSETS)]
+            window = {asset: frames[asset].iloc[end - WINDOW:end] for asset in order}
+            outputs.append(engine.analyze_assets(window, {asset: {} for asset in order}))
+    finally:
+        engine.shutdown_parallel()
+    return outputs
+
+
+@pytest.fixture(scope='module')
+def frames():
+    logging.disable(logging.CRITICAL)
+    yield {asset: _frame(seed) for seed, asset in enumerate(ASSETS)}
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture(scope='module')
+def batch_results(frames):
+    return _run({'ai_engine': {'parallel_workers': 0}}, frames)
+
+
+@pytest.fixture(scope='module')
+def parallel_results(frames):
+    return _run({'ai_engine': {'parallel_workers': 3}}, frames)
+
+
+# Pesos del ensemble que suman 4: todas las velas emiten señal, así se comparan
+# los niveles S/R y las divergencias de cada activo en cada paso
+PERMISSIVE = {
+    'ensemble': {'model_weights': {'technical': 1.0, 'ml': 1.0, 'sentiment': 1.0, 'pattern': 1.0}},
+    'sr_method': 'profile'
+}
+
+
+@pytest.fixture(scope='module')
+def permissive_pairs(frames):
+    batch = _run({'ai_engine': {**PERMISSIVE, 'parallel_workers': 0}}, frames)
+    parallel = _run({'ai_engine': {**PERMISSIVE, 'parallel_workers': 3}}, frames)
+    return [
+        (step, asset, b[asset], p[asset])
+        for step, (b, p) in enumerate(zip(batch, parallel))
+        for asset in ASSETS
+        if b[asset] is not None or p[asset] is not None
+    ]
+
+
+def test_parallel_matches_batch_on_sliding_frames(batch_results, parallel_results):
+    mismatches = [
+        (step, asset)
+        for step, (batch, parallel) in enumerate(zip(batch_results, parallel_results))
+        for asset in ASSETS
+        if _comparable(batch[asset]) != _comparable(parallel[asset])
+    ]
+    assert not mismatches, f"{len(mismatches)} resultados distintos, p. ej. {mismatches[:5]}"
+
+
+def test_profile_levels_match_batch(permissive_pairs):
+    assert len(permissive_pairs) == len(ASSETS) * STEPS
+    for step, asset, batch, parallel in permissive_pairs:
+        assert batch is not None and parallel is not None, (step, asset)
+        assert (batch.support_level, batch.resistance_level) == (parallel.support_level, parallel.resistance_level), (step, asset)
+
+
+def test_indicator_divergences_match_batch(permissive_pairs):
+    found = 0
+    for step, asset, batch, parallel in permissive_pairs:
+        expected = batch.additional_context['divergences']
+        assert repr(expected) == repr(parallel.additional_context['divergences']), (step, asset)
+        found += bool(expected.get('indicator_divergences'))
+    # Las ventanas tienen pivotes suficientes para que haya divergencias que comparar
+    assert found > 0
+
+
+def test_parallel_journal_has_each_signal_once(frames, tmp_path):
+    spill = str(tmp_path / 'journal.bin')
+    config = {'ai_engine': {**PERMISSIVE, 'parallel_workers': 3, 'journal_capacity': 20, 'journal_spill_path': spill}}
+    engine = AdvancedAIEngine(config)
+    assets_by_id = {}
+    try:
+        for step in range(STEPS):
+            end = WINDOW + step * 4
+            results = engine.analyze_assets(
+                {asset: frames[asset].iloc[end - WINDOW:end] for asset in ASSETS},
+                {asset: {} for asset in ASSETS}
+            )
+            assets_by_id.update({s.signal_id: s.asset for s in results.values() if s is not None})
+    finally:
+        engine.shutdown_parallel()
+
+    # Los workers no registran: el volcado a disco y la tabla de nombres son solo del motor padre
+    frame = engine.signal_journal.to_frame(include_spilled=True)
+    assert len(frame) == len(assets_by_id) == len(ASSETS) * STEPS
+    assert frame['signal_id'].is_unique
+    assert dict(zip(frame['signal_id'], frame['asset'])) == assets_by_id
@@ -0,0 +1,218 @@
+"""
+Timeframe Views - Velas de timeframe mayor derivadas de la serie de 1 minuto
+============================================================================
+
+Construye vistas de 5m, 15m y 1h a partir del DataFrame base que ya captura
+el bot, sin pedir más datos al broker:
+
+  - Remuestreo incremental: las velas base cerradas nuevas se agregan con
+    np.*.reduceat sobre su bloque y solo la última vela del timeframe mayor
+    (la que aún está abierta) se recalcula en cada llamada.
+  - La vela base en formación se combina con la parcial sin alterar el estado,
+    de modo que el precio en vivo se refleja en la última vela mayor.
+  - Un estado por activo y timeframe; el DataFrame resultante se guarda hasta
+    que cambia la vela base.
+  - Las velas mayores se alinean a múltiplos del timeframe en UTC (igual que
+    DataFrame.resample para índices sin zona horaria).
+"""
+
+import numpy as np
+import pandas as pd
+from collections import deque
+from typing import Dict, Tuple, Any, Optional, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEFRAMES = (5, 15, 60)
+
+VIEW_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+_VIEW_INDEX = pd.Index(VIEW_COLUMNS)
+
+
+class TimeframeView:
+    """Vista incremental de un timeframe mayor (en minutos) para un activo."""
+
+    def __init__(self, minutes: int, max_bars: int = 500):
+        """
+        Inicializa la vista.
+
+        Args:
+            minutes: Timeframe de la vista en minutos
+            max_bars: Velas mayores completas que se conservan
+        """
+        self.minutes = minutes
+        self.period_ns = minutes * 60 * 1_000_000_000
+        self.completed: deque = deque(maxlen=max_bars)
+        self.partial: Optional[list] = None  # [bucket, o, h, l, c, v] de velas base cerradas
+        self.last_closed_time = None
+        self._frame_key = None
+        self._frame: Optional[pd.DataFrame] = None
+        self._completed_block: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def reset(self) -> None:
+        self.completed.clear()
+        self.partial = None
+        self.last_closed_time = None
+        self._frame_key = None
+        self._frame = None
+        self._completed_block = None
+
+    def _completed_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Tiempos y valores de las velas mayores completas (se reconstruyen solo al cerrar una)."""
+        if self._completed_block is None:
+            rows = list(self.completed)
+            times = np.array([row[0] for row in rows], dtype=np.int64)
+            values = np.array([row[1:] for row in rows], dtype=float).reshape(len(rows), len(VIEW_COLUMNS))
+            self._completed_block = (times, values)
+        return self._completed_block
+
+    def _fold(self, times: np.ndarray, block: np.ndarray) -> None:
+        """Agrega un bloque de velas base cerradas (tiempos en ns y filas OHLCV) a la vista."""
+        buckets = times - times % self.period_ns
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        opens = block[starts, 0]
+        highs = np.maximum.reduceat(block[:, 1], starts)
+        lows = np.minimum.reduceat(block[:, 2], starts)
+        ends = np.r_[starts[1:], len(block)] - 1
+        closes = block[ends, 3]
+        volumes = np.add.reduceat(block[:, 4], starts)
+
+        for g, start in enumerate(starts):
+            bucket = int(buckets[start])
+            bar = [bucket, opens[g], highs[g], lows[g], closes[g], volumes[g]]
+            if self.partial is not None and self.partial[0] == bucket:
+                partial = self.partial
+                partial[2] = max(partial[2], bar[2])
+                partial[3] = min(partial[3], bar[3])
+                partial[4] = bar[4]
+                partial[5] += bar[5]
+                continue
+            if self.partial is not None:
+                self.completed.append(tuple(self.partial))
+                self._completed_block = None
+            self.partial = bar
+
+    def resume_position(self, times: np.ndarray) -> Optional[int]:
+        """Posición de la primera vela base no procesada (None si hay que reconstruir)."""
+        if self.last_closed_time is None:
+            return None
+        pos = int(np.searchsorted(times, self.last_closed_time))
+        if pos < len(times) and times[pos] == self.last_closed_time:
+            return pos + 1
+        return None
+
+    def sync(self, times: np.ndarray, values: np.ndarray, tz: Any = None) -> pd.DataFrame:
+        """
+        Actualiza la vista con las velas nuevas y retorna el DataFrame del timeframe mayor.
+
+        Args:
+            times: Tiempos de las velas base en ns (DatetimeIndex.asi8)
+            values: Matriz (velas x 5) OHLCV; la última fila es la vela en formación
+            tz: Zona horaria del índice base (para el índice del resultado)
+
+        Returns:
+            DataFrame OHLCV del timeframe mayor; la última fila incluye la vela base en formación
+        """
+        end = len(times) - 1
+        start = self.resume_position(times)
+        if start is None:
+            self.reset()
+            start = 0
+
+        if start < end:
+            self._fold(times[start:end], values[start:end])
+            self.last_closed_time = int(times[end - 1])
+
+        forming = values[-1]
+        frame_key = (self.last_closed_time, int(times[-1]), float(forming[1]), float(forming[2]), float(forming[3]))
+        if frame_key == self._frame_key:
+            return self._frame
+
+        # Última vela mayor = parcial de velas cerradas + vela base en formación
+        bucket = int(times[-1] - times[-1] % self.period_ns)
+        rows = []
+        if self.partial is not None and self.partial[0] == bucket:
+            p = self.partial
+            rows.append((bucket, p[1], max(p[2], forming[1]), min(p[3], forming[2]), forming[3], p[5] + forming[4]))
+        else:
+            if self.partial is not None:
+                rows.append(tuple(self.partial))
+            rows.append((bucket, *forming))
+
+        completed_times, completed_values = self._completed_arrays()
+        index = pd.DatetimeIndex(np.r_[completed_times, [row[0] for row in rows]].astype('datetime64[ns]'))
+        if tz is not None:
+            index = index.tz_localize('UTC').tz_convert(tz)
+        frame = pd.DataFrame(
+            np.vstack([completed_values, np.array([row[1:] for row in rows], dtype=float)]),
+            index=index,
+            columns=_VIEW_INDEX
+        )
+        self._frame_key = frame_key
+        self._frame = frame
+        return frame
+
+
+class TimeframeViews:
+    """
+    Vistas de timeframes mayores por activo.
+
+    Características:
+    - Una TimeframeView incremental por (activo, timeframe)
+    - Sin I/O adicional: todo se deriva del DataFrame base
+    """
+
+    def __init__(self, timeframes: Iterable[int] = DEFAULT_TIMEFRAMES, max_bars: int = 500):
+        """
+        Inicializa las vistas.
+
+        Args:
+            timeframes: Timeframes mayores en minutos
+            max_bars: Velas mayores completas conservadas por vista
+        """
+        self.timeframes = tuple(timeframes)
+        self.max_bars = max_bars
+        self.views: Dict[Tuple[str, int], TimeframeView] = {}
+
+    def get(self, asset: str, df: pd.DataFrame) -> Dict[int, pd.DataFrame]:
+        """
+        DataFrames de cada timeframe mayor del activo.
+
+        Args:
+            asset: Activo
+            df: DataFrame base (1 minuto) con DatetimeIndex
+
+        Returns:
+            Dict minutos -> DataFrame OHLCV (vacío si el índice no es temporal)
+        """
+        if df is None or len(df) < 2 or not isinstance(df.index, pd.DatetimeIndex):
+            return {}
+        index = df.index.as_unit('ns') if hasattr(df.index, 'as_unit') else df.index
+        times = index.asi8
+        views = []
+        for minutes in self.timeframes:
+            view = self.views.get((asset, minutes))
+            if view is None:
+                view = self.views[(asset, minutes)] = TimeframeView(minutes, self.max_bars)
+            views.append((minutes, view))
+
+        # Solo se copian las filas que alguna vista aún no ha procesado
+        positions = [view.resume_position(times) for _, view in views]
+        first = 0 if None in positions else max(0, min(positions) - 1)
+        tail = df.iloc[first:]
+        values = np.column_stack([
+            tail[c].to_numpy(dtype=float) if c in tail.columns else np.zeros(len(tail)) for c in VIEW_COLUMNS
+        ])
+        result = {}
+        for minutes, view in views:
+            result[minutes] = view.sync(times[first:], values, df.index.tz)
+        return result
+
+    def invalidate(self, asset: Optional[str] = None) -> None:
+        """Descarta las vistas de un activo (o todas)."""
+        if asset is None:
+            self.views.clear()
+            return
+        for key in [k for k in self.views if k[0] == asset]:
+            del self.views[key]
@@ -0,0 +1,280 @@
+"""
+Volatility Estimators - Estimadores de volatilidad por vela
+===========================================================
+
+Estimadores de volatilidad por vela (escala de retorno de una vela, comparable
+con np.std de los retornos cierre a cierre):
+
+  - EWMA: varianza exponencial de los log-retornos (halflife en velas)
+  - Parkinson: rango alto/bajo, media móvil de ln(H/L)² / (4·ln 2)
+  - Garman-Klass: rango + cuerpo, media móvil de ½·ln(H/L)² − (2·ln 2 − 1)·ln(C/O)²
+  - ATR de Wilder (absoluto y relativo al cierre)
+
+Cada estimador tiene una forma vectorizada para todo el histórico (arrays
+(n,) o (series, n), backtest) y un estado incremental O(1) por vela cerrada
+(VolatilityState, vivo). Alimentados con las mismas velas dan el mismo valor;
+la vela en formación se combina al consultar sin modificar el estado.
+"""
+
+import numpy as np
+from collections import deque
+from scipy.signal import lfilter
+from typing import Dict, Optional, Tuple
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+EWMA_HALFLIFE = 20
+RANGE_WINDOW = 20
+ATR_PERIOD = 14
+
+ESTIMATORS = ('close_to_close', 'ewma', 'parkinson', 'garman_klass')
+
+_PARKINSON_FACTOR = 1.0 / (4.0 * math.log(2.0))
+_GK_BODY_FACTOR = 2.0 * math.log(2.0) - 1.0
+
+
+def ewma_alpha(halflife: float) -> float:
+    """Peso de la observación nueva para una vida media de `halflife` velas."""
+    return 1.0 - 0.5 ** (1.0 / halflife)
+
+
+# ----------------------------------------------------------------------
+# Formas vectorizadas (histórico completo)
+# ----------------------------------------------------------------------
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Media móvil sobre el último eje (NaN hasta completar la ventana)."""
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] < window:
+        return result
+    cumsum = np.cumsum(values, axis=-1)
+    totals = cumsum[..., window - 1:].copy()
+    totals[..., 1:] -= cumsum[..., :-window]
+    result[..., window - 1:] = totals / window
+    return result
+
+
+def ewma_volatility(close: np.ndarray, halflife: float = EWMA_HALFLIFE) -> np.ndarray:
+    """
+    Volatilidad EWMA de los log-retornos.
+
+    Args:
+        close: Cierres (n,) o (series, n)
+        halflife: Vida media en velas
+
+    Returns:
+        Array con la forma de close (NaN en la primera vela)
+    """
+    c = np.asarray(close, dtype=float)
+    result = np.full(c.shape, np.nan)
+    if c.shape[-1] < 2:
+        return result
+    squared = np.diff(np.log(c), axis=-1) ** 2
+    alpha = ewma_alpha(halflife)
+    # v_t = (1 - alpha)·v_{t-1} + alpha·r_t², sembrado con el primer r²
+    zi = ((1 - alpha) * squared[..., :1])
+    variance, _ = lfilter([alpha], [1.0, -(1 - alpha)], squared, axis=-1, zi=zi)
+    result[..., 1:] = np.sqrt(variance)
+    return result
+
+
+def parkinson_volatility(high: np.ndarray, low: np.ndarray, window: int = RANGE_WINDOW) -> np.ndarray:
+    """Volatilidad de Parkinson en ventana móvil (NaN hasta completar la ventana)."""
+    terms = np.log(np.asarray(high, dtype=float) / np.asarray(low, dtype=float)) ** 2 * _PARKINSON_FACTOR
+    return np.sqrt(_rolling_mean(terms, window))
+
+
+def garman_klass_volatility(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    window: int = RANGE_WINDOW
+) -> np.ndarray:
+    """Volatilidad de Garman-Klass en ventana móvil (NaN hasta completar la ventana)."""
+    terms = _garman_klass_terms(
+        np.asarray(open_, dtype=float), np.asarray(high, dtype=float),
+        np.asarray(low, dtype=float), np.asarray(close, dtype=float)
+    )
+    return np.sqrt(np.maximum(_rolling_mean(terms, window), 0.0))
+
+
+def _garman_klass_terms(o, h, l, c):
+    return 0.5 * np.log(h / l) ** 2 - _GK_BODY_FACTOR * np.log(c / o) ** 2
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """True range por vela (la primera usa alto - bajo)."""
+    h = np.asarray(high, dtype=float)
+    l = np.asarray(low, dtype=float)
+    c = np.asarray(close, dtype=float)
+    tr = h - l
+    prev = c[..., :-1]
+    tr[..., 1:] = np.maximum(tr[..., 1:], np.maximum(np.abs(h[..., 1:] - prev), np.abs(l[..., 1:] - prev)))
+    return tr
+
+
+def average_true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = ATR_PERIOD) -> np.ndarray:
+    """
+    ATR de Wilder: media simple de los primeros `period` TR y luego suavizado 1/period.
+
+    Returns:
+        Array con la forma de close (NaN hasta la vela period - 1)
+    """
+    tr = true_range(high, low, close)
+    result = np.full(tr.shape, np.nan)
+    if tr.shape[-1] < period:
+        return result
+    seed = tr[..., :period].mean(axis=-1, keepdims=True)
+    result[..., period - 1:period] = seed
+    if tr.shape[-1] > period:
+        alpha = 1.0 / period
+        smoothed, _ = lfilter([alpha], [1.0, -(1 - alpha)], tr[..., period:], axis=-1, zi=(1 - alpha) * seed)
+        result[..., period:] = smoothed
+    return result
+
+
+def compute_volatility(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    halflife: float = EWMA_HALFLIFE,
+    window: int = RANGE_WINDOW,
+    atr_period: int = ATR_PERIOD
+) -> Dict[str, np.ndarray]:
+    """
+    Todos los estimadores por vela.
+
+    Returns:
+        Dict 'ewma', 'parkinson', 'garman_klass', 'atr', 'atr_pct' -> array
+    """
+    atr = average_true_range(high, low, close, atr_period)
+    return {
+        'ewma': ewma_volatility(close, halflife),
+        'parkinson': parkinson_volatility(high, low, window),
+        'garman_klass': garman_klass_volatility(open_, high, low, close, window),
+        'atr': atr,
+        'atr_pct': atr / np.asarray(close, dtype=float)
+    }
+
+
+# ----------------------------------------------------------------------
+# Estado incremental (vivo)
+# ----------------------------------------------------------------------
+
+class _WindowMean:
+    """Media de una ventana fija con recálculo exacto periódico."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values: deque = deque(maxlen=size)
+        self.total = 0.0
+        self._pushes = 0
+
+    def push(self, value: float) -> None:
+        if len(self.values) == self.size:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+        self._pushes += 1
+        if self._pushes >= self.size:
+            self._pushes = 0
+            self.total = float(sum(self.values))
+
+    def mean_with(self, extra: Optional[float]) -> float:
+        """Media de la ventana desplazada con `extra` como valor más reciente (NaN si incompleta)."""
+        if extra is None:
+            return self.total / self.size if len(self.values) == self.size else math.nan
+        n = len(self.values)
+        if n + 1 < self.size:
+            return math.nan
+        total = self.total + extra - (self.values[0] if n == self.size else 0.0)
+        return total / self.size
+
+
+class VolatilityState:
+    """
+    Estimadores de volatilidad de un activo actualizados en O(1) por vela cerrada.
+
+    Características:
+    - push_closed ingiere una vela cerrada
+    - estimates combina la vela en formación sin modificar el estado
+    - Mismos valores que compute_volatility sobre las mismas velas
+    """
+
+    def __init__(self, halflife: float = EWMA_HALFLIFE, window: int = RANGE_WINDOW, atr_period: int = ATR_PERIOD):
+        self.alpha = ewma_alpha(halflife)
+        self.atr_period = atr_period
+        self.variance: Optional[float] = None
+        self.prev_close: Optional[float] = None
+        self.parkinson = _WindowMean(window)
+        self.garman_klass = _WindowMean(window)
+        self.atr: Optional[float] = None
+        self._atr_seed: list = []
+
+    def _ewma_step(self, close: float) -> Optional[float]:
+        if self.prev_close is None:
+            return None
+        squared = math.log(close / self.prev_close) ** 2
+        if self.variance is None:
+            return squared
+        return (1 - self.alpha) * self.variance + self.alpha * squared
+
+    def _atr_step(self, high: float, low: float) -> Tuple[Optional[float], list]:
+        tr = high - low
+        if self.prev_close is not None:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        if self.atr is not None:
+            return self.atr + (tr - self.atr) / self.atr_period, self._atr_seed
+        seed = self._atr_seed + [tr]
+        if len(seed) == self.atr_period:
+            return sum(seed) / self.atr_period, seed
+        return None, seed
+
+    @staticmethod
+    def _terms(open_: float, high: float, low: float, close: float) -> Tuple[float, float]:
+        range_sq = math.log(high / low) ** 2
+        return range_sq * _PARKINSON_FACTOR, 0.5 * range_sq - _GK_BODY_FACTOR * math.log(close / open_) ** 2
+
+    def push_closed(self, open_: float, high: float, low: float, close: float) -> None:
+        """Agrega una vela cerrada."""
+        self.variance = self._ewma_step(close)
+        self.atr, self._atr_seed = self._atr_step(high, low)
+        parkinson, garman_klass = self._terms(open_, high, low, close)
+        self.parkinson.push(parkinson)
+        self.garman_klass.push(garman_klass)
+        self.prev_close = close
+
+    def estimates(self, live: Optional[Tuple[float, float, float, float]] = None) -> Dict[str, float]:
+        """
+        Estimaciones actuales (NaN donde aún no hay velas suficientes).
+
+        Args:
+            live: (open, high, low, close) de la vela en formación
+
+        Returns:
+            Dict 'ewma', 'parkinson', 'garman_klass', 'atr', 'atr_pct'
+        """
+        if live is None:
+            variance, atr = self.variance, self.atr
+            parkinson = self.parkinson.mean_with(None)
+            garman_klass = self.garman_klass.mean_with(None)
+            close = self.prev_close
+        else:
+            open_, high, low, close = live
+            variance = self._ewma_step(close)
+            atr, _ = self._atr_step(high, low)
+            live_parkinson, live_gk = self._terms(open_, high, low, close)
+            parkinson = self.parkinson.mean_with(live_parkinson)
+            garman_klass = self.garman_klass.mean_with(live_gk)
+        atr = math.nan if atr is None else atr
+        return {
+            'ewma': math.sqrt(variance) if variance is not None else math.nan,
+            'parkinson': math.sqrt(parkinson),
+            'garman_klass': math.sqrt(max(garman_klass, 0.0)) if not math.isnan(garman_klass) else math.nan,
+            'atr': atr,
+            'atr_pct': atr / close if close else math.nan
+        }
@@ -0,0 +1,232 @@
+"""
+Watchlist Prioritizer - Ciclo de análisis con presupuesto de tiempo
+===================================================================
+
+Cuando la lista de activos crece, el ciclo de análisis se alarga y los
+últimos activos se analizan con datos viejos. El priorizador:
+
+  - Ordena los activos por payout × volatilidad × recencia de la última señal
+    (payout de BrokerCapture.payout_data, volatilidad de
+    MarketSentimentAnalyzer.volatility_history); los activos que llevan
+    tiempo sin analizarse suben para no quedar relegados.
+  - Reparte un presupuesto de tiempo por ciclo: cada activo se analiza completo
+    si su coste estimado cabe en lo que queda, solo con las etapas baratas
+    (cheap_only) si solo cabe eso, o se omite.
+  - Estima el coste por activo y modo con una media exponencial de las
+    duraciones observadas.
+  - Reporta la cobertura lograda en cada ciclo.
+"""
+
+import numpy as np
+import time
+from collections import deque
+from typing import Dict, List, Any, Optional, Callable
+import logging
+
+logger = logging.getLogger(__name__)
+
+FULL = 'full'
+CHEAP = 'cheap'
+SKIPPED = 'skipped'
+
+
+class WatchlistPrioritizer:
+    """
+    Prioridad y presupuesto de tiempo para el análisis de la watchlist.
+
+    Características:
+    - Prioridad = payout × volatilidad relativa × recencia de señal × antigüedad del análisis
+    - Degradación a cheap_only y omisión según el tiempo restante
+    - Coste estimado por activo (EWMA) para decidir antes de analizar
+    - Reporte de cobertura por ciclo
+    """
+
+    def __init__(
+        self,
+        engine: Any,
+        budget_seconds: float = 10.0,
+        payouts: Optional[Dict[str, Any]] = None,
+        signal_cooldown_seconds: float = 120.0,
+        staleness_seconds: float = 60.0,
+        cost_alpha: float = 0.3,
+        clock: Optional[Callable[[], float]] = None
+    ):
+        """
+        Inicializa el priorizador.
+
+        Args:
+            engine: AdvancedAIEngine (analyze_asset con cheap_only y volatility_history)
+            budget_seconds: Tiempo máximo por ciclo
+            payouts: Payout por activo en % (p. ej. BrokerCapture.payout_data, se lee en cada ciclo)
+            signal_cooldown_seconds: Escala de la penalización a activos con señal reciente
+            staleness_seconds: Escala del aumento de prioridad de activos sin analizar
+            cost_alpha: Peso de la última duración en la estimación de coste
+            clock: Reloj monotónico (por defecto time.perf_counter)
+        """
+        self.engine = engine
+        self.budget_seconds = budget_seconds
+        self.payouts = payouts if payouts is not None else {}
+        self.signal_cooldown_seconds = signal_cooldown_seconds
+        self.staleness_seconds = staleness_seconds
+        self.cost_alpha = cost_alpha
+        self.clock = clock or time.perf_counter
+
+        self.last_signal: Dict[str, float] = {}
+        self.last_analysis: Dict[str, float] = {}
+        self.costs: Dict[str, Dict[str, float]] = {FULL: {}, CHEAP: {}}
+        self.default_costs = {FULL: 0.05, CHEAP: 0.01}
+        self.cycles: deque = deque(maxlen=100)
+
+    # ------------------------------------------------------------------
+    # Prioridad
+    # ------------------------------------------------------------------
+
+    def _volatility(self, asset: str) -> float:
+        history = self.engine.sentiment_analyzer.volatility_history.get(asset)
+        if not history:
+            return np.nan
+        return float(np.mean(list(history)[-5:]))
+
+    def priorities(self, assets: List[str], now: Optional[float] = None) -> Dict[str, float]:
+        """
+        Prioridad de cada activo (mayor = antes).
+
+        Los factores sin dato (payout o volatilidad desconocidos) toman la
+        mediana de la watchlist, de modo que no favorecen ni penalizan.
+        """
+        now = self.clock() if now is None else now
+        payouts = np.array([float(self.payouts.get(a, np.nan) or np.nan) for a in assets])
+        volatility = np.array([self._volatility(a) for a in assets])
+
+        payout_factor = np.nan_to_num(payouts / 100.0, nan=np.nanmedian(payouts) / 100.0 if np.isfinite(payouts).any() else 1.0)
+        median_vol = np.nanmedian(volatility) if np.isfinite(volatility).any() else np.nan
+        if np.isfinite(median_vol) and median_vol > 0:
+            volatility_factor = np.clip(np.nan_to_num(volatility / median_vol, nan=1.0), 0.25, 4.0)
+        else:
+            volatility_factor = np.ones(len(assets))
+
+        signal_age = np.array([now - self.last_signal.get(a, -np.inf) for a in assets])
+        recency_factor = np.maximum(0.1, 1.0 - np.exp(-signal_age / self.signal_cooldown_seconds))
+        analysis_age = np.array([now - self.last_analysis.get(a, now - self.staleness_seconds) for a in assets])
+        staleness_factor = 1.0 + np.maximum(analysis_age, 0.0) / self.staleness_seconds
+
+        scores = payout_factor * volatility_factor * recency_factor * staleness_factor
+        return dict(zip(assets, scores.tolist()))
+
+    # ------------------------------------------------------------------
+    # Ciclo
+    # ------------------------------------------------------------------
+
+    def _cost(self, mode: str, asset: str) -> float:
+        known = self.costs[mode]
+        if asset in known:
+            return known[asset]
+        return float(np.mean(list(known.values()))) if known else self.default_costs[mode]
+
+    def _observe_cost(self, mode: str, asset: str, duration: float) -> None:
+        known = self.costs[mode]
+        previous = known.get(asset)
+        known[asset] = duration if previous is None else previous + self.cost_alpha * (duration - previous)
+
+    def run_cycle(
+        self,
+        frames: Dict[str, Any],
+        indicators: Dict[str, Dict[str, Any]],
+        account_balance: float = 1000.0,
+        recent_win_rate: float = 0.50,
+        budget_seconds: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Analiza la watchlist por prioridad dentro del presupuesto.
+
+        Args:
+            frames: Dict activo -> DataFrame OHLCV
+            indicators: Dict activo -> indicadores
+            account_balance: Balance de la cuenta
+            recent_win_rate: Win rate reciente
+            budget_seconds: Presupuesto de este ciclo (por defecto el configurado)
+
+        Returns:
+            Dict activo -> AISignal o None (los omitidos también quedan en None)
+        """
+        budget = self.budget_seconds if budget_seconds is None else budget_seconds
+        start = self.clock()
+        deadline = start + budget
+        scores = self.priorities(list(frames), start)
+        order = sorted(frames, key=scores.get, reverse=True)
+
+        results: Dict[str, Any] = {}
+        modes: Dict[str, str] = {}
+        for asset in order:
+            now = self.clock()
+            remaining = deadline - now
+            if remaining >= self._cost(FULL, asset):
+                mode = FULL
+            elif remaining >= self._cost(CHEAP, asset):
+                mode = CHEAP
+            else:
+                results[asset] = None
+                modes[asset] = SKIPPED
+                continue
+
+            signal = self.engine.analyze_asset(
+                asset, frames[asset], indicators.get(asset, {}), account_balance, recent_win_rate,
+                cheap_only=mode == CHEAP
+            )
+            finished = self.clock()
+            self._observe_cost(mode, asset, finished - now)
+            self.last_analysis[asset] = finished
+            if signal is not None:
+                self.last_signal[asset] = finished
+            results[asset] = signal
+            modes[asset] = mode
+
+        self._record_cycle(modes, order, scores, self.clock() - start, budget)
+        return results
+
+    def _record_cycle(
+        self,
+        modes: Dict[str, str],
+        order: List[str],
+        scores: Dict[str, float],
+        elapsed: float,
+        budget: float
+    ) -> None:
+        total = len(modes)
+        counts = {mode: sum(1 for m in modes.values() if m == mode) for mode in (FULL, CHEAP, SKIPPED)}
+        cycle = {
+            'assets': total,
+            'full': counts[FULL],
+            'cheap': counts[CHEAP],
+            'skipped': counts[SKIPPED],
+            'coverage': (counts[FULL] + counts[CHEAP]) / total if total else 1.0,
+            'full_coverage': counts[FULL] / total if total else 1.0,
+            'elapsed_s': elapsed,
+            'budget_s': budget,
+            'overrun': elapsed > budget,
+            'skipped_assets': [a for a in order if modes[a] == SKIPPED],
+            'top_priority': order[:5]
+        }
+        self.cycles.append(cycle)
+        if counts[SKIPPED] or counts[CHEAP]:
+            logger.info(
+                f"[WATCHLIST] Ciclo {elapsed:.2f}s/{budget:.2f}s: {counts[FULL]} completos, "
+                f"{counts[CHEAP]} baratos, {counts[SKIPPED]} omitidos ({cycle['coverage'] * 100:.0f}% cobertura)"
+            )
+
+    def get_report(self) -> Dict[str, Any]:
+        """Cobertura del último ciclo y media de los ciclos recientes."""
+        if not self.cycles:
+            return {'cycles': 0}
+        cycles = list(self.cycles)
+        return {
+            'cycles': len(cycles),
+            'last_cycle': cycles[-1],
+            'mean_coverage': float(np.mean([c['coverage'] for c in cycles])),
+            'mean_full_coverage': float(np.mean([c['full_coverage'] for c in cycles])),
+            'overruns': sum(1 for c in cycles if c['overrun']),
+            'estimated_cost_ms': {
+                mode: float(np.mean(list(costs.values())) * 1000.0) if costs else self.default_costs[mode] * 1000.0
+                for mode, costs in self.costs.items()
+            }
+        }